@@ -31,6 +31,8 @@ The following eventlisteners are available:
 In this base class, they just return.
 """
 
+from __future__ import print_function
+
 import inspect
 import os
 import platform
@@ -39,17 +41,27 @@ import wx
 from PIL import Image
 from collections import deque
 
+from annotationcore import AnnotationCore, CreateRecorder
 from settings import Settings
+from canvas import ImageCanvas
 from logger import Logger
+from memorybudget import MemoryBudget
 from convert import Convert
 from imageoperations import ImageOperations
+from overlay import Overlay
+from prefetcher import Prefetcher
+from thumbgrid import ThumbnailFrame
+from timing import CreateTiming
+from zoomcache import ZoomCache
 
 class AbstractFrame(wx.Frame):
     """ Initialize data needed to allow the frame to work.
 
     Included are lists with image names, viewport sizes, etc.
+    If a FileDiscovery is given, fileList is its todo list, a deque it
+    updates on the GUI thread.
     """
-    def __init__(self, parent=None, id=-1,pos=wx.DefaultPosition, title='wxPython', size=None, settings=None, fileList=[]):
+    def __init__(self, parent=None, id=-1,pos=wx.DefaultPosition, title='wxPython', size=None, settings=None, fileList=[], discovery=None):
         self.imops = ImageOperations()
         # A conversion object is needed for pil <-> wx
         self.convert = Convert()
@@ -57,22 +69,58 @@ class AbstractFrame(wx.Frame):
         self.size = size
         # The given settings
         self.settings = settings
-        # Logger
-        self.logger = Logger(settings)
+        # Latency of the interactions, if measured
+        self.timing = CreateTiming(settings)
+        # Logger; log files are written in the background
+        self.logger = Logger(settings, self.timing)
+        self.logger.SetErrorHandler(self.LogErrorHandler)
+        # Index existing output in one go, for resuming
+        self.resume = settings.Resume() and settings.GetLogHeader() is not None
+        if self.resume:
+            self.logger.IndexOutput()
+        # Memory shared by the caches below
+        self.budget = MemoryBudget(settings.GetMemoryBudget() * 1024 * 1024)
+        # Decodes the surrounding images in the background
+        self.prefetcher = Prefetcher(settings, size, self.budget)
+        # Zoomed in views, rendered in advance while idle
+        self.zoomCache = None
+        if settings.UseZoomCache():
+            self.zoomCache = ZoomCache(settings.GetZoomCacheSize(), self.budget)
+        # Markings of the current image
+        self.overlay = Overlay(settings)
         # And data about the current image
         self.curZoomLevel = None
         self.curViewPort = None
-        self.curPilImage = None
-        self.curWxImage = None
+        self.curSource = None
         self.curScaledImage = None
-        self.bitmap = None
-        self.todoFileList = deque(fileList)
+        self.curOverviewImage = None
+        # Mapping of the displayed bitmap: origin (x, y) in the image, and scale
+        self.curDisplayOrigin = None
+        self.curDisplayScale = None
+        # The loupe: whether it is shown, and the viewport, position and centre it is shown at
+        self.loupe = settings.UseLoupe()
+        self.curLoupeViewPort = None
+        self.curLoupeOrigin = None
+        self.curLoupeCentre = None
+        # Whether the loupe stays in place while the mouse moves within it,
+        # and whether it is to be updated for the last mouse motion
+        self.loupeFrozen = False
+        self.loupePending = False
+        self.currentMouseLocation = (0, 0)
+        # Files found in the background are added to the given deque, so don't copy that.
+        self.discovery = discovery
+        if isinstance(fileList, deque):
+            self.todoFileList = fileList
+        else:
+            self.todoFileList = deque(fileList)
         self.doneFileList = deque([])
-        self.zoomed = False
+        # Images marked to be skipped, and the thumbnail grid, if it is shown
+        self.skipped = self.LoadSkipList()
+        self.grid = None
         self.curFileName = None
-        self.locationList = []
-        self.skip = False
-        self.colour = None
+        # The points, zoom and skip mode of the current image, and what keys and clicks do
+        self.recorder = CreateRecorder(settings)
+        self.core = self.CreateCore()
         # Init frame
         style=wx.DEFAULT_FRAME_STYLE ^ (wx.RESIZE_BORDER)
 
@@ -80,12 +128,12 @@ class AbstractFrame(wx.Frame):
         skip = self.settings.StartAt()
         while skip > 1:
             skip -= 1
-            if len(self.todoFileList) > 0:
+            if self.HasFilesTodo():
                 self.doneFileList.append(self.todoFileList.popleft())
 
         wx.Frame.__init__(self, parent, id, title, pos, size, style=style)
-        # Panel to allow Linux to have keypress events as well.
-        self.panel = wx.Panel(self, wx.ID_ANY)
+        # The images are painted on a panel, which allows Linux to have keypress events as well.
+        self.panel = ImageCanvas(self)
         # And explicitly request focus for the same reason
         self.panel.SetFocus()
 
@@ -94,27 +142,45 @@ class AbstractFrame(wx.Frame):
         else:
             self.Bind(wx.EVT_CHAR_HOOK, self.KeyboardEvent)
 
+        # The canvas stays, so the mouse listeners are attached once
+        self.panel.Bind(wx.EVT_LEFT_DOWN, self.MouseEventLeft)
+        self.panel.Bind(wx.EVT_RIGHT_DOWN, self.MouseEventRight)
+        self.panel.Bind(wx.EVT_MOTION, self.SetMouseLocation)
+
+        # Make sure all log files are written before the frame goes away
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+        # An interaction ends when the frame is idle again, i.e. painted;
+        # idle time is used to move the loupe, and to render zoomed in views in advance.
+        self.Bind(wx.EVT_IDLE, self.OnIdle)
+
         # Finally, start the image loop
         self.OpenNextImage()
 
     """ Load an image file.
 
     Load up an imagefile, and make sure it gets displayed. 
-    Eventlisteners are (re)binded as well.
     """
     def LoadImageFile(self, imageFile):
         # Reset internal data
+        self.core.OpenImage(imageFile)
         self.curZoomLevel = 1
-        self.curPilImage = Image.open(imageFile)
-        self.SetPilImage()
+        start = self.timing.Start()
+        self.curSource = self.prefetcher.Get(imageFile)
+        self.timing.Stop("source", start)
+        self.overlay.Clear()
+        if self.zoomCache is not None:
+            self.zoomCache.Clear()
+        # The overview is already scaled, so no need to scale it again.
+        start = self.timing.Start()
+        self.curOverviewImage = self.convert.PilToImage(self.curSource.GetOverview())
+        self.timing.Stop("convert", start)
+        self.ShowWxImage(self.curOverviewImage)
 
         self.UpdateTitleBar(imageFile)
-
-        # Redraw stuff
-        self.panel.Layout()
-        self.panel.Refresh()
-        self.Layout()
-        self.Refresh()
+        if self.grid is not None:
+            self.grid.SetCurrent(imageFile)
+        # And start decoding the images around this one, that will be shown
+        self.prefetcher.Schedule(self.todoFileList, self.doneFileList, self.skipped)
 
     """ Update the titlebar with a given filename
     
@@ -124,56 +190,293 @@ class AbstractFrame(wx.Frame):
     def UpdateTitleBar(self, imageFile):
         filestr = "File: " + imageFile
         cntstr = str(len(self.doneFileList) + 1) + "/" + str(len(self.todoFileList) + len(self.doneFileList) + 1)
-        resostr = str(self.curPilImage.size)
-        self.SetTitle(filestr + " | " + resostr + " | " + cntstr)
-
-    """ Attach the correct mouselisteners to the current bitmap
-
-    Use whon a bitmap is destroyed, and a new one is attached to the frame.
-    """
-    def AttachListenersToBitmap(self):
-        # Mouse events have to be attached to the bitmap
-        self.bitmap.Bind(wx.EVT_LEFT_DOWN, self.MouseEventLeft)
-        self.bitmap.Bind(wx.EVT_RIGHT_DOWN, self.MouseEventRight)
-        self.bitmap.Bind(wx.EVT_MOTION, self.SetMouseLocation)
+        resostr = str(self.curSource.GetSize())
+        memstr = str(self.budget.GetUsage() // 1048576) + " MB"
+        self.SetTitle(filestr + " | " + resostr + " | " + cntstr + " | " + memstr)
 
     """ Set the current PIL image as bitmap image.
 
     In other words, display the current PIL image on the gui.
-    If there exists a bitmap, destroy it first.
+    The cached overview is used, with the markings drawn on top of it.
+    It replaces the bitmap on the canvas.
     """
     def SetPilImage(self):
-        self.curWxImage = self.convert.PilToImage(self.curPilImage)
-        self.curScaledImage = self.imops.ScaleWxImage(self.curWxImage, self.size)
+        self.timing.Begin("unzoom")
+        self.ShowWxImage(self.curOverviewImage)
+
+    """ Display an already scaled wx.Image as bitmap image.
+
+    The viewport is reset to the whole image.
+    It replaces the bitmap on the canvas.
+    """
+    def ShowWxImage(self, scaled):
+        self.curScaledImage = scaled
         self.curScaledImageSize = (self.curScaledImage.GetWidth(), self.curScaledImage.GetHeight())
         self.curViewPort = (0, 0, self.curScaledImageSize[0], self.curScaledImageSize[1])
 
-        if self.bitmap:
-            self.bitmap.Destroy()
+        scale = float(self.curScaledImageSize[0]) / self.curSource.GetSize()[0]
+        self.ShowBitmap(self.curScaledImage, (0, 0), scale)
+        if self.loupe:
+            self.ShowLoupe(self.currentMouseLocation)
+
+    """ Display a wx.Image with the markings on top of it.
+
+    The image shows the source from origin (x, y) onwards, at the given scale.
+    It replaces the bitmap on the canvas.
+    """
+    def ShowBitmap(self, image, origin, scale):
+        self.curDisplayOrigin = origin
+        self.curDisplayScale = scale
+
+        start = self.timing.Start()
+        bm = image.ConvertToBitmap()
+        dc = wx.MemoryDC(bm)
+        self.overlay.Draw(dc, origin, scale)
+        dc.SelectObject(wx.NullBitmap)
+        self.panel.SetBitmap(bm)
+        self.HideLoupe()
+        self.timing.Stop("bitmap", start)
+
+    """ Add a marking at the given point of the current image.
+
+    The point is in original image coordinates. The marking is only
+    drawn on the displayed bitmap; the image itself is left untouched.
+    """
+    def AddMarking(self, point, colour):
+        self.overlay.AddMarking(point, colour)
+
+        # Only the marking itself is repainted
+        dc = wx.MemoryDC(self.panel.GetBitmap())
+        rect = self.overlay.DrawMarking(dc, point, colour, self.curDisplayOrigin, self.curDisplayScale)
+        dc.SelectObject(wx.NullBitmap)
+        self.panel.RefreshArea(rect)
+        # The loupe shows the markings as well
+        if self.curLoupeViewPort is not None:
+            self.UpdateLoupe()
+
+    """ Show or hide the loupe.
+
+    The loupe is only shown while the image is not zoomed in.
+    """
+    def ToggleLoupe(self):
+        self.loupe = not self.loupe
+        if self.loupe and not self.core.IsZoomed():
+            self.ShowLoupe(self.currentMouseLocation)
+        else:
+            self.HideLoupe()
+
+    """ Show the loupe for the current mouse location.
 
-        bm = self.curScaledImage.ConvertToBitmap()
-        self.bitmap = wx.StaticBitmap(parent=self.panel, pos=(0,0), bitmap=bm, size=bm.Size)
+    The loupe follows the mouse; while it is frozen, it stays in place
+    and only the cross hair follows the mouse.
+    """
+    def UpdateLoupe(self):
+        if self.loupeFrozen and self.curLoupeCentre is not None:
+            self.ShowLoupe(self.curLoupeCentre, self.currentMouseLocation)
+        else:
+            self.ShowLoupe(self.currentMouseLocation)
 
-        self.AttachListenersToBitmap()
+    """ Show the loupe around the given location (x, y) on the display.
+
+    The loupe shows the original image, magnified by the zoom factor,
+    centred on the location. It is rendered from the full resolution
+    image; while that is still being decoded, no loupe is shown.
+    The cross hair is drawn at the display location cross, by default
+    the centre.
+    """
+    def ShowLoupe(self, location, cross=None):
+        if not self.curSource.IsFullyLoaded():
+            self.HideLoupe()
+            return
+        self.timing.Begin("loupe")
+        zoom = self.settings.GetZoomFactor()
+        size = self.settings.GetLoupeSize()
+        viewport = self.imops.CalculateViewPort(zoom, location, self.curSource.GetSize(), self.curScaledImageSize, size)
+
+        start = self.timing.Start()
+        region = self.curSource.GetRegion(viewport, size)
+        self.timing.Stop("region", start)
+
+        start = self.timing.Start()
+        bm = self.convert.PilToImage(region).ConvertToBitmap()
+        dc = wx.MemoryDC(bm)
+        self.overlay.Draw(dc, viewport[0:2], float(bm.GetWidth()) / (viewport[2] - viewport[0]))
+        # Cross hair on the point a click marks
+        origin = (location[0] - bm.GetWidth() // 2, location[1] - bm.GetHeight() // 2)
+        if cross is None:
+            cross = location
+        cx = cross[0] - origin[0]
+        cy = cross[1] - origin[1]
+        dc.SetPen(wx.Pen(self.core.GetColour(), 1))
+        dc.DrawLine(cx - 5, cy, cx + 6, cy)
+        dc.DrawLine(cx, cy - 5, cx, cy + 6)
+        dc.SelectObject(wx.NullBitmap)
+
+        self.curLoupeViewPort = viewport
+        self.curLoupeOrigin = origin
+        self.curLoupeCentre = location
+        self.panel.SetInset(bm, self.curLoupeOrigin)
+        self.timing.Stop("bitmap", start)
+
+    """ Hide the loupe, if it is shown.
+    """
+    def HideLoupe(self):
+        if self.curLoupeViewPort is not None:
+            self.curLoupeViewPort = None
+            self.curLoupeOrigin = None
+            self.curLoupeCentre = None
+            self.panel.SetInset(None)
+
+    """ Return whether a display location (x, y) lies within the loupe
+    """
+    def IsInLoupe(self, location):
+        if self.curLoupeOrigin is None:
+            return False
+        size = self.settings.GetLoupeSize()
+        x = location[0] - self.curLoupeOrigin[0]
+        y = location[1] - self.curLoupeOrigin[1]
+        return 0 <= x < size[0] and 0 <= y < size[1]
+
+    """ Return the location of a mouse click in the original image.
+
+    When zoomed in, the click is mapped through the zoomed viewport;
+    otherwise through the magnified contents of the loupe, at the point
+    clicked in it. Return None if the click can't be mapped, i.e. when
+    neither is shown, or the click is outside the loupe.
+    """
+    def GetClickLocation(self, event):
+        x = event.GetX()
+        y = event.GetY()
+        if self.core.IsZoomed():
+            return self.imops.GetOriginalCoords(self.curZoomLevel, (x, y), self.curViewPort)
+        if self.curLoupeViewPort is not None and self.IsInLoupe((x, y)):
+            local = (x - self.curLoupeOrigin[0], y - self.curLoupeOrigin[1])
+            return self.imops.GetOriginalCoords(self.settings.GetZoomFactor(), local, self.curLoupeViewPort)
+        return None
 
     """ Zoom in at the given location
 
     Zoom in an given location (x, y), and redraw the screen.
     """
     def ZoomAtLocation(self, location):
+        self.timing.Begin("zoom")
         self.curZoomLevel = self.settings.GetZoomFactor()
-        self.curViewPort = self.imops.CalculateViewPort(self.curZoomLevel, location, self.curPilImage.size, self.curScaledImageSize)
+        self.curViewPort = self.imops.CalculateViewPort(self.curZoomLevel, location, self.curSource.GetSize(), self.curScaledImageSize)
+
+        crop_sc = None
+        if self.zoomCache is not None:
+            crop_sc = self.GetCachedZoom(self.curViewPort)
+        if crop_sc is None:
+            # The pyramid level closest to the zoomed scale is cropped; only the
+            # crop needs to be converted.
+            start = self.timing.Start()
+            region = self.curSource.GetRegion(self.curViewPort, self.size)
+            self.timing.Stop("region", start)
+            start = self.timing.Start()
+            crop_sc = self.convert.PilToImage(region)
+            self.timing.Stop("convert", start)
+
+        scale = float(crop_sc.GetWidth()) / (self.curViewPort[2] - self.curViewPort[0])
+        self.ShowBitmap(crop_sc, self.curViewPort[0:2], scale)
+
+    """ Return the size a viewport is shown at when zoomed in
+    """
+    def GetZoomedSize(self, viewport):
+        return self.imops.CalculateScaledSize((viewport[2] - viewport[0], viewport[3] - viewport[1]), self.size)
+
+    """ Return the grid cell (column, row) of a zoomed in viewport.
+
+    Cells are half a viewport in size; the cell is the one the upper
+    left corner of the viewport is in.
+    """
+    def GetZoomCell(self, viewport):
+        cw = max(1, (viewport[2] - viewport[0]) // 2)
+        ch = max(1, (viewport[3] - viewport[1]) // 2)
+        return (int(viewport[0] // cw), int(viewport[1] // ch))
 
-        crop = self.convert.PilToImage(self.curPilImage.crop(self.curViewPort))
-        crop_sc = self.imops.ScaleWxImageForced(crop, self.size)
+    """ Return the region to render for a grid cell.
 
-        if self.bitmap:
-            self.bitmap.Destroy()
+    That is the 4-tuple (left, up, right, bottom) in original image
+    coordinates that covers every viewport, of the size of the given
+    one, with its upper left corner in the cell.
+    """
+    def GetZoomCellRegion(self, cell, viewport):
+        vw = viewport[2] - viewport[0]
+        vh = viewport[3] - viewport[1]
+        cw = max(1, vw // 2)
+        ch = max(1, vh // 2)
+        return (cell[0] * cw, cell[1] * ch, (cell[0] + 1) * cw + vw, (cell[1] + 1) * ch + vh)
 
-        bm = crop_sc.ConvertToBitmap()
-        self.bitmap = wx.StaticBitmap(parent=self.panel, pos=(0,0), bitmap=bm, size=bm.Size)
+    """ Return the zoomed in view of a viewport from the zoom cache.
 
-        self.AttachListenersToBitmap()
+    Return None if its cell was not rendered in advance.
+    """
+    def GetCachedZoom(self, viewport):
+        entry = self.zoomCache.Get(self.GetZoomCell(viewport))
+        if entry is None:
+            return None
+        start = self.timing.Start()
+        region, image = entry
+        size = self.GetZoomedSize(viewport)
+        # The region is rendered at the zoomed scale, so the viewport only has to be cut out
+        x = int(round((viewport[0] - region[0]) * float(size[0]) / (viewport[2] - viewport[0])))
+        y = int(round((viewport[1] - region[1]) * float(size[1]) / (viewport[3] - viewport[1])))
+        x = max(0, min(x, image.GetWidth() - size[0]))
+        y = max(0, min(y, image.GetHeight() - size[1]))
+        crop = image.GetSubImage(wx.Rect(x, y, size[0], size[1]))
+        self.timing.Stop("cache", start)
+        return crop
+
+    """ Return the size (width, height) the region of a grid cell is rendered at.
+
+    Viewport is any viewport of the current image, for its size.
+    """
+    def GetZoomCellRenderSize(self, cell, viewport):
+        region = self.GetZoomCellRegion(cell, viewport)
+        size = self.GetZoomedSize(viewport)
+        xscale = float(size[0]) / (viewport[2] - viewport[0])
+        yscale = float(size[1]) / (viewport[3] - viewport[1])
+        return (int(round((region[2] - region[0]) * xscale)), int(round((region[3] - region[1]) * yscale)))
+
+    """ Render the zoomed in view of a grid cell, and cache it.
+
+    Viewport is any viewport of the current image, for its size.
+    Return whether the cache kept it. It is rendered while idle, so it is
+    scaled up for quality rather than speed.
+    """
+    def RenderZoomCell(self, cell, viewport):
+        region = self.GetZoomCellRegion(cell, viewport)
+        render = self.GetZoomCellRenderSize(cell, viewport)
+        image = self.convert.PilToImage(self.curSource.RenderRegion(region, render, True))
+        return self.zoomCache.Put(cell, region, image)
+
+    """ Render one zoomed in view in advance, if there is one to render.
+
+    The cell under the mouse goes first, then the cells around it.
+    Only done when the full resolution image is decoded already, and
+    the memory budget leaves room for a cell. Return whether a view was
+    rendered and cached; if the cache could not keep it, rendering more
+    would only evict it again.
+    """
+    def PrerenderZoom(self):
+        if self.core.IsZoomed() or self.curSource is None or not self.curSource.IsFullyLoaded():
+            return False
+        orgsize = self.curSource.GetSize()
+        viewport = self.imops.CalculateViewPort(self.settings.GetZoomFactor(), self.currentMouseLocation, orgsize, self.curScaledImageSize)
+        cell = self.GetZoomCell(viewport)
+        render = self.GetZoomCellRenderSize(cell, viewport)
+        if not self.zoomCache.HasRoom(render[0] * render[1] * 3):
+            return False
+        cells = [cell] + [(cell[0] + dx, cell[1] + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx != 0 or dy != 0]
+        for c in cells:
+            if self.zoomCache.Contains(c):
+                continue
+            region = self.GetZoomCellRegion(c, viewport)
+            # Cells outside of the image are never zoomed in on
+            if region[2] <= 0 or region[3] <= 0 or region[0] >= orgsize[0] or region[1] >= orgsize[1]:
+                continue
+            return self.RenderZoomCell(c, viewport)
+        return False
 
     """ Iterate to the next image (if any).
     
@@ -181,48 +484,238 @@ class AbstractFrame(wx.Frame):
     Also update the done/todo file lists, so iterating through the images is possible.
     """
     def OpenNextImage(self):
-        self.colour = self.settings.GetPrimaryColour()
-        if len(self.todoFileList) == 0:
-            self.Destroy()
+        self.timing.Begin("next")
+        if not self.HasFilesTodo():
+            self.Close()
         else:
             if self.curFileName != None:
                 self.doneFileList.append(self.curFileName)
-            cur = self.todoFileList.popleft()
+            cur = self.TakeNextImage()
+            if cur is None:
+                self.Close()
+                return
             self.curFileName = cur
-            self.locationList = []
             self.LoadImageFile(cur)
 
+    """ Take the next image to open from the todo list, or None if none is left.
+
+    Images that are marked to be skipped, or already have output, are
+    passed over. Output only counts when resuming. Only output that existed
+    at startup counts, so images that are processed in this session can
+    still be revisited.
+
+    Images that don't exist anymore are dropped: the file index may list
+    removed images, until the discovery has walked the directory.
+    """
+    def TakeNextImage(self):
+        header = self.settings.GetLogHeader()
+        while self.HasFilesTodo():
+            fileName = self.todoFileList.popleft()
+            if not os.path.exists(fileName):
+                continue
+            if fileName in self.skipped or (self.resume and self.logger.HasOutput(header, fileName)):
+                self.doneFileList.append(fileName)
+                continue
+            return fileName
+        return None
+
+    """ Check whether there are images left to process.
+
+    Images discovered or removed meanwhile are applied to the todo list
+    first. If it is empty while images are still being discovered, wait
+    for the next one.
+    """
+    def HasFilesTodo(self):
+        if self.discovery is not None:
+            self.discovery.Wait()
+        return len(self.todoFileList) > 0
+
     """ Iterate to the previous image (if any).
     
     Go to the previous image, if it exists.
     Also update the done/todo file lists, so iterating through the images is possible.
     """
     def OpenPrevImage(self):
-        if len(self.doneFileList) == 0:
+        self.timing.Begin("prev")
+        if all(f in self.skipped for f in self.doneFileList):
             return
         else:
             if self.curFileName != None:
                 self.todoFileList.appendleft(self.curFileName)
+            # Images marked to be skipped are passed over backwards as well
+            while self.doneFileList[-1] in self.skipped:
+                self.todoFileList.appendleft(self.doneFileList.pop())
             cur = self.doneFileList.pop()
             self.curFileName = cur
-            self.locationList = []
             self.LoadImageFile(cur)
 
+    """ Open a given image, before or after the current one.
+
+    The markings of the current image are not logged, as when going to the
+    previous image. Images in between are passed over.
+    """
+    def JumpToImage(self, fileName):
+        if fileName == self.curFileName:
+            return
+        self.timing.Begin("jump")
+        if fileName in self.todoFileList:
+            self.doneFileList.append(self.curFileName)
+            while self.todoFileList[0] != fileName:
+                self.doneFileList.append(self.todoFileList.popleft())
+            self.todoFileList.popleft()
+        elif fileName in self.doneFileList:
+            self.todoFileList.appendleft(self.curFileName)
+            while self.doneFileList[-1] != fileName:
+                self.todoFileList.appendleft(self.doneFileList.pop())
+            self.doneFileList.pop()
+        else:
+            return
+        self.curFileName = fileName
+        self.LoadImageFile(fileName)
+        self.Raise()
+
+    """ Show the thumbnail grid of all images.
+
+    Images found later on are shown when the grid is opened again.
+    """
+    def ShowGrid(self):
+        if self.grid is not None:
+            self.grid.Raise()
+            return
+        files = list(self.doneFileList) + [self.curFileName] + list(self.todoFileList)
+        self.grid = ThumbnailFrame(self, self.settings, files, self.skipped, self.curFileName)
+        self.grid.Show()
+
+    """ Called by the thumbnail grid when it is closed
+    """
+    def OnGridClosed(self):
+        self.grid = None
+        self.panel.SetFocus()
+
+    """ Mark images to be skipped, or unmark them.
+
+    Marked images are passed over when going to the next or previous
+    image, but they can still be opened from the grid.
+    """
+    def SetSkipped(self, fileNames, skipped):
+        if skipped:
+            self.skipped.update(fileNames)
+        else:
+            self.skipped.difference_update(fileNames)
+        # Don't decode what is passed over now, but do what no longer is
+        if self.curFileName is not None:
+            self.prefetcher.Schedule(self.todoFileList, self.doneFileList, self.skipped)
+
+    """ Return the set of images marked to be skipped, as stored earlier
+    """
+    def LoadSkipList(self):
+        fileName = self.settings.GetSkipListFile()
+        if not os.path.exists(fileName):
+            return set()
+        with open(fileName) as f:
+            return set([line.rstrip("\n") for line in f if line.strip() != ""])
+
+    """ Store the images marked to be skipped, for the next session.
+    """
+    def SaveSkipList(self):
+        fileName = self.settings.GetSkipListFile()
+        if len(self.skipped) == 0 and not os.path.exists(fileName):
+            return
+        try:
+            with open(fileName, 'w') as f:
+                for skipped in sorted(self.skipped):
+                    f.write(skipped + "\n")
+        except (IOError, OSError) as e:
+            print("Can't write %s: %s" % (fileName, e))
+
+    """ Close the frame.
+
+    Stop the background work, and wait until all log files are written.
+    """
+    def OnClose(self, event):
+        self.prefetcher.Stop()
+        self.SaveSkipList()
+        # The frame is destroyed before a CallAfter runs, so errors writing
+        # the last log files are collected, and reported here
+        errors = []
+        self.logger.SetErrorHandler(lambda log, error: errors.append((log, error)))
+        self.logger.Close()
+        for log, error in errors:
+            self.ReportLogError(log, error)
+        self.recorder.Close()
+        self.timing.Close()
+        if self.zoomCache is not None:
+            print(self.zoomCache.GetSummary())
+        print(self.budget.GetSummary())
+        # Let the default handler destroy the frame
+        event.Skip()
+
+    """ Called when the frame is idle.
+
+    Everything of the last interaction is painted by now, so it has ended.
+    The loupe is moved here, once for all mouse motion since the last
+    time. The rest of the idle time is used to render zoomed in views;
+    one at a time, so the frame stays responsive.
+    """
+    def OnIdle(self, event):
+        self.timing.End()
+        # Keep the image count up to date while images are discovered
+        if self.discovery is not None and self.discovery.Update() and self.curFileName is not None:
+            self.UpdateTitleBar(self.curFileName)
+        if self.loupePending:
+            self.loupePending = False
+            if self.loupe and not self.core.IsZoomed() and self.curSource is not None:
+                self.UpdateLoupe()
+            # Idle again once the loupe is painted, which ends its interaction
+            event.RequestMore()
+        elif self.zoomCache is not None and self.PrerenderZoom():
+            event.RequestMore()
+        event.Skip()
+
+    """ Called by the logger when a log file can't be written.
+
+    The logger calls this from its writer thread, so report it on the GUI thread.
+    """
+    def LogErrorHandler(self, log, error):
+        wx.CallAfter(self.ReportLogError, log, error)
+
+    """ Tell the user a log file could not be written.
+    """
+    def ReportLogError(self, log, error):
+        wx.MessageBox("Can't write " + log + ": " + str(error), "Error", wx.OK | wx.ICON_ERROR)
+
+    """ Return the AnnotationCore of this program.
+
+    Override it to give a program its own rules; the default core only
+    zooms and navigates, and logs nothing.
+    """
+    def CreateCore(self):
+        return AnnotationCore(self.settings, self.logger, self, self.recorder)
+
+    """ Zoom in at the mouse; called by the core
+    """
+    def ZoomIn(self):
+        self.ZoomAtLocation(self.currentMouseLocation)
+
+    """ Zoom out to the overview; called by the core
+    """
+    def ZoomOut(self):
+        self.SetPilImage()
+
     """ Default KeyboardEvent listener
     
-    Override it to change behavior of this abstract frame.
-    It currently does nothing.
+    The key is handed to the core, which decides what it does.
     """
     def KeyboardEvent(self, event):
-        return
+        self.core.HandleKey(event.GetKeyCode())
 
     """ Default MouseEventLeft listener
     
-    Override it to change behavior of this abstract frame.
-    It currently does nothing.
+    A click on the image (zoomed in, or through the loupe) is handed to
+    the core, which decides what it does.
     """
     def MouseEventLeft(self, event):
-        return
+        self.core.HandleClick(self.GetClickLocation(event))
 
     """ Default MouseEventRight listener
     
@@ -235,7 +728,13 @@ class AbstractFrame(wx.Frame):
     """ Stores the current mouse position on the frame.
 
     Stores the current mouse position on the active frame. Used
-    for zooming in.
+    for zooming in, and to move the loupe. The loupe is moved when the
+    frame is idle, so a burst of motion events renders it only once.
+    While shift is held within the loupe, it stays in place, so the cross
+    hair can be positioned on the magnified image.
     """
     def SetMouseLocation(self, event):
         self.currentMouseLocation = (event.GetX(), event.GetY())
+        if self.loupe and not self.core.IsZoomed() and self.curSource is not None:
+            self.loupeFrozen = event.ShiftDown() and self.IsInLoupe(self.currentMouseLocation)
+            self.loupePending = True
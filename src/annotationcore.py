@@ -0,0 +1,404 @@
+# AnnotationCore
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Annotation state and rules of the programs, independent of wx.
+
+An AnnotationCore holds everything the user builds up for an image: the
+points clicked so far, whether the view is zoomed in, skip mode and the
+current colour. It decides what a key or a click does, and when the
+points are logged. The frames only translate wx events for it, and do
+what it asks of them through the view interface: zoom in or out, draw a
+marking, open the next image, and so on.
+
+There is a core per program: VehiclesCore, DistancesCore and ViaductCore.
+Without a view (a NullView) the cores run headless, which is how
+replay.py replays recorded sessions.
+
+Keys are turned into actions ("zoom", "next", ...) first, so recordings
+don't depend on the key codes of the platform they were made on. An
+EventRecorder writes every image that is opened, every action and every
+click to a file, one JSON object per line.
+"""
+
+from __future__ import print_function
+
+import json
+import time
+
+from array import array
+
+""" Return the EventRecorder to use for the given settings.
+
+A NullRecorder if events are not recorded.
+"""
+def CreateRecorder(settings):
+    if not settings.UseEventRecording():
+        return NullRecorder()
+    return EventRecorder(settings.GetEventFile(), settings.GetLogHeader())
+
+class PointList():
+    """ Create an empty list of points.
+
+    The points are kept in typed arrays: the coordinates (x, y) of all
+    entries after each other, and the kind of every entry. An entry is
+    either a point, or a switch to the next lane. Coordinates are
+    stored as floats, as a zoom factor that isn't whole gives fractional
+    points; whole coordinates are returned as ints, so they are logged
+    as before.
+    """
+    POINT = 0
+    LANE = 1
+
+    def __init__(self):
+        self.coords = array('d')
+        self.kinds = array('B')
+
+    """ Append a point (x, y)
+    """
+    def Append(self, point):
+        self.coords.append(point[0])
+        self.coords.append(point[1])
+        self.kinds.append(self.POINT)
+
+    """ Append a switch to the next lane
+    """
+    def SwitchLane(self):
+        self.coords.append(0)
+        self.coords.append(0)
+        self.kinds.append(self.LANE)
+
+    """ Remove all entries
+    """
+    def Clear(self):
+        del self.coords[:]
+        del self.kinds[:]
+
+    """ Return the number of entries, lane switches included
+    """
+    def __len__(self):
+        return len(self.kinds)
+
+    """ Return coordinate i, as an int if it is a whole number
+    """
+    def GetCoord(self, i):
+        value = self.coords[i]
+        if value == int(value):
+            return int(value)
+        return value
+
+    """ Return the point of entry i, as (x, y)
+    """
+    def GetPoint(self, i):
+        return (self.GetCoord(2 * i), self.GetCoord(2 * i + 1))
+
+    """ Return the points, without the lane switches, as a list of (x, y)
+    """
+    def GetPoints(self):
+        return [self.GetPoint(i) for i in range(len(self.kinds)) if self.kinds[i] == self.POINT]
+
+    """ Return the entries as the Logger takes them.
+
+    A list of points (x, y), with -1 for every switch to the next lane.
+    """
+    def GetLocationList(self):
+        return [-1 if self.kinds[i] == self.LANE else self.GetPoint(i) for i in range(len(self.kinds))]
+
+class AnnotationCore():
+    """ Create the core of a program.
+
+    The view gets the calls ZoomIn, ZoomOut, AddMarking, OpenNextImage,
+    OpenPrevImage, ToggleLoupe and ShowGrid; see NullView. Without a view,
+    or a recorder, nothing is shown or recorded.
+    """
+    def __init__(self, settings, logger, view=None, recorder=None):
+        self.settings = settings
+        self.logger = logger
+        self.view = view or NullView()
+        self.recorder = recorder or NullRecorder()
+        # Key code -> action, for the actions of this program
+        self.keys = dict([(self.GetKey(action), action) for action in self.GetActions()])
+        self.fileName = None
+        self.points = PointList()
+        self.zoomed = False
+        self.skip = False
+        self.colour = settings.GetPrimaryColour()
+
+    """ Return the actions of this program
+    """
+    def GetActions(self):
+        return ["zoom", "next", "prev", "loupe", "grid"]
+
+    """ Return the key code of an action
+    """
+    def GetKey(self, action):
+        return {
+            "zoom": self.settings.GetZoomKey,
+            "next": self.settings.GetNextKey,
+            "prev": self.settings.GetPreviousKey,
+            "skip": self.settings.GetSkipKey,
+            "lane": self.settings.GetLaneSwitchKey,
+            "loupe": self.settings.GetLoupeKey,
+            "grid": self.settings.GetGridKey,
+        }[action]()
+
+    """ Return whether the view is zoomed in
+    """
+    def IsZoomed(self):
+        return self.zoomed
+
+    """ Return the colour new markings get
+    """
+    def GetColour(self):
+        return self.colour
+
+    """ Return the points of the current image
+    """
+    def GetPoints(self):
+        return self.points
+
+    """ Start on an image that has been opened.
+
+    The points, colour and zoom of the previous image are dropped; skip
+    mode stays until the next click.
+    """
+    def OpenImage(self, fileName):
+        self.recorder.Record({"event": "open", "file": fileName})
+        self.fileName = fileName
+        self.points.Clear()
+        self.zoomed = False
+        self.colour = self.settings.GetPrimaryColour()
+
+    """ Handle a key.
+
+    Return whether it is a key of this program.
+    """
+    def HandleKey(self, code):
+        action = self.keys.get(code)
+        if action is None:
+            return False
+        self.Do(action)
+        return True
+
+    """ Perform an action, e.g. "next"
+    """
+    def Do(self, action):
+        self.recorder.Record({"event": "action", "action": action})
+        getattr(self, "Do" + action.capitalize())()
+
+    """ Handle a click at a point (x, y) of the original image.
+
+    The point is None if the click could not be mapped to the image;
+    then nothing happens.
+    """
+    def HandleClick(self, point):
+        if point is None:
+            return
+        self.recorder.Record({"event": "click", "point": list(point)})
+        self.Click(point)
+
+    """ Toggle zoom
+    """
+    def DoZoom(self):
+        if self.zoomed:
+            self.zoomed = False
+            self.view.ZoomOut()
+        else:
+            self.zoomed = True
+            self.view.ZoomIn()
+
+    """ Log the points, and go to the next image
+    """
+    def DoNext(self):
+        self.Log()
+        self.view.OpenNextImage()
+
+    """ Go to the previous image; the points are not logged
+    """
+    def DoPrev(self):
+        self.view.OpenPrevImage()
+
+    """ Show or hide the loupe
+    """
+    def DoLoupe(self):
+        self.view.ToggleLoupe()
+
+    """ Show the thumbnail grid
+    """
+    def DoGrid(self):
+        self.view.ShowGrid()
+
+    """ Skip the next marking, but indicate it with a different coloured box
+    """
+    def DoSkip(self):
+        self.skip = True
+
+    """ Go on with the next lane
+    """
+    def DoLane(self):
+        self.points.SwitchLane()
+        self.colour = self.settings.GetSecondaryColour()
+
+    """ Zoom out, if zoomed in
+    """
+    def Unzoom(self):
+        if self.zoomed:
+            self.zoomed = False
+            self.view.ZoomOut()
+
+    """ Add a point; in skip mode, (0, 0) is added instead.
+
+    The marking is drawn at the clicked point either way.
+    """
+    def Click(self, point):
+        if self.skip:
+            self.skip = False
+            self.points.Append((0, 0))
+            self.view.AddMarking(point, self.settings.GetSkipColour())
+        else:
+            self.points.Append(point)
+            self.view.AddMarking(point, self.colour)
+        self.Unzoom()
+
+    """ Log the points of the current image.
+
+    Nothing is logged by default.
+    """
+    def Log(self):
+        pass
+
+class VehiclesCore(AnnotationCore):
+    """ Core of the vehicles program: points of a trajectory, which may be skipped.
+    """
+    def GetActions(self):
+        return AnnotationCore.GetActions(self) + ["skip"]
+
+    """ Log the trajectory, if it has at least two points
+    """
+    def Log(self):
+        if len(self.points) > 1:
+            self.logger.LogVehicle(self.fileName, self.points.GetLocationList())
+
+class DistancesCore(AnnotationCore):
+    """ Core of the distances program: points in two lanes, which may be skipped.
+    """
+    def GetActions(self):
+        return AnnotationCore.GetActions(self) + ["skip", "lane"]
+
+    """ Log the lanes, if there are at least two entries
+    """
+    def Log(self):
+        if len(self.points) > 1:
+            self.logger.LogDistances(self.fileName, self.points.GetLocationList())
+
+class ViaductCore(AnnotationCore):
+    """ Core of the viaduct program: exactly two points per image.
+
+    The points are logged, and the next image is opened, as soon as the
+    second one is added. Going to the next image by key logs nothing.
+    """
+    def Click(self, point):
+        self.view.AddMarking(point, self.settings.GetPrimaryColour())
+        self.Unzoom()
+        self.points.Append(point)
+        if len(self.points) == 2:
+            self.logger.LogViaduct(self.fileName, self.points.GetLocationList())
+            self.view.OpenNextImage()
+
+    def DoNext(self):
+        self.view.OpenNextImage()
+
+# The core of every program, by the header of its log files
+CORES = {
+    "TS#": VehiclesCore,
+    "Di#": DistancesCore,
+    "RV#": ViaductCore,
+}
+
+class NullView():
+    """ View that shows nothing, to run a core headless.
+
+    Opening images is left to whoever drives the core; it calls
+    OpenImage when the image is open.
+    """
+    def ZoomIn(self):
+        pass
+
+    def ZoomOut(self):
+        pass
+
+    def AddMarking(self, point, colour):
+        pass
+
+    def OpenNextImage(self):
+        pass
+
+    def OpenPrevImage(self):
+        pass
+
+    def ToggleLoupe(self):
+        pass
+
+    def ShowGrid(self):
+        pass
+
+class EventRecorder():
+    """ Start recording to a file.
+
+    Every session is appended to the file, and starts with an event
+    holding the header of the program.
+    """
+    def __init__(self, fileName, header):
+        self.fileName = fileName
+        self.file = None
+        self.Record({"event": "start", "header": header})
+
+    """ Record an event, a dictionary.
+
+    The time is added to it. The file is flushed, so nothing is lost when
+    the program crashes.
+    """
+    def Record(self, event):
+        if self.fileName is None:
+            return
+        event["time"] = round(time.time(), 3)
+        try:
+            if self.file is None:
+                self.file = open(self.fileName, 'a')
+            self.file.write(json.dumps(event, sort_keys=True) + "\n")
+            self.file.flush()
+        except (IOError, OSError) as e:
+            # Recording must never break the program
+            print("Can't write %s: %s" % (self.fileName, e))
+            self.fileName = None
+
+    """ Stop recording
+    """
+    def Close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class NullRecorder():
+    """ Recorder that is disabled: every method does nothing.
+    """
+    def Record(self, event):
+        pass
+
+    def Close(self):
+        pass
@@ -0,0 +1,144 @@
+# AnnotationStore
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Consolidated store of all logged annotations.
+
+Next to the per-image log files, every logged list of locations can be
+recorded in a single SQLite database. The store is append-only: logging
+an image again adds a new record, and the most recent record of an
+image and program is the one that counts.
+
+A record has one or more lanes, each with a list of points. Viaduct and
+vehicle records have a single lane; distance records have two, padded
+with (0, 0) just like the log files.
+"""
+
+import sqlite3
+import time
+
+class AnnotationStore():
+    """ Open (or create) the store in the given database file.
+
+    The connection is made on first use, so the store can be created on
+    one thread and used from another.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = None
+
+    """ Return the database connection, creating the tables if needed.
+
+    The coordinates have no type, so ints and floats are returned
+    exactly as they were logged.
+    """
+    def Connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.filename, check_same_thread=False)
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    image TEXT NOT NULL,
+                    program TEXT NOT NULL,
+                    written REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS points (
+                    record INTEGER NOT NULL REFERENCES records(id),
+                    lane INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    x NOT NULL,
+                    y NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS records_image ON records(image, program);
+                CREATE INDEX IF NOT EXISTS points_record ON points(record);
+            """)
+        return self.connection
+
+    """ Close the database connection
+    """
+    def Close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    """ Record the locations logged for an image.
+
+    Program is the header of the log file (RV#, TS# or Di#), lanes a
+    list with a list of (x, y) locations per lane.
+    """
+    def Record(self, program, image, lanes):
+        conn = self.Connect()
+        cur = conn.cursor()
+        cur.execute("INSERT INTO records (image, program, written) VALUES (?, ?, ?)", (image, program, time.time()))
+        record = cur.lastrowid
+        rows = []
+        for lane, locations in enumerate(lanes):
+            for seq, point in enumerate(locations):
+                rows.append((record, lane, seq, point[0], point[1]))
+        cur.executemany("INSERT INTO points (record, lane, seq, x, y) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+    """ Return the most recent records
+
+    A list of 3-tuples (record id, program, image) with the most recent
+    record of every image and program, optionally of one program only.
+    """
+    def GetLatestRecords(self, program=None):
+        query = "SELECT MAX(id), program, image FROM records"
+        args = ()
+        if program is not None:
+            query += " WHERE program = ?"
+            args = (program,)
+        query += " GROUP BY program, image ORDER BY program, image"
+        return self.Connect().execute(query, args).fetchall()
+
+    """ Return the lanes of a record
+
+    A list with a list of (x, y) locations per lane.
+    """
+    def GetLanes(self, record):
+        lanes = []
+        rows = self.Connect().execute("SELECT lane, x, y FROM points WHERE record = ? ORDER BY lane, seq", (record,))
+        for lane, x, y in rows:
+            while len(lanes) <= lane:
+                lanes.append([])
+            lanes[lane].append((x, y))
+        return lanes
+
+    """ Return the lanes most recently recorded for an image and program.
+
+    Return None if the image has no record for that program.
+    """
+    def GetImage(self, program, image):
+        row = self.Connect().execute("SELECT MAX(id) FROM records WHERE program = ? AND image = ?", (program, image)).fetchone()
+        if row[0] is None:
+            return None
+        return self.GetLanes(row[0])
+
+    """ Count the annotated images and points per program.
+
+    A list of 3-tuples (program, images, points), only counting the
+    most recent record of every image.
+    """
+    def GetCounts(self):
+        return self.Connect().execute("""
+            SELECT r.program, COUNT(DISTINCT r.image), COUNT(p.record)
+            FROM records r LEFT JOIN points p ON p.record = r.id
+            WHERE r.id IN (SELECT MAX(id) FROM records GROUP BY program, image)
+            GROUP BY r.program ORDER BY r.program
+        """).fetchall()
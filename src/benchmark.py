@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+# Benchmark
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Benchmark of the PIL <-> wx conversions.
+
+Compares the conversion path the programs used to take with the
+current one in Convert. For every image size the number of bytes
+copied and the time per megapixel is reported. Both wx to PIL paths copy
+the pixels twice: the current one only avoids the empty image the old
+one created first.
+
+wx is imported when the benchmark is created. Without wx, the stand-in
+for wx.Image of benchmarksuite is used, so only the PIL side of the
+conversions is measured.
+
+Usage: benchmark.py [megapixels ...]
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from PIL import Image
+
+class ConvertBenchmark():
+    """ Initialize the benchmark.
+
+    Every measurement is repeated, and the fastest run is reported.
+    """
+    def __init__(self, repeat=3):
+        # Puts its stand-in for wx in place if wx can't be imported
+        import benchmarksuite
+        from convert import Convert
+        self.wx = benchmarksuite.wx
+        self.repeat = repeat
+        self.convert = Convert()
+
+    """ Create a synthetic RGB image of (about) the given number of megapixels
+    """
+    def CreateImage(self, megapixels):
+        # 4:3, like the camera images
+        w = int((megapixels * 1000000 * 4 / 3) ** 0.5)
+        h = int(megapixels * 1000000 / w)
+        return Image.frombuffer('RGB', (w, h), os.urandom(w * h * 3), 'raw', 'RGB', 0, 1)
+
+    """ Number of bytes in the pixel data of a PIL image, wx.Image or string
+    """
+    def Bytes(self, obj):
+        if isinstance(obj, Image.Image):
+            # PIL pads RGB pixels to 4 bytes
+            return obj.size[0] * obj.size[1] * 4
+        if isinstance(obj, self.wx.Image):
+            return obj.GetWidth() * obj.GetHeight() * 3
+        return len(obj)
+
+    """ The PIL to wx path as it used to be, one step per copy.
+    """
+    def LegacyPilToImage(self, pil):
+        image = self.wx.EmptyImage(pil.size[0], pil.size[1])
+        rgb = pil.convert('RGB')
+        data = self.convert.PilToData(rgb)
+        image.SetData(data)
+        return [rgb, data, image]
+
+    """ The current PIL to wx path, one step per copy.
+    """
+    def FastPilToImage(self, pil):
+        if pil.mode != 'RGB':
+            pil = pil.convert('RGB')
+        data = self.convert.PilToData(pil)
+        image = self.convert.DataToImage(pil.size, data)
+        return [data, image]
+
+    """ The wx to PIL path as it used to be, one step per copy.
+    """
+    def LegacyImageToPil(self, image):
+        data = image.GetData()
+        pil = Image.new('RGB', (image.GetWidth(), image.GetHeight()))
+        if hasattr(pil, 'frombytes'):
+            pil.frombytes(data)
+        else:
+            pil.fromstring(data)
+        return [data, pil]
+
+    """ The current wx to PIL path, one step per copy.
+    """
+    def FastImageToPil(self, image):
+        data = self.convert.ImageToData(image)
+        pil = self.convert.DataToPil((image.GetWidth(), image.GetHeight()), data)
+        return [data, pil]
+
+    """ Run a conversion path, and return (bytes copied, seconds)
+    """
+    def Measure(self, path, arg):
+        best = None
+        for i in range(self.repeat):
+            start = time.time()
+            copies = path(arg)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return (sum([self.Bytes(c) for c in copies]), best)
+
+    """ Run all paths for the given image sizes, and print the results
+    """
+    def Run(self, sizes):
+        print("%-20s %6s %14s %10s" % ("path", "MP", "bytes copied", "ms/MP"))
+        for megapixels in sizes:
+            pil = self.CreateImage(megapixels)
+            image = self.convert.PilToImage(pil)
+            mp = pil.size[0] * pil.size[1] / 1000000.0
+            paths = [
+                ("PilToImage before", self.LegacyPilToImage, pil),
+                ("PilToImage after", self.FastPilToImage, pil),
+                ("ImageToPil before", self.LegacyImageToPil, image),
+                ("ImageToPil after", self.FastImageToPil, image),
+            ]
+            for name, path, arg in paths:
+                copied, elapsed = self.Measure(path, arg)
+                print("%-20s %6.1f %14d %10.2f" % (name, mp, copied, elapsed * 1000 / mp))
+
+if __name__ == '__main__':
+    sizes = [float(a) for a in sys.argv[1:]] or [1, 5, 12, 24]
+    ConvertBenchmark().Run(sizes)
@@ -0,0 +1,499 @@
+#!/usr/bin/python
+
+# BenchmarkSuite
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Micro-benchmarks of the image and logging hot paths.
+
+Times Convert.PilToImage, ImageOperations.ScaleWxImage,
+ScaleWxImageForced, SetMarking and CalculateViewPort, the Resampler
+against plain bilinear scaling, and Logger.GenericLog and LogDistances,
+on synthetic images of 1 to 50 megapixels and on lists of 2 to 10000
+locations.
+
+Every case runs in a fresh process, so its peak memory can be measured
+on its own. The reported time is the fastest of a number of runs; the
+peak memory is the growth of the peak resident set size while running
+the case (plus the peak of the Python heap, where tracemalloc exists).
+
+None of the benchmarked code needs a display. If wx can't be imported,
+or with --stub-wx, a minimal stand-in for wx.Image that keeps its pixels
+in a PIL image is used, and the results are marked as such.
+
+Results can be saved as JSON, and compared with an earlier run, so
+regressions show up between versions.
+
+Usage: benchmarksuite.py [--quick] [--stub-wx] [--repeat n]
+                         [--json file] [--compare file]
+"""
+
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+import types
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from PIL import Image
+
+# Set for the worker processes as well, which may not inherit sys.argv
+STUB_WX_VARIABLE = "TFA_BENCHMARK_STUB_WX"
+
+""" Stand-in for wx.Image, for running without wx.
+
+Only what the benchmarked code uses is implemented. Scale uses nearest
+neighbour resampling, like wx.Image does at its default quality.
+"""
+class StubImage():
+    def __init__(self, width, height, data=None, pil=None):
+        if pil is None:
+            if data is None:
+                pil = Image.new('RGB', (width, height))
+            else:
+                pil = Image.frombuffer('RGB', (width, height), data, 'raw', 'RGB', 0, 1)
+        self.pil = pil
+
+    def GetWidth(self):
+        return self.pil.size[0]
+
+    def GetHeight(self):
+        return self.pil.size[1]
+
+    def Scale(self, width, height):
+        return StubImage(width, height, pil=self.pil.resize((width, height), Image.NEAREST))
+
+    def GetData(self):
+        return self.pil.tobytes()
+
+    def SetData(self, data):
+        self.pil = Image.frombuffer('RGB', self.pil.size, data, 'raw', 'RGB', 0, 1)
+
+""" Return whether wx is replaced by the stand-in
+"""
+def UseStubWx():
+    if os.environ.get(STUB_WX_VARIABLE) == "1" or "--stub-wx" in sys.argv:
+        return True
+    try:
+        import wx
+    except ImportError:
+        return True
+    return False
+
+if UseStubWx():
+    os.environ[STUB_WX_VARIABLE] = "1"
+    wx = types.ModuleType('wx')
+    wx.Image = StubImage
+    wx.EmptyImage = StubImage
+    sys.modules['wx'] = wx
+else:
+    import wx
+
+from convert import Convert
+from imageoperations import ImageOperations
+from logger import Logger
+from resample import Resampler
+from settings import Settings
+
+# The cases, with the parameter they are run for
+CASES = [
+    ("PilToImage", "megapixels"),
+    ("ScaleWxImage", "megapixels"),
+    ("ScaleWxImageForced", "megapixels"),
+    ("ResampleOverviewBilinear", "megapixels"),
+    ("ResampleOverviewAuto", "megapixels"),
+    ("ResampleZoomBilinear", "megapixels"),
+    ("ResampleZoomAuto", "megapixels"),
+    ("SetMarking", "points"),
+    ("CalculateViewPort", "points"),
+    ("CalculateViewPortBatch", "points"),
+    ("GenericLog", "points"),
+    ("LogDistances", "points"),
+]
+
+MEGAPIXELS = [1, 5, 12, 24, 50]
+POINTS = [2, 10, 100, 1000, 10000]
+
+QUICK_MEGAPIXELS = [1, 5]
+QUICK_POINTS = [2, 100, 1000]
+
+# Size of the image the points are in
+ORIGINAL_SIZE = (4000, 3000)
+
+""" Run a single case, in a worker process.
+
+The result, or the error, is put on the queue as a dictionary.
+"""
+def RunCase(results, name, param, repeat):
+    try:
+        results.put(BenchmarkSuite(repeat).Measure(name, param))
+    except Exception as e:
+        results.put({"case": name, "param": param, "error": "%s: %s" % (type(e).__name__, e)})
+
+class BenchmarkSuite():
+    """ Initialize the suite.
+
+    Every case is run repeat times, and the fastest run is reported.
+    """
+    def __init__(self, repeat=5):
+        self.repeat = repeat
+        self.settings = Settings("benchmark")
+        self.convert = Convert()
+        self.imageoperations = ImageOperations()
+        self.resampler = Resampler()
+        # Same seed every time, so every run uses the same locations
+        self.random = random.Random(2012)
+        self.directory = None
+
+    """ Create a synthetic RGB image of (about) the given number of megapixels
+
+    The contents don't matter to the benchmarked code, only the size does.
+    """
+    def CreateImage(self, megapixels):
+        # 4:3, like the camera images
+        w = int((megapixels * 1000000 * 4 / 3) ** 0.5)
+        h = int(megapixels * 1000000 / w)
+        return Image.new('RGB', (w, h), (96, 128, 160))
+
+    """ Create a list of random locations in the original image
+    """
+    def CreateLocations(self, points):
+        return [(self.random.randint(0, ORIGINAL_SIZE[0] - 1), self.random.randint(0, ORIGINAL_SIZE[1] - 1)) for i in range(points)]
+
+    """ Return the current peak resident set size in bytes, or None if unknown
+    """
+    def PeakMemory(self):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        if sys.platform == 'darwin':
+            return peak
+        return peak * 1024
+
+    """ Prepare the PilToImage case
+
+    Every Prepare method sets up a case, and returns a function that runs it once.
+    """
+    def PreparePilToImage(self, megapixels):
+        pil = self.CreateImage(megapixels)
+        return lambda: self.convert.PilToImage(pil)
+
+    """ Prepare the ScaleWxImage case: fitting a whole image on the display
+    """
+    def PrepareScaleWxImage(self, megapixels):
+        image = self.convert.PilToImage(self.CreateImage(megapixels))
+        size = self.settings.GetDisplaySize()
+        return lambda: self.imageoperations.ScaleWxImage(image, size)
+
+    """ Prepare the ScaleWxImageForced case.
+
+    As when zooming in: the part of the image that is shown at the zoom
+    factor is scaled up (or down) to the display.
+    """
+    def PrepareScaleWxImageForced(self, megapixels):
+        pil = self.CreateImage(megapixels)
+        zoom = self.settings.GetZoomFactor()
+        crop = pil.crop((0, 0, pil.size[0] // zoom, pil.size[1] // zoom))
+        image = self.convert.PilToImage(crop)
+        size = self.settings.GetDisplaySize()
+        return lambda: self.imageoperations.ScaleWxImageForced(image, size)
+
+    """ Prepare scaling a whole image to fit the display, as for the overview.
+
+    With the given strategy, or the one the Resampler selects.
+    """
+    def PrepareResampleOverview(self, megapixels, strategy=None):
+        pil = self.CreateImage(megapixels)
+        size = self.imageoperations.CalculateScaledSize(pil.size, self.settings.GetDisplaySize())
+        if strategy is None:
+            return lambda: self.resampler.Resize(pil, size)
+        return lambda: self.resampler.GetStrategy(strategy).Resize(pil, size)
+
+    """ Prepare the ResampleOverviewBilinear case: the overview as it used to be scaled
+    """
+    def PrepareResampleOverviewBilinear(self, megapixels):
+        return self.PrepareResampleOverview(megapixels, "bilinear")
+
+    """ Prepare the ResampleOverviewAuto case: the overview as the Resampler scales it
+    """
+    def PrepareResampleOverviewAuto(self, megapixels):
+        return self.PrepareResampleOverview(megapixels, None)
+
+    """ Prepare scaling the part of an image that is shown at the zoom factor to the display.
+
+    With the given strategy, or the one the Resampler selects.
+    """
+    def PrepareResampleZoom(self, megapixels, strategy=None):
+        pil = self.CreateImage(megapixels)
+        size = self.settings.GetDisplaySize()
+        zoom = self.settings.GetZoomFactor()
+        box = (0, 0, size[0] // zoom, size[1] // zoom)
+        if strategy is None:
+            return lambda: self.resampler.Resize(pil, size, box)
+        # The crop is what the zoom did before the Resampler
+        return lambda: self.resampler.GetStrategy(strategy).Resize(pil.crop(box), size)
+
+    """ Prepare the ResampleZoomBilinear case: the zoomed in view as it used to be scaled
+    """
+    def PrepareResampleZoomBilinear(self, megapixels):
+        return self.PrepareResampleZoom(megapixels, "bilinear")
+
+    """ Prepare the ResampleZoomAuto case: the zoomed in view as the Resampler scales it
+    """
+    def PrepareResampleZoomAuto(self, megapixels):
+        return self.PrepareResampleZoom(megapixels, None)
+
+    """ Prepare the SetMarking case: marking all points on an image of the camera size
+    """
+    def PrepareSetMarking(self, points):
+        pil = Image.new('RGB', ORIGINAL_SIZE)
+        locations = self.CreateLocations(points)
+        colour = self.settings.GetPrimaryColour()
+        offset = self.settings.GetMarkingOffset()
+        width = self.settings.GetMarkingWidth()
+
+        def Run():
+            for point in locations:
+                self.imageoperations.SetMarking(pil, point, colour, offset, width)
+        return Run
+
+    """ Prepare the CalculateViewPort case: a viewport for every point, one by one
+    """
+    def PrepareCalculateViewPort(self, points):
+        locations = self.CreateLocations(points)
+        zoom = self.settings.GetZoomFactor()
+        scalesize = self.imageoperations.CalculateScaledSize(ORIGINAL_SIZE, self.settings.GetDisplaySize())
+
+        def Run():
+            for location in locations:
+                self.imageoperations.CalculateViewPort(zoom, location, ORIGINAL_SIZE, scalesize)
+        return Run
+
+    """ Prepare the CalculateViewPortBatch case: the viewports of all points at once
+    """
+    def PrepareCalculateViewPortBatch(self, points):
+        locations = self.CreateLocations(points)
+        zoom = self.settings.GetZoomFactor()
+        scalesize = self.imageoperations.CalculateScaledSize(ORIGINAL_SIZE, self.settings.GetDisplaySize())
+        return lambda: self.imageoperations.CalculateViewPortBatch(zoom, locations, ORIGINAL_SIZE, scalesize, True)
+
+    """ Create a logger that writes to a temporary directory.
+
+    Logging is synchronous, so the time includes writing the file.
+    """
+    def CreateLogger(self):
+        self.directory = tempfile.mkdtemp(prefix="benchmark")
+        self.settings.SetOutDir(self.directory)
+        self.settings.SetAsyncLogging(False)
+        return Logger(self.settings)
+
+    """ Prepare the GenericLog case
+    """
+    def PrepareGenericLog(self, points):
+        logger = self.CreateLogger()
+        locations = self.CreateLocations(points)
+        return lambda: logger.GenericLog("TS#", "benchmark.jpg", locations)
+
+    """ Prepare the LogDistances case: half of the points in each lane
+    """
+    def PrepareLogDistances(self, points):
+        logger = self.CreateLogger()
+        locations = self.CreateLocations(points)
+        locations.insert(points // 2, -1)
+        return lambda: logger.LogDistances("benchmark.jpg", locations)
+
+    """ Remove what the cases left behind
+    """
+    def Cleanup(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, True)
+            self.directory = None
+
+    """ Measure a case.
+
+    Return a dictionary with the fastest and the median time in seconds,
+    and the peak memory in bytes.
+    """
+    def Measure(self, name, param):
+        try:
+            run = getattr(self, "Prepare" + name)(param)
+            before = self.PeakMemory()
+
+            times = []
+            for i in range(self.repeat):
+                start = timeit.default_timer()
+                run()
+                times.append(timeit.default_timer() - start)
+            times.sort()
+
+            after = self.PeakMemory()
+            result = {
+                "case": name,
+                "param": param,
+                "best": times[0],
+                "median": times[len(times) // 2],
+                "peak_rss": None,
+                "peak_traced": None,
+            }
+            if before is not None:
+                result["peak_rss"] = after - before
+
+            # Tracing slows everything down, so it gets a run of its own
+            if tracemalloc is not None:
+                tracemalloc.start()
+                run()
+                result["peak_traced"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return result
+        finally:
+            self.Cleanup()
+
+    """ Run all cases, each in a process of its own.
+
+    Return the list of results.
+    """
+    def Run(self, megapixels, points):
+        results = []
+        queue = multiprocessing.Queue()
+        for name, kind in CASES:
+            params = megapixels if kind == "megapixels" else points
+            for param in params:
+                process = multiprocessing.Process(target=RunCase, args=(queue, name, param, self.repeat))
+                process.start()
+                result = queue.get()
+                process.join()
+                results.append(result)
+                self.PrintResult(result)
+        return results
+
+    """ Print the header of the result table
+    """
+    def PrintHeader(self):
+        print("%-24s %8s %12s %12s %12s %12s" % ("case", "param", "best ms", "median ms", "peak rss MB", "traced MB"))
+
+    """ Print a single result
+    """
+    def PrintResult(self, result):
+        if "error" in result:
+            print("%-24s %8s %s" % (result["case"], result["param"], result["error"]))
+            return
+        print("%-24s %8s %12.3f %12.3f %12s %12s" % (result["case"], result["param"],
+            result["best"] * 1000, result["median"] * 1000,
+            self.FormatBytes(result["peak_rss"]), self.FormatBytes(result["peak_traced"])))
+
+    """ Format a number of bytes as megabytes
+    """
+    def FormatBytes(self, value):
+        if value is None:
+            return "-"
+        return "%.1f" % (value / 1048576.0)
+
+    """ Describe the environment the results were measured in
+    """
+    def GetEnvironment(self):
+        if hasattr(wx, 'version'):
+            wxversion = wx.version()
+        else:
+            wxversion = "stub"
+        return {
+            "python": platform.python_version(),
+            "pil": getattr(Image, '__version__', getattr(Image, 'VERSION', None)),
+            "wx": wxversion,
+            "platform": platform.platform(),
+            "repeat": self.repeat,
+        }
+
+    """ Save the results as JSON
+    """
+    def Save(self, filename, results):
+        fh = open(filename, 'w')
+        try:
+            json.dump({"environment": self.GetEnvironment(), "results": results}, fh, indent=1, sort_keys=True)
+            fh.write("\n")
+        finally:
+            fh.close()
+
+    """ Compare results with those in an earlier saved file.
+
+    Print the change of the fastest time of every case in both.
+    """
+    def Compare(self, filename, results):
+        fh = open(filename, 'r')
+        try:
+            old = json.load(fh)
+        finally:
+            fh.close()
+        previous = dict([((r["case"], r["param"]), r) for r in old["results"] if "error" not in r])
+
+        print()
+        print("%-24s %8s %12s %12s %8s" % ("case", "param", "before ms", "after ms", "change"))
+        for result in results:
+            key = (result["case"], result["param"])
+            if "error" in result or key not in previous:
+                continue
+            before = previous[key]["best"]
+            after = result["best"]
+            change = "-"
+            if before > 0:
+                change = "%+.0f%%" % ((after - before) * 100 / before)
+            print("%-24s %8s %12.3f %12.3f %8s" % (key[0], key[1], before * 1000, after * 1000, change))
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    repeat = 5
+    output = None
+    compare = None
+    megapixels = MEGAPIXELS
+    points = POINTS
+    while len(args) > 0:
+        arg = args.pop(0)
+        if arg == "--quick":
+            megapixels = QUICK_MEGAPIXELS
+            points = QUICK_POINTS
+        elif arg == "--repeat":
+            repeat = int(args.pop(0))
+        elif arg == "--json":
+            output = args.pop(0)
+        elif arg == "--compare":
+            compare = args.pop(0)
+
+    suite = BenchmarkSuite(repeat)
+    print("wx: %s" % suite.GetEnvironment()["wx"])
+    suite.PrintHeader()
+    results = suite.Run(megapixels, points)
+    if output is not None:
+        suite.Save(output, results)
+    if compare is not None:
+        suite.Compare(compare, results)
@@ -0,0 +1,104 @@
+# ImageCanvas
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Canvas the images are displayed on.
+
+A single panel, that lives as long as the frame, paints the current view
+bitmap in its upper left corner. Showing another image only replaces the
+bitmap; no widgets are created or destroyed, and event bindings stay in
+place. Painting is double buffered, and only the damaged part of the
+canvas is repainted, so adding a marking only redraws the marking.
+
+Being the only child of the frame, the canvas fills its client area, so
+the image is placed at (0, 0) on every platform.
+
+On top of the view bitmap, a smaller inset bitmap (the loupe) can be
+shown anywhere on the canvas. Moving it only repaints where it was, and
+where it is now.
+"""
+
+import wx
+
+class ImageCanvas(wx.Panel):
+    """ Create the canvas on the given parent.
+    """
+    def __init__(self, parent):
+        wx.Panel.__init__(self, parent, wx.ID_ANY)
+        # All painting is done in OnPaint, so the background is never erased first
+        self.SetBackgroundStyle(getattr(wx, 'BG_STYLE_PAINT', wx.BG_STYLE_CUSTOM))
+        self.background = wx.Brush(self.GetBackgroundColour())
+        self.border = wx.Pen(wx.BLACK, 1)
+        self.bitmap = None
+        # The inset bitmap and its position (x, y), if any
+        self.inset = None
+        self.insetPosition = None
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+
+    """ Show a bitmap, replacing the current one.
+
+    The bitmap may still be drawn on; call RefreshArea afterwards.
+    """
+    def SetBitmap(self, bitmap):
+        self.bitmap = bitmap
+        self.Refresh(False)
+
+    """ Return the bitmap that is shown
+    """
+    def GetBitmap(self):
+        return self.bitmap
+
+    """ Show an inset bitmap at position (x, y), replacing the current one.
+
+    With bitmap None, the inset is hidden.
+    """
+    def SetInset(self, bitmap, position=None):
+        self.RefreshInset()
+        self.inset = bitmap
+        self.insetPosition = position
+        self.RefreshInset()
+
+    """ Repaint the area of the inset, including its border
+    """
+    def RefreshInset(self):
+        if self.inset is not None:
+            x, y = self.insetPosition
+            self.RefreshArea((x - 1, y - 1, self.inset.GetWidth() + 2, self.inset.GetHeight() + 2))
+
+    """ Repaint a rectangle (x, y, width, height) of the canvas.
+    """
+    def RefreshArea(self, rect):
+        self.RefreshRect(wx.Rect(*rect), False)
+
+    """ Paint the damaged part of the canvas.
+
+    The paint DC is clipped to the damaged region, so only that part is
+    cleared and blitted.
+    """
+    def OnPaint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(self.background)
+        dc.Clear()
+        if self.bitmap is not None:
+            dc.DrawBitmap(self.bitmap, 0, 0)
+        if self.inset is not None:
+            x, y = self.insetPosition
+            dc.DrawBitmap(self.inset, x, y)
+            dc.SetPen(self.border)
+            dc.SetBrush(wx.TRANSPARENT_BRUSH)
+            dc.DrawRectangle(x - 1, y - 1, self.inset.GetWidth() + 2, self.inset.GetHeight() + 2)
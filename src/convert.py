@@ -2,6 +2,12 @@
 """ Conversion convenience class that allows 
 
 different Pil <-> wxPython image conversions.
+
+The conversions avoid intermediate copies where possible: RGB images
+are not converted again, and wx images are created straight from the
+pixel data. From wx to PIL the pixels are copied twice, out of the
+wx.Image and into the PIL image; a PIL image can't safely share the
+buffer of a wx.Image.
 """
 import wx
 from PIL import Image
@@ -10,7 +16,7 @@ class Convert():
     """ Convert a bitmap to a PIL image
     """
     def BitmapToPil(self, bitmap):
-        return ImageToPil(BitmapToImage(bitmap))
+        return self.ImageToPil(self.BitmapToImage(bitmap))
 
     """ Convert a bitmap to an wx.Image
     """
@@ -25,18 +31,55 @@ class Convert():
     """ Convert a PIL image to a bitmap
     """
     def PilToBitmap(self, pil):
-        return ImageToBitmap(PilToImage(pil))
+        return self.ImageToBitmap(self.PilToImage(pil))
 
     """ Convert a PIL image to a wx.Image
     """
     def PilToImage(self, pil):
-        image = wx.EmptyImage(pil.size[0], pil.size[1])
-        image.SetData(pil.convert('RGB').tostring())
-        return image
+        if pil.mode != 'RGB':
+            pil = pil.convert('RGB')
+        return self.DataToImage(pil.size, self.PilToData(pil))
 
     """ Convert an wx.Image to a PIL image
+
+    The pixels are copied; sharing the buffer of the wx.Image would leave
+    the PIL image pointing at freed memory once the wx.Image is gone,
+    e.g. the temporary one of BitmapToPil.
     """
     def ImageToPil(self, image):
-        pil = Image.new('RGB',(image.GetWidth(), image.GetHeight()))
-        pil.fromstring(image.GetData())
-        return pil
+        return self.DataToPil((image.GetWidth(), image.GetHeight()), self.ImageToData(image))
+
+    """ Return a copy of the packed RGB data of a wx.Image
+    """
+    def ImageToData(self, image):
+        return bytes(image.GetData())
+
+    """ Create a PIL image from packed RGB data
+
+    The data is copied into the image. Old versions of PIL only know
+    fromstring.
+    """
+    def DataToPil(self, size, data):
+        if hasattr(Image, 'frombytes'):
+            return Image.frombytes('RGB', size, data)
+        return Image.fromstring('RGB', size, data)
+
+    """ Return the packed pixel data of a PIL image
+
+    PIL stores pixels padded, so this is always a copy.
+    Old versions of PIL only know tostring.
+    """
+    def PilToData(self, pil):
+        if hasattr(pil, 'tobytes'):
+            return pil.tobytes()
+        return pil.tostring()
+
+    """ Create a wx.Image from packed RGB data
+
+    The data is copied straight into the image, without
+    allocating and initializing an empty image first.
+    """
+    def DataToImage(self, size, data):
+        if hasattr(wx, 'ImageFromData'):
+            return wx.ImageFromData(size[0], size[1], data)
+        return wx.Image(size[0], size[1], data)
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+
+# Export
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Export program.
+
+Regenerate the RV#, TS# and Di# log files from the annotation store,
+using the most recent record of every image. With --counts, only print
+the number of annotated images and points per program.
+
+Usage: export.py [--counts] [output directory]
+"""
+
+from __future__ import print_function
+
+import inspect
+import sys
+
+from annotationstore import AnnotationStore
+from logger import Logger
+from settings import Settings
+
+if __name__ == '__main__':
+    settings = Settings(inspect.getfile(inspect.currentframe()))
+    args = sys.argv[1:]
+    counts = "--counts" in args
+    args = [a for a in args if a != "--counts"]
+    if len(args) > 0:
+        settings.SetOutDir(args[0])
+
+    store = AnnotationStore(settings.GetAnnotationStore())
+
+    if counts:
+        for program, images, points in store.GetCounts():
+            print("%s %d images, %d points" % (program, images, points))
+    else:
+        logger = Logger(settings)
+        records = store.GetLatestRecords()
+        for record, program, image in records:
+            lanes = store.GetLanes(record)
+            # Distances are always written as two lines
+            if program == "Di#":
+                while len(lanes) < 2:
+                    lanes.append([])
+            logger.LogLanes(program, image, lanes, record=False)
+        logger.Close()
+        print("%d log files written to %s" % (len(records), settings.GetOutDir()))
+
+    store.Close()
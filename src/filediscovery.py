@@ -0,0 +1,263 @@
+# FileDiscovery
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Discovery of the images to process.
+
+Images are found in the background, so the first one can be displayed
+as soon as it is found. Every directory is listed once, without stat
+calls where the platform allows it, and (optionally) recursed into.
+
+The list of found images can be kept in an index file. On the next start
+the index is used right away, and the directory is rescanned in the
+background for images that were added or removed in the meantime.
+
+The todo list belongs to the thread that uses it. The background thread
+only queues the images it adds or removes; Update applies them to the
+todo list, on the thread that uses it.
+"""
+
+import os
+import re
+import tempfile
+import threading
+
+from collections import deque
+
+# os.scandir is only available from Python 3.5 on; the scandir
+# package provides it for older versions.
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# Kinds of changes to the todo list
+ADD = 0
+REMOVE = 1
+
+class FileDiscovery():
+    """ Initialize the discovery of images in the given directory.
+
+    Recursion, ordering and the index are taken from the settings.
+    """
+    def __init__(self, settings, directory):
+        self.settings = settings
+        self.directory = directory
+        self.recursive = settings.GetRecursiveDiscovery()
+        self.natural = settings.UseNaturalSort()
+        self.indexFile = None
+        if settings.UseFileIndex():
+            self.indexFile = settings.GetFileIndex(directory)
+        # The images found so far, that still have to be processed
+        self.todo = deque()
+        # Changes to todo that are not applied yet, as (ADD or REMOVE, path)
+        self.changes = deque()
+        self.done = False
+        self.condition = threading.Condition()
+
+    """ Start discovering images in the background.
+
+    Returns the todo list, a deque, as soon as it contains at least one
+    image or the discovery is done. Only the calling thread may use it;
+    images found later are added by Update and Wait.
+    """
+    def Start(self):
+        indexed = self.ReadIndex()
+        if indexed is not None:
+            self.todo.extend(indexed)
+
+        thread = threading.Thread(target=self.Discover, args=(indexed,))
+        thread.daemon = True
+        thread.start()
+
+        self.Wait()
+        return self.todo
+
+    """ Apply the images found or removed since the last time to the todo list.
+
+    Call it from the thread that uses the todo list. Return whether the
+    todo list changed.
+    """
+    def Update(self):
+        with self.condition:
+            changes = self.changes
+            self.changes = deque()
+        for change, path in changes:
+            if change == ADD:
+                self.todo.append(path)
+            else:
+                try:
+                    self.todo.remove(path)
+                except ValueError:
+                    # Already processed
+                    pass
+        return len(changes) > 0
+
+    """ Wait until there is an image to process, or the discovery is done.
+
+    Call it from the thread that uses the todo list; it is updated.
+    """
+    def Wait(self):
+        self.Update()
+        while len(self.todo) == 0:
+            with self.condition:
+                while not self.done and len(self.changes) == 0:
+                    self.condition.wait()
+                done = self.done
+            self.Update()
+            if done:
+                return
+
+    """ Return whether all images are found
+    """
+    def IsDone(self):
+        return self.done
+
+    """ Walk the directory, and append new images to the todo list.
+
+    Images in indexed are already in the todo list. Ones that don't
+    exist anymore are removed from it; the index is updated afterwards.
+    Runs in the background, so changes to the todo list are only queued.
+    """
+    def Discover(self, indexed):
+        known = set(indexed or [])
+        found = []
+        try:
+            for path in self.Iterate():
+                found.append(path)
+                if path not in known:
+                    with self.condition:
+                        self.changes.append((ADD, path))
+                        self.condition.notify_all()
+
+            with self.condition:
+                self.changes.extend([(REMOVE, path) for path in known.difference(found)])
+                self.condition.notify_all()
+
+            self.WriteIndex(found)
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    """ Iterate over all images in the directory.
+
+    Per directory the images come first, in order, followed by the
+    images in the subdirectories if discovery is recursive.
+    """
+    def Iterate(self):
+        return self.IterateDirectory(self.directory)
+
+    """ Return all images in the directory by name.
+
+    A dictionary from the name of an image, without directory and
+    extension, to its path; the name log files use. If names occur more
+    than once, the first image wins, in the order of Iterate.
+    """
+    def GetImagesByName(self):
+        images = {}
+        for path in self.Iterate():
+            images.setdefault(os.path.splitext(os.path.basename(path))[0], path)
+        return images
+
+    """ Iterate over the images in a single directory, and its subdirectories.
+    """
+    def IterateDirectory(self, directory):
+        files, dirs = self.ListDirectory(directory)
+        for f in self.Sort(files):
+            yield directory + os.sep + f
+        if self.recursive:
+            for d in self.Sort(dirs):
+                for path in self.IterateDirectory(directory + os.sep + d):
+                    yield path
+
+    """ List a directory.
+
+    Return a 2-tuple (images, subdirectories) with the names of the images
+    and, if discovery is recursive, the subdirectories.
+    """
+    def ListDirectory(self, directory):
+        files = []
+        dirs = []
+        if scandir is not None:
+            for entry in scandir(directory):
+                if self.recursive and entry.is_dir():
+                    dirs.append(entry.name)
+                elif self.settings.IsValidType(os.path.splitext(entry.name.lower())[1]):
+                    files.append(entry.name)
+        else:
+            for name in os.listdir(directory):
+                if self.recursive and os.path.isdir(directory + os.sep + name):
+                    dirs.append(name)
+                elif self.settings.IsValidType(os.path.splitext(name.lower())[1]):
+                    files.append(name)
+        return (files, dirs)
+
+    """ Sort a list of names
+
+    Either plain, or natural: numbers are compared by value, so
+    image2 comes before image10.
+    """
+    def Sort(self, names):
+        if self.natural:
+            return sorted(names, key=self.NaturalSortKey)
+        return sorted(names)
+
+    """ Return the key to sort a name in natural order
+    """
+    def NaturalSortKey(self, name):
+        parts = re.split(r'(\d+)', name)
+        # Pair every part with a flag, so numbers and text are never compared
+        return [(0, int(p), p) if p.isdigit() else (1, 0, p) for p in parts]
+
+    """ Read the image index
+
+    Return the list of indexed images, or None if there is no index.
+    """
+    def ReadIndex(self):
+        if self.indexFile is None or not os.path.exists(self.indexFile):
+            return None
+        fh = open(self.indexFile, 'r')
+        try:
+            return [line.rstrip('\n') for line in fh if line.strip() != ""]
+        finally:
+            fh.close()
+
+    """ Write the image index.
+
+    The index is written under a temporary name first, so an interrupted
+    write never leaves a partial index behind.
+    """
+    def WriteIndex(self, paths):
+        if self.indexFile is None:
+            return
+        directory = os.path.dirname(self.indexFile)
+        if directory != "" and not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=directory or '.')
+        fh = os.fdopen(fd, 'w')
+        try:
+            fh.write("\n".join(paths) + "\n")
+        finally:
+            fh.close()
+        if os.path.exists(self.indexFile):
+            os.remove(self.indexFile)
+        os.rename(tmp, self.indexFile)
@@ -23,35 +23,78 @@ This class is used to do most of the image-related work.
 It can be used to return a (zoomed in) viewport of an image, 
 set markers on certan (x,y) locations, or translate (x,y) locations
 to real coordinates inside the source image.
+
+The coordinate transforms have batch versions that work on NumPy arrays
+of points. The scalar versions compute the same in plain Python, which
+is much faster for a single point. Given only integers, they use integer
+division and return integers, under Python 2 and 3 alike, so logged
+coordinates are the same on both; before, Python 3 returned floats.
+Given any float, they divide exactly, like the batch versions by default.
 """
-import wx
+import numpy
+import operator
 
-from PIL import Image
 from PIL import ImageDraw
-from convert import Convert
+
+from resample import Resampler
+
+# The integer types, checked directly as the ABC numbers.Integral is slow
+try:
+    INTEGRAL = (int, long, numpy.integer)
+except NameError:
+    INTEGRAL = (int, numpy.integer)
 
 class ImageOperations():
     """ Return a viewport.
     
     Calculated based on the zoomlevel and location 2-tuple (x,y) of mousepointer
     Returning 4-tuple is (left, up, right, bottom) coords of the viewport
+    The viewport fills an area of viewsize, or the whole scaled image if not given.
     """
-    def CalculateViewPort(self, zoom, location, orgsize, scalesize):
+    def CalculateViewPort(self, zoom, location, orgsize, scalesize, viewsize=None):
+        if viewsize is None:
+            viewsize = scalesize
+        divide = self.GetDivision(zoom, location, orgsize, scalesize, viewsize)
         # Don't exceed app size
-        view_width = scalesize[0] / zoom
-        view_height = scalesize[1] / zoom
+        view_width = divide(viewsize[0], zoom)
+        view_height = divide(viewsize[1], zoom)
         # Map the coords
-        location_mapped = self.GetOriginalCoordFromScaledCoord(location, orgsize, scalesize)
-        x = location_mapped[0]
-        y = location_mapped[1]
+        x = divide(location[0] * orgsize[0], scalesize[0])
+        y = divide(location[1] * orgsize[1], scalesize[1])
         # And calculate the four specific boundaries based on mapped coords
-        left = x - view_width / 2
-        right = x + view_width / 2
-        up = y - view_height / 2
-        bottom = y + view_height / 2
+        left = x - divide(view_width, 2)
+        right = x + divide(view_width, 2)
+        up = y - divide(view_height, 2)
+        bottom = y + divide(view_height, 2)
 
         return self.ValidateViewport(left, up, right, bottom)
 
+    """ Return viewports for an array of locations.
+
+    Locations is an array (N, 2) of mousepointer locations; orgsize and
+    scalesize are (width, height), or arrays (N, 2) with one per location.
+    Returns an array (N, 4) of (left, up, right, bottom) viewports.
+    If integer is True, every division is an integer division.
+    """
+    def CalculateViewPortBatch(self, zoom, locations, orgsize, scalesize, integer=False, viewsize=None):
+        scalesize = numpy.asarray(scalesize)
+        if viewsize is None:
+            viewsize = scalesize
+        viewsize = numpy.asarray(viewsize)
+        # Don't exceed app size
+        if integer:
+            view = viewsize // zoom
+            half = view // 2
+        else:
+            view = viewsize / float(zoom)
+            half = view / 2.0
+        # Map the coords
+        mapped = self.GetOriginalCoordFromScaledCoordBatch(locations, orgsize, scalesize, integer)
+        # And calculate the four specific boundaries based on mapped coords
+        viewports = numpy.concatenate([mapped - half, mapped + half], axis=-1)
+        # (left, up) and (right, bottom)
+        return self.ValidateViewportBatch(viewports)
+
     """ Validate a given viewport.
 
     A viewport can be invalid for a number of reasons. 
@@ -67,27 +110,91 @@ class ImageOperations():
             bottom += 100
         return (left, up, right, bottom)
 
+    """ Validate an array (N, 4) of viewports.
+
+    See ValidateViewport. Returns a new array.
+    """
+    def ValidateViewportBatch(self, viewports):
+        viewports = numpy.array(viewports)
+        for low, high in [(0, 2), (1, 3)]:
+            same = viewports[:, low] == viewports[:, high]
+            viewports[same, low] -= 100
+            viewports[same, high] += 100
+        return viewports
+
     """ Return the (x, y) location of a mousclick in a viewport.
 
     Return the real (x, y) coords in an image, based on a (x, y) location
     in a specific viewport. 
     """
     def GetOriginalCoords(self, zoom, location, curviewport):
-        unzoomedLocationX = location[0] / zoom + curviewport[0]
-        unzoomedLocationY = location[1] / zoom + curviewport[1]
+        divide = self.GetDivision(zoom, location, curviewport)
+        unzoomedLocationX = divide(location[0], zoom) + curviewport[0]
+        unzoomedLocationY = divide(location[1], zoom) + curviewport[1]
 
         return (unzoomedLocationX, unzoomedLocationY)
 
+    """ Return the (x, y) locations of an array of mouseclicks.
+
+    Locations is an array (N, 2); viewports a single viewport, or an
+    array (N, 4) with the viewport of every click. Returns an array (N, 2).
+    If integer is True, every division is an integer division.
+    """
+    def GetOriginalCoordsBatch(self, zoom, locations, viewports, integer=False):
+        locations = numpy.asarray(locations)
+        viewports = numpy.asarray(viewports)
+        if integer:
+            return locations // zoom + viewports[..., 0:2]
+        return locations / float(zoom) + viewports[..., 0:2]
+
     """ Map scaled coords to original
     
     Return a 2-tuple (x, y) with the coordinates in the original image.
     This is based on the given coords of the scaled image.
     """
     def GetOriginalCoordFromScaledCoord(self, location, org, scale):
-        x = location[0] * org[0] / scale[0]
-        y = location[1] * org[1] / scale[1]
+        divide = self.GetDivision(location, org, scale)
+        x = divide(location[0] * org[0], scale[0])
+        y = divide(location[1] * org[1], scale[1])
         return (x, y)
 
+    """ Map an array of scaled coords to original
+
+    Locations is an array (N, 2); org and scale are (width, height),
+    or arrays (N, 2). Returns an array (N, 2).
+    If integer is True, every division is an integer division.
+    """
+    def GetOriginalCoordFromScaledCoordBatch(self, locations, org, scale, integer=False):
+        locations = numpy.asarray(locations)
+        org = numpy.asarray(org)
+        scale = numpy.asarray(scale)
+        if integer:
+            return locations * org // scale
+        return locations * org / scale.astype(numpy.float64)
+
+    """ Return the division the scalar functions use for the given values.
+
+    Integer division if all of them are integers, exact division otherwise.
+    """
+    def GetDivision(self, *values):
+        if self.IsIntegral(*values):
+            return operator.floordiv
+        return operator.truediv
+
+    """ Check whether all given values are integers.
+
+    The values may be numbers or tuples of numbers.
+    """
+    def IsIntegral(self, *values):
+        for value in values:
+            if isinstance(value, (tuple, list)):
+                for v in value:
+                    if type(v) is not int and not isinstance(v, INTEGRAL):
+                        return False
+            elif type(value) is not int and not isinstance(value, INTEGRAL):
+                return False
+        return True
+
     """ Forcibly scale an image
 
     Always return a scaled image, even if it means upscaling.
@@ -95,8 +202,17 @@ class ImageOperations():
     When the resulting scaling < 1, make sure it is still at least a pixel high.
     """
     def ScaleWxImageForced(self, wximage, size):
-        x = wximage.GetWidth()
-        y = wximage.GetHeight()
+        xn, yn = self.CalculateScaledSize((wximage.GetWidth(), wximage.GetHeight()), size)
+        return wximage.Scale(xn, yn)
+
+    """ Calculate the size of a forcibly scaled image
+
+    Return the 2-tuple (width, height) an image of orgsize gets
+    when it is scaled to fit size, keeping the aspect ratio.
+    """
+    def CalculateScaledSize(self, orgsize, size):
+        x = orgsize[0]
+        y = orgsize[1]
 
         xfac = float(x) / float(size[0])
         yfac = float(y) / float(size[1])
@@ -116,7 +232,7 @@ class ImageOperations():
         if yn < 1:
             yn += 1
 
-        return wximage.Scale(xn, yn)
+        return (int(xn), int(yn))
 
 
     """ Scale an image
@@ -134,6 +250,21 @@ class ImageOperations():
         else:
             return self.ScaleWxImageForced(wximage, size)
 
+    """ Scale a PIL image
+
+    The PIL counterpart of ScaleWxImage. Images > size are scaled to fit,
+    smaller images are returned unmodified. Unlike the wx variant this can
+    safely be used from a worker thread.
+    """
+    def ScalePilImage(self, pilimg, size):
+        W = pilimg.size[0]
+        H = pilimg.size[1]
+
+        if size[0] > W and size[1] > H:
+            return pilimg
+        else:
+            return Resampler().Resize(pilimg, self.CalculateScaledSize(pilimg.size, size))
+
     """ Set a marking at a given point.
     
     The marking is a little box around a given point (x, y) 
@@ -142,13 +273,18 @@ class ImageOperations():
     def SetMarking(self, pilimg, point, colour, offset, width):
         draw = ImageDraw.Draw(pilimg)
 
+        for line in self.GetMarkingLines(point, offset):
+            draw.line(line, fill=colour, width=width)
+        del draw
+
+    """ Return the lines that make up a marking.
+
+    A list of four 4-tuples (x1, y1, x2, y2): the top, left, right
+    and bottom side of the box around point (x, y).
+    """
+    def GetMarkingLines(self, point, offset):
         top = (point[0] - offset, point[1] - offset, point[0] + offset, point[1] - offset)
         left = (point[0] - offset, point[1] - offset, point[0] - offset, point[1] + offset)
         right = (point[0] + offset, point[1] - offset, point[0] + offset, point[1] + offset)
         bottom = (point[0] - offset, point[1] + offset, point[0] + offset, point[1] + offset)
-
-        draw.line(top, fill=colour, width=width)
-        draw.line(left, fill=colour, width=width)
-        draw.line(right, fill=colour, width=width)
-        draw.line(bottom, fill=colour, width=width)
-        del draw
+        return [top, left, right, bottom]
@@ -0,0 +1,217 @@
+# ImageSource
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" A decoded image, ready to be displayed by a frame.
+
+An ImageSource holds the decoded full resolution image, its pyramid, and
+a version that is already scaled to the display size. It does not
+use wx at all, so it can be prepared on a worker thread.
+
+In draft mode JPEG files are decoded at a reduced scale for the overview
+first; the full resolution is only decoded when it is actually needed,
+and can be released again when it isn't.
+With a PreviewCache, an overview that is cached on disk is used without
+decoding the image at all.
+"""
+
+import threading
+
+from PIL import Image
+
+from imageoperations import ImageOperations
+from pyramid import ImagePyramid
+from resample import Resampler
+
+class ImageSource():
+    """ Create an image source for a given file.
+
+    Nothing is decoded until Load() is called.
+    """
+    def __init__(self, imageFile, size, draft=False, cache=None):
+        self.imops = ImageOperations()
+        self.resampler = Resampler()
+        self.fileName = imageFile
+        # The size of the display the overview is scaled for
+        self.displaySize = size
+        self.draft = draft
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.originalSize = None
+        self.pil = None
+        self.pyramid = None
+        self.overview = None
+
+    """ Prepare the display scaled overview.
+
+    The overview is taken from the preview cache if possible. Otherwise
+    the image file is decoded, and the cache is updated.
+    """
+    def Load(self):
+        if self.cache is not None:
+            cached = self.cache.Get(self.fileName, self.displaySize)
+            if cached is not None:
+                self.overview, self.originalSize = cached
+                return
+
+        self.Decode()
+
+        if self.cache is not None:
+            self.cache.Put(self.fileName, self.displaySize, self.overview, self.originalSize)
+
+    """ Decode the image file.
+
+    In draft mode, JPEG files are decoded at the smallest scale that is
+    still large enough for the overview. Otherwise the whole file is
+    decoded to RGB, and its pyramid is built.
+    """
+    def Decode(self):
+        pil = Image.open(self.fileName)
+        # Only the header is read so far, so this is the real size.
+        self.originalSize = pil.size
+
+        if self.draft and pil.format == 'JPEG':
+            pil.draft('RGB', self.GetOverviewSize())
+            if pil.size != self.originalSize:
+                self.overview = self.resampler.Resize(self.ToRGB(pil), self.GetOverviewSize())
+                return
+
+        self.SetFullImage(self.ToRGB(pil))
+
+    """ Decode the full resolution image, if that did not happen yet.
+
+    Safe to call from several threads; the image is decoded only once.
+    Return the pyramid, which stays valid even if the full resolution
+    is released in the meantime.
+    """
+    def LoadFull(self):
+        with self.lock:
+            pyramid = self.pyramid
+            if pyramid is None:
+                pyramid = self.SetFullImage(self.ToRGB(Image.open(self.fileName)))
+            return pyramid
+
+    """ Release the full resolution image and its pyramid.
+
+    Only the overview is kept. The full resolution is decoded again when
+    it is needed. Does not wait for a decode that is in progress.
+    """
+    def ReleaseFull(self):
+        self.pil = None
+        self.pyramid = None
+
+    """ Return whether the full resolution image is decoded
+    """
+    def IsFullyLoaded(self):
+        return self.pil is not None
+
+    """ Use a decoded RGB image as full resolution image.
+
+    Builds the pyramid, and the overview if there is none yet.
+    Return the pyramid.
+    """
+    def SetFullImage(self, pil):
+        pyramid = ImagePyramid(pil, self.GetOverviewSize())
+        if self.overview is None:
+            self.overview = pyramid.GetScaled(self.GetOverviewSize())
+        self.pyramid = pyramid
+        self.pil = pil
+        return pyramid
+
+    """ Return a decoded RGB version of a PIL image
+    """
+    def ToRGB(self, pil):
+        if pil.mode != 'RGB':
+            return pil.convert('RGB')
+        pil.load()
+        return pil
+
+    """ Return the size of the overview
+
+    Images larger than the display are scaled to fit, smaller ones are not.
+    """
+    def GetOverviewSize(self):
+        W = self.originalSize[0]
+        H = self.originalSize[1]
+        if self.displaySize[0] > W and self.displaySize[1] > H:
+            return self.originalSize
+        return self.imops.CalculateScaledSize(self.originalSize, self.displaySize)
+
+    """ Return the filename of this source
+    """
+    def GetFileName(self):
+        return self.fileName
+
+    """ Return the size of the original image
+
+    A 2-tuple (width, height).
+    """
+    def GetSize(self):
+        return self.originalSize
+
+    """ Return the full resolution PIL image
+
+    Decodes it first if needed.
+    """
+    def GetImage(self):
+        level, scale = self.LoadFull().GetLevel(1)
+        return level
+
+    """ Return the PIL image scaled to the display size
+    """
+    def GetOverview(self):
+        return self.overview
+
+    """ Return a region of the image, scaled to fit the given size.
+
+    The viewport is a 4-tuple (left, up, right, bottom) in original
+    image coordinates. The region is always scaled, even if that means upscaling.
+    """
+    def GetRegion(self, viewport, size):
+        regionSize = (viewport[2] - viewport[0], viewport[3] - viewport[1])
+        return self.RenderRegion(viewport, self.imops.CalculateScaledSize(regionSize, size))
+
+    """ Return a region of the image, scaled to exactly the given size.
+
+    Unlike GetRegion, the aspect ratio is not kept. With quality, the
+    region is scaled up by the slower, sharper filter.
+    """
+    def RenderRegion(self, viewport, size, quality=False):
+        return self.LoadFull().GetRegion(viewport, size, quality)
+
+    """ Return the (approximate) number of bytes used by this source
+    """
+    def GetMemoryUsage(self):
+        used = 0
+        for im in [self.pil, self.overview]:
+            if im is not None:
+                used += im.size[0] * im.size[1] * len(im.getbands())
+        # Small images are not scaled, and share their data with the overview
+        if self.overview is not None and self.overview is self.pil:
+            used //= 2
+        if self.pyramid is not None:
+            used += self.pyramid.GetMemoryUsage()
+        return used
+
+    """ Free the decoded image.
+
+    Nothing to do; the memory is freed once the source is no longer
+    referenced. See RemoteImageSource.
+    """
+    def Release(self):
+        pass
@@ -20,19 +20,68 @@
 """ Logger class to output relevant data about the lists of locations retrieved from the user.
 
 This class is _NOT_ a generic logger. It is tailored to output data in specific filenames, and in specific formats.
+
+Log files are written by a background thread, so the programs never wait
+for the disk. Every file is written under a temporary name first, and
+renamed when it is complete. Optionally, everything that is logged is
+recorded in a consolidated AnnotationStore as well.
 """
 
 import io
 import sys
 import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from annotationstore import AnnotationStore
+from timing import NullTiming
 
 class Logger():
     """ Initialize the loggor
     
     Set a local reference to the settings class.
+    If given, the time logging takes is measured by timing.
     """
-    def __init__(self, settings):
+    def __init__(self, settings, timing=None):
         self.settings = settings
+        self.timing = timing or NullTiming()
+        # Names of the files in the output directory, see IndexOutput
+        self.outputIndex = None
+        # Called with (filename, error) when writing a log file fails
+        self.errorHandler = None
+        # The consolidated store, if any
+        self.store = None
+        if settings.UseAnnotationStore():
+            self.store = AnnotationStore(settings.GetAnnotationStore())
+        # Log files still to be written by the writer thread
+        self.queue = None
+        self.writer = None
+        if settings.UseAsyncLogging():
+            self.queue = queue.Queue(settings.GetLogQueueSize())
+            self.writer = threading.Thread(target=self.Write)
+            self.writer.daemon = True
+            self.writer.start()
+
+    """ Set the function to call when writing a log file fails.
+
+    It is called with the filename and the error, from the writer thread.
+    """
+    def SetErrorHandler(self, handler):
+        self.errorHandler = handler
+
+    """ Write all pending log files, and stop the writer thread.
+    """
+    def Close(self):
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.store is not None:
+            self.store.Close()
 
     """ Get a filename to use for output.
     
@@ -44,16 +93,124 @@ class Logger():
         fileout = header + os.path.splitext(os.path.basename(raw_fn))[0] + ".txt"
         return outdir + os.sep + fileout
 
+    """ Index the output directory.
+
+    Scan the output directory once, and remember which log files exist.
+    HasOutput uses this index, so it doesn't touch the disk.
+    """
+    def IndexOutput(self):
+        outdir = self.settings.GetOutDir()
+        if os.path.isdir(outdir):
+            self.outputIndex = set(os.listdir(outdir))
+        else:
+            self.outputIndex = set()
+
+    """ Check whether a log file exists for an image.
+
+    Checks against the index built by IndexOutput, so log files
+    written since then are not taken into account.
+    """
+    def HasOutput(self, header, raw_fn):
+        if self.outputIndex is None:
+            self.IndexOutput()
+        return os.path.basename(self.GetFileName(header, raw_fn)) in self.outputIndex
+
     """ Write a given buffer to a certain log file.
     
     Write the given buffer to the filename at the given location.
-    If a file exists, it's content will be truncated.
+    If a file exists, it's content will be replaced.
+    With asynchronous logging, the writer thread does the actual writing;
+    this only waits if too many log files are pending already.
+    If given, record is a 3-tuple (header, image filename, lanes) to
+    record in the annotation store.
     """
 
-    def WriteLog(self, log, buf):
-        fh = open(log, 'w')
-        fh.write(buf)
-        fh.close()
+    def WriteLog(self, log, buf, record=None):
+        if self.writer is not None:
+            self.queue.put((log, buf, record))
+        else:
+            self.WriteItem(log, buf, record)
+
+    """ Main loop of the writer thread.
+
+    Write the queued log files, until Close() is called.
+    """
+    def Write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            self.WriteItem(item[0], item[1], item[2])
+
+    """ Write a log file, and record it in the annotation store.
+    """
+    def WriteItem(self, log, buf, record):
+        self.WriteFile(log, buf)
+        if record is not None and self.store is not None:
+            try:
+                self.store.Record(record[0], record[1], record[2])
+            except Exception as e:
+                self.ReportError(self.store.filename, e)
+
+    """ Write a buffer to a log file, atomically.
+
+    The buffer is written to a temporary file, which then replaces the log file.
+    """
+    def WriteFile(self, log, buf):
+        # Only one thread writes log files, so the name doesn't need to be unique
+        tmp = log + ".tmp"
+        try:
+            fh = open(tmp, 'w')
+            try:
+                fh.write(buf)
+            finally:
+                fh.close()
+            if hasattr(os, 'replace'):
+                os.replace(tmp, log)
+            else:
+                # Python 2 can't rename over an existing file on Windows
+                if os.path.exists(log):
+                    os.remove(log)
+                os.rename(tmp, log)
+        except (IOError, OSError) as e:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            self.ReportError(log, e)
+
+    """ Report an error writing to a file.
+
+    Passed on to the error handler, or printed if there is none.
+    """
+    def ReportError(self, log, error):
+        if self.errorHandler is not None:
+            self.errorHandler(log, error)
+        else:
+            sys.stderr.write("Can't write %s: %s\n" % (log, error))
+
+    """ Format a list of locations.
+
+    Every location (x, y) is written as "x y ", on a single line.
+    """
+    def FormatLocations(self, loclist):
+        return "".join([str(x[0]) + " " + str(x[1]) + " " for x in loclist])
+
+    """ Log lanes of locations to a given file.
+
+    Every lane is written on its own line. Unless record is False,
+    the lanes are recorded in the annotation store as well.
+    """
+    def LogLanes(self, header, filename, lanes, record=True):
+        self.timing.Begin("log")
+        start = self.timing.Start()
+        fhs = self.GetFileName(header, filename)
+        buf = "".join([self.FormatLocations(lane) + "\n" for lane in lanes])
+
+        if record:
+            # Copy the lanes, the writer thread might get to them later
+            self.WriteLog(fhs, buf, (header, filename, [list(lane) for lane in lanes]))
+        else:
+            self.WriteLog(fhs, buf)
+        self.timing.Stop("log", start)
 
     """ Generic logging function.
     
@@ -61,13 +218,7 @@ class Logger():
     Prepend the logfile with the string given in header.
     """
     def GenericLog(self, header, filename, loclist):
-        fhs = self.GetFileName(header, filename)
-        
-        buf = ""
-        for x in loclist:
-            buf += str(x[0]) + " " + str(x[1]) + " "
-
-        self.WriteLog(fhs, buf + "\n")
+        self.LogLanes(header, filename, [loclist])
 
     """ The logging function for the viaduct program.
 
@@ -90,8 +241,6 @@ class Logger():
     """
 
     def LogDistances(self, filename, loclist):
-        fhs = self.GetFileName("Di#", filename)
-        buf = ""
         lane_a = []
         lane_b = []
         cur_lane = lane_a
@@ -110,10 +259,4 @@ class Logger():
         while(len(lane_a) > len(lane_b)):
             lane_b.append((0, 0))
 
-        for a in lane_a:
-            buf += str(a[0]) + " " + str(a[1]) + " "
-        buf += "\n"
-        for b in lane_b:
-            buf += str(b[0]) + " " + str(b[1]) + " "
-
-        self.WriteLog(fhs, buf + "\n")
+        self.LogLanes("Di#", filename, [lane_a, lane_b])
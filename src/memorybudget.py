@@ -0,0 +1,64 @@
+# MemoryBudget
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Memory budget shared by all caches of a frame.
+
+Every cache that holds image data (the prefetcher and the zoom cache)
+registers itself with the budget. A consumer may use what the others
+leave of the limit, and evicts entries when it needs more than that.
+Every consumer evicts by itself, under its own lock, so the budget
+never touches another thread's data.
+
+A consumer has a GetMemoryUsage method, returning its number of bytes;
+it must be cheap, and safe to call from any thread.
+"""
+
+class MemoryBudget():
+    """ Create a budget of limit bytes
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.consumers = []
+
+    """ Register a consumer
+    """
+    def Register(self, consumer):
+        self.consumers.append(consumer)
+
+    """ Return the limit, in bytes
+    """
+    def GetLimit(self):
+        return self.limit
+
+    """ Return the number of bytes used by all consumers
+    """
+    def GetUsage(self):
+        return sum([c.GetMemoryUsage() for c in self.consumers])
+
+    """ Return the number of bytes a consumer may use.
+
+    That is the limit, minus what all other consumers use.
+    """
+    def GetAvailable(self, consumer):
+        return self.limit - sum([c.GetMemoryUsage() for c in self.consumers if c is not consumer])
+
+    """ Return a one line summary of the memory use
+    """
+    def GetSummary(self):
+        return "Memory: %d of %d MB" % (self.GetUsage() // 1048576, self.limit // 1048576)
@@ -0,0 +1,287 @@
+#!/usr/bin/python
+
+# OutputReader
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Reader for the log files written by Logger.
+
+Reads the RV#, TS# and Di# files of an output directory into a single
+NumPy structured array, with one row per point:
+
+    file    index of the log file in the list of files
+    program header of the log file (RV#, TS# or Di#)
+    lane    0, or 1 for the second lane of a Di# file
+    seq     position of the point in its lane
+    x, y    coordinates in the original image
+    status  POINT, SKIP for a skipped marking, or PADDING for the
+            (0, 0) entries that make both lanes of a Di# file equally long
+
+Files are parsed in chunks by a pool of processes, and every chunk is
+converted with a single NumPy call. The records can also be streamed to
+JSON lines or CSV.
+
+Usage: outputreader.py [--json | --csv | --npz file] [output directory]
+"""
+
+from __future__ import print_function
+
+import csv
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+
+import numpy
+
+from settings import Settings
+
+# The headers of the log files
+HEADERS = ["RV#", "TS#", "Di#"]
+
+# Status of a point
+POINT = 0
+SKIP = 1
+PADDING = 2
+STATUS = ["point", "skip", "padding"]
+
+DTYPE = numpy.dtype([
+    ('file', numpy.int32),
+    ('program', 'S3'),
+    ('lane', numpy.int8),
+    ('seq', numpy.int32),
+    ('x', numpy.float64),
+    ('y', numpy.float64),
+    ('status', numpy.int8),
+])
+
+""" Parse a chunk of log files, in a worker process.
+
+Args is a 3-tuple (directory, offset, names); offset is the index of the
+first file in the whole list.
+"""
+def ParseChunk(args):
+    directory, offset, names = args
+    return OutputReader().ParseFiles(directory, names, offset)
+
+class OutputReader():
+    """ Initialize the reader.
+
+    Chunksize is the number of files a worker parses at once.
+    """
+    def __init__(self, chunksize=1000, processes=None):
+        self.chunksize = chunksize
+        self.processes = processes
+
+    """ Return the log files in a directory
+
+    A sorted list of the names of all RV#, TS# and Di# files.
+    """
+    def ListFiles(self, directory):
+        return sorted([f for f in os.listdir(directory) if f[0:3] in HEADERS and f.endswith(".txt")])
+
+    """ Return the image name a log file belongs to.
+
+    That is the name of the image, without directory and extension.
+    """
+    def GetImageName(self, name):
+        return name[3:-4]
+
+    """ Parse log files into a structured array.
+
+    Offset is added to the file indices in the array.
+    """
+    def ParseFiles(self, directory, names, offset=0):
+        texts = []
+        counts = []
+        files = []
+        programs = []
+        lanes = []
+        for i, name in enumerate(names):
+            fh = open(directory + os.sep + name, 'r')
+            try:
+                content = fh.read()
+            finally:
+                fh.close()
+            lines = content.split("\n")
+            if name[0:3] == "Di#":
+                lines = lines[0:2]
+            else:
+                lines = lines[0:1]
+            for lane, line in enumerate(lines):
+                # Every point is written as "x y ", so spaces count the numbers.
+                texts.append(line)
+                counts.append(line.count(" ") // 2)
+                files.append(offset + i)
+                programs.append(name[0:3])
+                lanes.append(lane)
+
+        counts = numpy.array(counts, dtype=numpy.int64)
+        values = numpy.array(" ".join(texts).split(), dtype=numpy.float64)
+        if len(values) != 2 * counts.sum():
+            # Not the format Logger writes; fall back to counting the numbers per line
+            counts = numpy.array([len(t.split()) // 2 for t in texts], dtype=numpy.int64)
+            values = numpy.concatenate([numpy.array(t.split()[0:2 * c], dtype=numpy.float64) for t, c in zip(texts, counts)] + [numpy.zeros(0)])
+
+        result = numpy.zeros(counts.sum(), dtype=DTYPE)
+        result['file'] = numpy.repeat(numpy.array(files, dtype=numpy.int32), counts)
+        result['program'] = numpy.repeat(numpy.array(programs, dtype='S3'), counts)
+        result['lane'] = numpy.repeat(numpy.array(lanes, dtype=numpy.int8), counts)
+        # Position within the line: running index minus the start of the line
+        starts = numpy.cumsum(counts) - counts
+        result['seq'] = numpy.arange(counts.sum()) - numpy.repeat(starts, counts)
+        result['x'] = values[0::2]
+        result['y'] = values[1::2]
+        self.DecodeStatus(result, counts, files, lanes)
+        return result
+
+    """ Set the status of every point.
+
+    Counts, files and lanes are the number of points, the file and the
+    lane of every line.
+    A (0, 0) point is a skipped marking. The lanes of a Di# file are
+    padded to the length of the longer one, so only the shorter lane has
+    padding: the (0, 0) points after its last real point. The shorter
+    lane is the one whose last real point comes first; trailing (0, 0)
+    points of the longer lane are skipped markings.
+    """
+    def DecodeStatus(self, result, counts, files, lanes):
+        zero = (result['x'] == 0) & (result['y'] == 0)
+        result['status'] = numpy.where(zero, SKIP, POINT)
+
+        distances = result['program'] == b"Di#"
+        if not distances.any():
+            return
+        # Index of the line of every point, and the last real point of every line
+        line = numpy.repeat(numpy.arange(len(counts)), counts)
+        real = numpy.where(zero, -1, result['seq'])
+        last = numpy.full(len(counts), -1, dtype=numpy.int64)
+        numpy.maximum.at(last, line, real)
+        # The last real point of the other lane of the same file; the second
+        # lane of a file directly follows the first
+        files = numpy.array(files, dtype=numpy.int64)
+        lanes = numpy.array(lanes, dtype=numpy.int64)
+        first = numpy.nonzero((lanes[:-1] == 0) & (lanes[1:] == 1) & (files[:-1] == files[1:]))[0]
+        other = numpy.full(len(counts), -1, dtype=numpy.int64)
+        other[first] = last[first + 1]
+        other[first + 1] = last[first]
+        padding = distances & zero & (result['seq'] > last[line]) & (last[line] < other[line])
+        result['status'][padding] = PADDING
+
+    """ Read all log files in a directory.
+
+    Return a 2-tuple (names, points): the list of log file names, and the
+    structured array with all their points.
+    """
+    def Read(self, directory):
+        names = self.ListFiles(directory)
+        chunks = list(self.IterChunks(directory, names))
+        return (names, numpy.concatenate(chunks + [numpy.zeros(0, dtype=DTYPE)]))
+
+    """ Iterate over the parsed chunks of a directory, in order.
+
+    Chunks are parsed in parallel, and yielded in the order of the files.
+    """
+    def IterChunks(self, directory, names):
+        work = [(directory, i, names[i:i + self.chunksize]) for i in range(0, len(names), self.chunksize)]
+        if len(work) <= 1:
+            for w in work:
+                yield ParseChunk(w)
+            return
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for chunk in pool.imap(ParseChunk, work):
+                yield chunk
+        finally:
+            pool.close()
+            pool.join()
+
+    """ Iterate over the log files of a directory, as dictionaries.
+
+    Every dictionary has the program, the image name, and a list of
+    lanes with [x, y, status] per point.
+    """
+    def IterRecords(self, directory):
+        names = self.ListFiles(directory)
+        for chunk in self.IterChunks(directory, names):
+            if len(chunk) == 0:
+                continue
+            # Split the chunk at every new file
+            bounds = numpy.flatnonzero(numpy.diff(chunk['file'])) + 1
+            for points in numpy.split(chunk, bounds):
+                name = names[points['file'][0]]
+                lanes = []
+                for f, program, lane, seq, x, y, status in points.tolist():
+                    while len(lanes) <= lane:
+                        lanes.append([])
+                    lanes[lane].append([self.Number(x), self.Number(y), STATUS[status]])
+                yield {"program": name[0:3], "image": self.GetImageName(name), "lanes": lanes}
+
+    """ Return a coordinate as int if it is a whole number
+    """
+    def Number(self, value):
+        if value == int(value):
+            return int(value)
+        return float(value)
+
+    """ Write all log files of a directory to a file, as JSON lines.
+    """
+    def WriteJSON(self, directory, fh):
+        for record in self.IterRecords(directory):
+            fh.write(json.dumps(record) + "\n")
+
+    """ Write all log files of a directory to a file, as CSV.
+
+    One row per point: program, image, lane, seq, x, y, status.
+    """
+    def WriteCSV(self, directory, fh):
+        writer = csv.writer(fh)
+        writer.writerow(["program", "image", "lane", "seq", "x", "y", "status"])
+        for record in self.IterRecords(directory):
+            for lane, points in enumerate(record["lanes"]):
+                for seq, p in enumerate(points):
+                    writer.writerow([record["program"], record["image"], lane, seq, p[0], p[1], p[2]])
+
+if __name__ == '__main__':
+    settings = Settings(inspect.getfile(inspect.currentframe()))
+    args = sys.argv[1:]
+    mode = None
+    npz = None
+    if len(args) > 0 and args[0] in ["--json", "--csv"]:
+        mode = args.pop(0)
+    elif len(args) > 1 and args[0] == "--npz":
+        mode = args.pop(0)
+        npz = args.pop(0)
+    directory = settings.GetOutDir()
+    if len(args) > 0:
+        directory = args[0]
+
+    reader = OutputReader()
+    if mode == "--json":
+        reader.WriteJSON(directory, sys.stdout)
+    elif mode == "--csv":
+        reader.WriteCSV(directory, sys.stdout)
+    else:
+        names, points = reader.Read(directory)
+        if npz is not None:
+            numpy.savez_compressed(npz, names=numpy.array(names), points=points)
+        print("%d files, %d points" % (len(names), len(points)))
+        for program in HEADERS:
+            sel = points['program'] == program.encode('ascii')
+            print("%s %d files, %d points, %d skipped" % (program, len(numpy.unique(points['file'][sel])), (points['status'][sel] == POINT).sum(), (points['status'][sel] == SKIP).sum()))
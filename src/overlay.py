@@ -0,0 +1,82 @@
+# Overlay
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Vector overlay with the markings of the current image.
+
+Markings are stored as points in original image coordinates, and drawn
+on top of whatever is displayed: the overview or a zoomed in crop.
+The source image itself is never modified.
+"""
+
+import wx
+
+from imageoperations import ImageOperations
+
+class Overlay():
+    """ Initialize an empty overlay.
+
+    The size of the markings is taken from the given settings.
+    """
+    def __init__(self, settings):
+        self.imops = ImageOperations()
+        self.offset = settings.GetMarkingOffset()
+        self.width = settings.GetMarkingWidth()
+        # List of 2-tuples: ((x, y), colour)
+        self.markings = []
+
+    """ Add a marking at point (x, y), in original image coordinates.
+    """
+    def AddMarking(self, point, colour):
+        self.markings.append((point, colour))
+
+    """ Remove all markings
+    """
+    def Clear(self):
+        self.markings = []
+
+    """ Return the list of markings
+    """
+    def GetMarkings(self):
+        return self.markings
+
+    """ Draw all markings on a DC.
+
+    The DC displays the image from origin (x, y) in original image
+    coordinates onwards, at the given scale.
+    """
+    def Draw(self, dc, origin, scale):
+        for point, colour in self.markings:
+            self.DrawMarking(dc, point, colour, origin, scale)
+
+    """ Draw a single marking on a DC.
+
+    Return the rectangle (x, y, width, height) on the DC that was drawn on.
+    """
+    def DrawMarking(self, dc, point, colour, origin, scale):
+        offset = self.offset * scale
+        width = max(1, int(round(self.width * scale)))
+        mapped = ((point[0] - origin[0]) * scale, (point[1] - origin[1]) * scale)
+
+        dc.SetPen(wx.Pen(colour, width))
+        for line in self.imops.GetMarkingLines(mapped, offset):
+            dc.DrawLine(*[int(round(c)) for c in line])
+
+        # Include the width of the pen, which is centred on the lines
+        border = int(offset) + width + 1
+        return (int(mapped[0]) - border, int(mapped[1]) - border, 2 * border, 2 * border)
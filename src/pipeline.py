@@ -0,0 +1,438 @@
+# ImagePipeline
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Image pipeline in a separate worker process.
+
+Decoding, converting and scaling images holds the GIL for long
+stretches, even on a worker thread, which makes the GUI stutter. With
+the pipeline, all of that happens in a worker process instead, which
+holds the decoded images. The GUI process only gets the pixels it
+displays: the overviews and zoomed in regions.
+
+Those pixels are handed over through a fixed number of slots in shared
+memory, each large enough for twice the display size in both
+directions. Only small requests and replies are sent through queues;
+the pixel data is never pickled.
+
+A RemoteImageSource has the interface of an ImageSource, so the
+prefetcher and the frames can use either.
+"""
+
+import ctypes
+import itertools
+import multiprocessing
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from PIL import Image
+
+from imageoperations import ImageOperations
+from previewcache import PreviewCache
+from tiledsource import CreateImageSource
+
+""" Main function of the worker process.
+"""
+def RunWorker(requests, replies, slots, size, draft, previewdir, previewsize, tileMemory, window, threads):
+    PipelineWorker(replies, slots, size, draft, previewdir, previewsize, tileMemory, window).Run(requests, threads)
+
+class PipelineWorker():
+    """ Initialize the worker, in the worker process.
+
+    The decoded images are kept as ImageSource objects, by key, until
+    they are released.
+    """
+    def __init__(self, replies, slots, size, draft, previewdir, previewsize, tileMemory, window):
+        self.replies = replies
+        self.slots = slots
+        self.size = size
+        self.draft = draft
+        self.tileMemory = tileMemory
+        self.window = window
+        self.cache = None
+        if previewdir is not None:
+            self.cache = PreviewCache(previewdir, previewsize)
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    """ Handle requests until the pipeline is stopped.
+
+    Requests are handled by a number of threads, so a request for a
+    zoomed in region doesn't wait for another image to be decoded.
+    """
+    def Run(self, requests, threads):
+        work = queue.Queue()
+        handlers = []
+        for i in range(threads):
+            handler = threading.Thread(target=self.Serve, args=(work,))
+            handler.daemon = True
+            handler.start()
+            handlers.append(handler)
+
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            work.put(request)
+
+        for handler in handlers:
+            work.put(None)
+        for handler in handlers:
+            handler.join()
+        # Tells the receiver in the GUI process that the worker is gone
+        self.replies.put(None)
+
+    """ Main loop of a handler thread
+    """
+    def Serve(self, work):
+        while True:
+            request = work.get()
+            if request is None:
+                return
+            reply = self.Handle(request)
+            if reply is not None:
+                self.replies.put(reply)
+
+    """ Handle a single request.
+
+    A request is a 6-tuple (id, command, key, filename, arguments, slot).
+    Return the reply, a 3-tuple (id, success, result or error message),
+    or None if the request has no reply.
+    """
+    def Handle(self, request):
+        id, command, key, fileName, args, slot = request
+        try:
+            if command == "release":
+                with self.lock:
+                    self.sources.pop(key, None)
+                return None
+            elif command == "releasefull":
+                with self.lock:
+                    source = self.sources.get(key)
+                if source is not None:
+                    source.ReleaseFull()
+                return None
+
+            source = self.GetSource(key, fileName)
+            if command == "load":
+                source.Load()
+                overview = source.GetOverview()
+                self.WriteSlot(slot, overview)
+                return (id, True, (overview.size, source.GetSize(), source.IsFullyLoaded(), source.GetMemoryUsage()))
+            elif command == "full":
+                source.LoadFull()
+                return (id, True, source.GetMemoryUsage())
+            elif command == "region":
+                viewport, size, quality = args
+                region = source.RenderRegion(viewport, size, quality)
+                self.WriteSlot(slot, region)
+                return (id, True, (region.size, source.GetMemoryUsage()))
+            return (id, False, "Unknown command " + command)
+        except Exception as e:
+            return (id, False, "%s: %s" % (fileName, e))
+
+    """ Return the source for a key, creating it if needed
+    """
+    def GetSource(self, key, fileName):
+        with self.lock:
+            if key not in self.sources:
+                self.sources[key] = CreateImageSource(fileName, self.size, self.draft, self.cache, self.tileMemory, self.window)
+            return self.sources[key]
+
+    """ Copy the pixels of an RGB image into a slot
+    """
+    def WriteSlot(self, slot, pil):
+        if hasattr(pil, 'tobytes'):
+            data = pil.tobytes()
+        else:
+            data = pil.tostring()
+        ctypes.memmove(self.slots[slot], data, len(data))
+
+class ImagePipeline():
+    """ Start the worker process.
+
+    Size is the display size the images are prepared for. The decoding
+    options and the preview cache are taken from the settings.
+    """
+    def __init__(self, settings, size):
+        self.size = size
+        # Zoomed in regions rendered in advance are larger than the display
+        self.slotSize = (2 * size[0]) * (2 * size[1]) * 3
+        self.slots = [multiprocessing.RawArray(ctypes.c_ubyte, self.slotSize) for i in range(settings.GetPipelineSlots())]
+        self.free = list(range(len(self.slots)))
+
+        previewdir = None
+        if settings.UsePreviewCache():
+            previewdir = settings.GetPreviewDir()
+
+        # Don't fork the GUI process where that can be avoided
+        if hasattr(multiprocessing, 'get_context'):
+            context = multiprocessing.get_context('spawn')
+        else:
+            context = multiprocessing
+        self.requests = context.Queue()
+        self.replies = context.Queue()
+        self.process = context.Process(target=RunWorker, args=(self.requests, self.replies, self.slots, size,
+            settings.GetDraftDecoding(), previewdir, settings.GetPreviewCacheSize(), settings.GetTileMemory() * 1024 * 1024,
+            settings.GetDisplayWindow(), settings.GetPrefetchThreads() + 1))
+        self.process.daemon = True
+        self.process.start()
+
+        # Replies by request id, and the ids and keys handed out
+        self.results = {}
+        self.ids = itertools.count()
+        self.keys = itertools.count()
+        self.running = True
+        self.condition = threading.Condition()
+        self.receiver = threading.Thread(target=self.Receive)
+        self.receiver.daemon = True
+        self.receiver.start()
+
+    """ Return a new key, to identify a source in the worker
+    """
+    def NewKey(self):
+        with self.condition:
+            return next(self.keys)
+
+    """ Receive the replies of the worker, until it is gone.
+
+    The worker is gone when it stops, but also when it dies, e.g. when
+    it runs out of memory; then it never replies. So every second the
+    receiver checks whether the worker process is still alive.
+    """
+    def Receive(self):
+        while True:
+            try:
+                reply = self.replies.get(timeout=1.0)
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+                reply = None
+            with self.condition:
+                if reply is None:
+                    self.running = False
+                else:
+                    self.results[reply[0]] = reply[1:]
+                self.condition.notify_all()
+            if reply is None:
+                return
+
+    """ Return whether the worker process is running.
+
+    If not, requests raise an IOError, and images have to be decoded in
+    the GUI process instead.
+    """
+    def IsRunning(self):
+        return self.running
+
+    """ Send a request to the worker, and wait for the reply.
+
+    Return the result; raise an IOError if the request failed.
+    """
+    def Request(self, command, key, fileName, args=None, slot=None):
+        with self.condition:
+            if not self.running:
+                raise IOError("The image pipeline is stopped")
+            id = next(self.ids)
+        self.requests.put((id, command, key, fileName, args, slot))
+        with self.condition:
+            while id not in self.results and self.running:
+                self.condition.wait()
+            if id not in self.results:
+                raise IOError("The image pipeline is stopped")
+            success, result = self.results.pop(id)
+        if not success:
+            raise IOError(result)
+        return result
+
+    """ Wait for a free slot, and claim it
+    """
+    def AcquireSlot(self):
+        with self.condition:
+            while len(self.free) == 0 and self.running:
+                self.condition.wait()
+            if not self.running:
+                raise IOError("The image pipeline is stopped")
+            return self.free.pop()
+
+    """ Give a slot back
+    """
+    def ReleaseSlot(self, slot):
+        with self.condition:
+            self.free.append(slot)
+            self.condition.notify_all()
+
+    """ Return the RGB image of the given size in a slot, as a PIL image.
+
+    The pixels are copied, so the slot can be reused right away.
+    """
+    def ReadSlot(self, slot, size):
+        data = ctypes.string_at(ctypes.addressof(self.slots[slot]), size[0] * size[1] * 3)
+        if hasattr(Image, 'frombytes'):
+            return Image.frombytes('RGB', size, data)
+        return Image.fromstring('RGB', size, data)
+
+    """ Load an image in the worker.
+
+    Return a 4-tuple (overview, original size, whether the full
+    resolution is decoded, bytes used in the worker).
+    """
+    def Load(self, key, fileName):
+        slot = self.AcquireSlot()
+        try:
+            size, originalSize, full, memory = self.Request("load", key, fileName, slot=slot)
+            return (self.ReadSlot(slot, size), originalSize, full, memory)
+        finally:
+            self.ReleaseSlot(slot)
+
+    """ Decode the full resolution of an image in the worker.
+
+    Return the bytes used in the worker.
+    """
+    def LoadFull(self, key, fileName):
+        return self.Request("full", key, fileName)
+
+    """ Render a region of an image in the worker, at exactly the given size.
+
+    Return a 2-tuple (region, bytes used in the worker). See
+    ImageSource.RenderRegion for quality.
+    """
+    def RenderRegion(self, key, fileName, viewport, size, quality=False):
+        if size[0] * size[1] * 3 > self.slotSize:
+            raise ValueError("Region of %dx%d does not fit in a slot" % size)
+        slot = self.AcquireSlot()
+        try:
+            size, memory = self.Request("region", key, fileName, (tuple(viewport), tuple(size), quality), slot)
+            return (self.ReadSlot(slot, size), memory)
+        finally:
+            self.ReleaseSlot(slot)
+
+    """ Let the worker release the full resolution of an image
+    """
+    def ReleaseFull(self, key):
+        if self.running:
+            self.requests.put((None, "releasefull", key, None, None, None))
+
+    """ Let the worker forget an image
+    """
+    def Release(self, key):
+        if self.running:
+            self.requests.put((None, "release", key, None, None, None))
+
+    """ Stop the worker process.
+
+    Requests being handled are finished first.
+    """
+    def Stop(self):
+        if self.running:
+            self.requests.put(None)
+
+class RemoteImageSource():
+    """ Create a source for a file, that is decoded by the pipeline.
+
+    Nothing is decoded until Load() is called. The full resolution image
+    stays in the worker process, so unlike ImageSource there is no GetImage.
+    """
+    def __init__(self, pipeline, imageFile):
+        self.imops = ImageOperations()
+        self.pipeline = pipeline
+        self.key = pipeline.NewKey()
+        self.fileName = imageFile
+        self.originalSize = None
+        self.overview = None
+        self.fullyLoaded = False
+        # Bytes used by this image in the worker process
+        self.memory = 0
+
+    """ Prepare the display scaled overview
+    """
+    def Load(self):
+        self.overview, self.originalSize, self.fullyLoaded, self.memory = self.pipeline.Load(self.key, self.fileName)
+
+    """ Decode the full resolution image, if that did not happen yet.
+    """
+    def LoadFull(self):
+        if not self.fullyLoaded:
+            self.memory = self.pipeline.LoadFull(self.key, self.fileName)
+            self.fullyLoaded = True
+
+    """ Release the full resolution image in the worker process.
+
+    Only the overview is kept.
+    """
+    def ReleaseFull(self):
+        if self.fullyLoaded:
+            self.fullyLoaded = False
+            self.memory = 0
+            self.pipeline.ReleaseFull(self.key)
+
+    """ Return whether the full resolution image is decoded
+    """
+    def IsFullyLoaded(self):
+        return self.fullyLoaded
+
+    """ Return the filename of this source
+    """
+    def GetFileName(self):
+        return self.fileName
+
+    """ Return the size of the original image
+
+    A 2-tuple (width, height).
+    """
+    def GetSize(self):
+        return self.originalSize
+
+    """ Return the PIL image scaled to the display size
+    """
+    def GetOverview(self):
+        return self.overview
+
+    """ Return a region of the image, scaled to fit the given size.
+
+    See ImageSource.GetRegion.
+    """
+    def GetRegion(self, viewport, size):
+        regionSize = (viewport[2] - viewport[0], viewport[3] - viewport[1])
+        return self.RenderRegion(viewport, self.imops.CalculateScaledSize(regionSize, size))
+
+    """ Return a region of the image, scaled to exactly the given size.
+    """
+    def RenderRegion(self, viewport, size, quality=False):
+        region, self.memory = self.pipeline.RenderRegion(self.key, self.fileName, viewport, size, quality)
+        self.fullyLoaded = True
+        return region
+
+    """ Return the (approximate) number of bytes used by this source
+
+    Both in the worker process, and here.
+    """
+    def GetMemoryUsage(self):
+        used = self.memory
+        if self.overview is not None:
+            used += self.overview.size[0] * self.overview.size[1] * 3
+        return used
+
+    """ Free the decoded image in the worker process
+    """
+    def Release(self):
+        self.pipeline.Release(self.key)
@@ -0,0 +1,294 @@
+# Prefetcher
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Read-ahead of the images around the current one.
+
+The prefetcher decodes the next and previous images of a frame on worker
+threads, and keeps them in a bounded LRU cache. Going to the next or
+previous image then only has to display an already prepared ImageSource.
+In draft mode, the full resolution of the current image is decoded in
+the background as well.
+
+Optionally, the images are decoded by an ImagePipeline in a separate
+process; the worker threads then only wait for it.
+
+Only the current image keeps its full resolution; of all other images
+only the overview is kept. The cache is limited by its own cap, and by
+what the other consumers of a MemoryBudget leave.
+"""
+
+import itertools
+import threading
+
+from collections import deque, OrderedDict
+
+from pipeline import ImagePipeline, RemoteImageSource
+from previewcache import PreviewCache
+from tiledsource import CreateImageSource
+
+class Prefetcher():
+    """ Initialize the prefetcher, and start the worker threads.
+
+    The depth and the memory cap are taken from the given settings.
+    The size is the display size the images are prepared for. If a
+    MemoryBudget is given, the prefetcher registers with it.
+    """
+    def __init__(self, settings, size, budget=None):
+        self.size = size
+        self.ahead = settings.GetPrefetchAhead()
+        self.behind = settings.GetPrefetchBehind()
+        self.memory = settings.GetPrefetchMemory() * 1024 * 1024
+        self.budget = budget
+        if budget is not None:
+            budget.Register(self)
+        self.draft = settings.GetDraftDecoding()
+        self.tileMemory = settings.GetTileMemory() * 1024 * 1024
+        self.window = settings.GetDisplayWindow()
+        # Previews that are kept on disk, across sessions
+        self.previews = None
+        if settings.UsePreviewCache():
+            self.previews = PreviewCache(settings.GetPreviewDir(), settings.GetPreviewCacheSize())
+        # Worker process that decodes the images, if any
+        self.pipeline = None
+        if settings.UseImagePipeline():
+            self.pipeline = ImagePipeline(settings, size)
+        # filename -> ImageSource, least recently used first
+        self.cache = OrderedDict()
+        # Files that are being decoded right now, and files still to decode
+        self.loading = set()
+        self.work = deque()
+        # Sources of which the full resolution still has to be decoded
+        self.fullWork = deque()
+        # Files that should stay in the cache, nearest first, and the one being displayed
+        self.order = []
+        self.wanted = set()
+        self.current = None
+        self.running = True
+        self.condition = threading.Condition()
+
+        self.workers = []
+        for i in range(settings.GetPrefetchThreads()):
+            worker = threading.Thread(target=self.Work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    """ Create a (not yet loaded) image source for a file.
+
+    Images are decoded in this process if the pipeline is gone.
+    """
+    def CreateSource(self, fileName):
+        if self.pipeline is not None and self.pipeline.IsRunning():
+            return RemoteImageSource(self.pipeline, fileName)
+        return CreateImageSource(fileName, self.size, self.draft, self.previews, self.tileMemory, self.window)
+
+    """ Return a loaded image source for the given file.
+
+    If the file is already prefetched, this returns immediately. If a worker
+    is busy with it, wait for that worker. Otherwise decode it right away.
+    The full resolution of the previous image is released. If the pipeline
+    died, images it decoded are decoded again, in this process.
+    """
+    def Get(self, fileName):
+        with self.condition:
+            previous = None
+            if self.current != fileName:
+                previous = self.cache.get(self.current)
+            self.current = fileName
+        if previous is not None:
+            previous.ReleaseFull()
+
+        with self.condition:
+            while fileName in self.loading:
+                self.condition.wait()
+            if fileName in self.cache:
+                source = self.cache.pop(fileName)
+                if self.IsUsable(source):
+                    self.cache[fileName] = source
+                    return source
+            # Not prefetched; don't let a worker decode it a second time.
+            if fileName in self.work:
+                self.work.remove(fileName)
+
+        source = self.CreateSource(fileName)
+        try:
+            source.Load()
+        except Exception:
+            source.Release()
+            if self.IsUsable(source):
+                raise
+            # The pipeline died while decoding
+            source = self.CreateSource(fileName)
+            source.Load()
+
+        with self.condition:
+            self.Store(fileName, source)
+        return source
+
+    """ Return whether a source can still be used.
+
+    Sources of the pipeline can't, once its worker process is gone.
+    """
+    def IsUsable(self, source):
+        return not isinstance(source, RemoteImageSource) or self.pipeline.IsRunning()
+
+    """ Schedule the images around the current position for prefetching.
+
+    The next entries of todo and the last entries of done are decoded, the
+    nearest ones first; files in exclude are passed over, as they won't be
+    shown. Before those, the full resolution of the current image is
+    decoded. Pending work for other files is dropped.
+    """
+    def Schedule(self, todo, done, exclude=()):
+        ahead = list(itertools.islice((f for f in todo if f not in exclude), 0, self.ahead))
+        behind = list(itertools.islice((f for f in reversed(done) if f not in exclude), 0, self.behind))
+
+        # Alternate between next and previous, so the nearest go first.
+        order = []
+        for i in range(max(len(ahead), len(behind))):
+            if i < len(ahead):
+                order.append(ahead[i])
+            if i < len(behind):
+                order.append(behind[i])
+
+        with self.condition:
+            self.order = order
+            self.wanted = set(order)
+            self.wanted.add(self.current)
+            self.work = deque([f for f in order if f not in self.cache and f not in self.loading])
+            self.fullWork.clear()
+            if self.current in self.cache and not self.cache[self.current].IsFullyLoaded():
+                self.fullWork.append(self.cache[self.current])
+            self.condition.notify_all()
+
+    """ Remove a file from the cache.
+
+    Use when the cached image is modified, so it will be decoded again.
+    """
+    def Discard(self, fileName):
+        with self.condition:
+            if fileName in self.cache:
+                self.cache.pop(fileName).Release()
+
+    """ Stop the worker threads, and the pipeline.
+
+    Workers finish the image they are decoding, and exit afterwards.
+    """
+    def Stop(self):
+        with self.condition:
+            self.running = False
+            self.work.clear()
+            self.fullWork.clear()
+            self.condition.notify_all()
+        if self.pipeline is not None:
+            self.pipeline.Stop()
+
+    """ Main loop of a worker thread.
+
+    Take a file from the work queue, decode it and store it in the cache.
+    Full resolution decoding of the current image goes first.
+    """
+    def Work(self):
+        while True:
+            with self.condition:
+                while self.running and len(self.work) == 0 and len(self.fullWork) == 0:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                if len(self.fullWork) > 0:
+                    full = self.fullWork.popleft()
+                else:
+                    full = None
+                    fileName = self.work.popleft()
+                    self.loading.add(fileName)
+
+            if full is not None:
+                self.WorkFull(full)
+                continue
+
+            source = self.CreateSource(fileName)
+            try:
+                source.Load()
+            except Exception:
+                # Leave it to Get() to report the error on the GUI thread.
+                source.Release()
+                source = None
+
+            with self.condition:
+                self.loading.discard(fileName)
+                if source is not None and (fileName in self.wanted or fileName == self.current):
+                    # Images that are not displayed only keep their overview
+                    if fileName != self.current:
+                        source.ReleaseFull()
+                    self.Store(fileName, source)
+                elif source is not None:
+                    source.Release()
+                self.condition.notify_all()
+
+    """ Decode the full resolution of a source on a worker thread.
+    """
+    def WorkFull(self, source):
+        try:
+            source.LoadFull()
+        except Exception:
+            # Will be raised again when the GUI thread needs the image.
+            return
+        with self.condition:
+            # The frame went on to another image in the meantime
+            if source is not self.cache.get(self.current):
+                source.ReleaseFull()
+            self.Evict()
+
+    """ Store a source in the cache, and evict others if needed.
+
+    Should be called with the condition held.
+    """
+    def Store(self, fileName, source):
+        self.cache[fileName] = source
+        self.Evict()
+
+    """ Evict least recently used sources until the memory cap is met.
+
+    The cap is the smaller of the prefetch memory, and what the budget
+    leaves. Sources that are not wanted anymore go first. If that is not
+    enough, wanted ones are evicted as well, the furthest away first. The
+    current image always stays.
+    """
+    def Evict(self):
+        limit = self.memory
+        if self.budget is not None:
+            limit = min(limit, self.budget.GetAvailable(self))
+        used = sum([s.GetMemoryUsage() for s in self.cache.values()])
+        # The current image may not be in wanted yet, when it is stored before Schedule
+        unwanted = [f for f in self.cache.keys() if f not in self.wanted and f != self.current]
+        furthest = [f for f in reversed(self.order) if f in self.cache and f != self.current]
+        for fileName in unwanted + furthest:
+            if used <= limit:
+                return
+            source = self.cache.pop(fileName)
+            used -= source.GetMemoryUsage()
+            source.Release()
+
+    """ Return the number of bytes used by the cached sources
+
+    Safe to call from any thread.
+    """
+    def GetMemoryUsage(self):
+        with self.condition:
+            return sum([s.GetMemoryUsage() for s in self.cache.values()])
@@ -0,0 +1,158 @@
+# PreviewCache
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Persistent on-disk cache of display scaled previews.
+
+Previews are stored as PNG files in the preview directory, keyed by the
+path, size and modification time of the source image and the display
+size. The original size of the image is stored inside the PNG, so a
+cached image can be displayed without touching the source at all.
+
+The cache is bounded in size; the least recently used previews are
+evicted first.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+
+from PIL import Image
+from PIL import PngImagePlugin
+
+class PreviewCache():
+    """ Initialize a cache in the given directory.
+
+    The directory is created if it does not exist. Maxsize is in MB.
+    If evict is False, storing previews never evicts others; use that
+    when several processes fill the cache at the same time.
+    """
+    def __init__(self, directory, maxsize, evict=True):
+        self.directory = directory
+        self.maxsize = maxsize * 1024 * 1024
+        self.evict = evict
+        self.lock = threading.Lock()
+        # Total size of the cache, counted on first use
+        self.used = None
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created by someone else in the meantime
+                if not os.path.isdir(directory):
+                    raise
+
+    """ Return the name of the cache file for an image.
+
+    The name is based on the absolute path, size and modification time
+    of the image, so a changed image never hits an old preview.
+    """
+    def GetFileName(self, imageFile, size):
+        st = os.stat(imageFile)
+        key = "%s|%d|%d|%dx%d" % (os.path.abspath(imageFile), st.st_size, int(st.st_mtime), size[0], size[1])
+        return self.directory + os.sep + hashlib.sha1(key.encode('utf-8')).hexdigest() + ".png"
+
+    """ Look up the preview of an image.
+
+    Return a 2-tuple (preview, original size), or None if it is not cached.
+    """
+    def Get(self, imageFile, size):
+        fn = self.GetFileName(imageFile, size)
+        try:
+            pil = Image.open(fn)
+            pil.load()
+            orgsize = tuple([int(v) for v in pil.info['orgsize'].split('x')])
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+        # Mark it as recently used
+        try:
+            os.utime(fn, None)
+        except OSError:
+            pass
+        if pil.mode != 'RGB':
+            pil = pil.convert('RGB')
+        return (pil, orgsize)
+
+    """ Store the preview of an image.
+
+    The file is written under a temporary name first, so readers never
+    see a partial preview. The least recently used previews are evicted
+    afterwards if the cache grew too large.
+    """
+    def Put(self, imageFile, size, preview, orgsize):
+        fn = self.GetFileName(imageFile, size)
+        info = PngImagePlugin.PngInfo()
+        info.add_text('orgsize', "%dx%d" % orgsize)
+
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            fh = os.fdopen(fd, 'wb')
+            try:
+                preview.save(fh, 'PNG', pnginfo=info, compress_level=1)
+            finally:
+                fh.close()
+            if os.path.exists(fn):
+                os.remove(fn)
+            os.rename(tmp, fn)
+        except (IOError, OSError):
+            # A cache that can't be written to is not fatal.
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+        with self.lock:
+            if self.used is not None:
+                self.used += os.path.getsize(fn)
+        if self.evict:
+            self.Evict()
+
+    """ Return the previews in the cache
+
+    A list of 3-tuples (last use, size, filename), least recently used first.
+    """
+    def GetEntries(self):
+        entries = []
+        for f in os.listdir(self.directory):
+            if not f.endswith('.png'):
+                continue
+            fn = self.directory + os.sep + f
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, fn))
+        entries.sort()
+        return entries
+
+    """ Evict the least recently used previews, until the cache fits its size.
+    """
+    def Evict(self):
+        with self.lock:
+            if self.used is not None and self.used <= self.maxsize:
+                return
+            entries = self.GetEntries()
+            self.used = sum([e[1] for e in entries])
+            for mtime, size, fn in entries:
+                if self.used <= self.maxsize:
+                    break
+                try:
+                    os.remove(fn)
+                except OSError:
+                    continue
+                self.used -= size
@@ -0,0 +1,95 @@
+# ImagePyramid
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Multi-resolution pyramid of an image.
+
+The pyramid holds the full image, and versions of it at 1/2, 1/4, ... of
+the original size. Scaled views and crops are served from the smallest
+level that still has enough pixels, so they never need the full image
+when a smaller one will do. Levels are scaled by a Resampler.
+"""
+
+from imageoperations import ImageOperations
+from resample import Resampler
+
+class ImagePyramid():
+    """ Build the pyramid for a PIL image.
+
+    Levels are halved until the next one would be smaller than minsize.
+    """
+    def __init__(self, pil, minsize):
+        self.imops = ImageOperations()
+        self.resampler = Resampler()
+        self.levels = [pil]
+        level = pil
+        while level.size[0] // 2 >= minsize[0] and level.size[1] // 2 >= minsize[1]:
+            level = self.Halve(level)
+            self.levels.append(level)
+
+    """ Return an image of half the size of the given one.
+    """
+    def Halve(self, pil):
+        return self.resampler.Resize(pil, (pil.size[0] // 2, pil.size[1] // 2))
+
+    """ Return the size of the original image
+    """
+    def GetSize(self):
+        return self.levels[0].size
+
+    """ Return the level to use for a given downscale factor.
+
+    Return a 2-tuple (image, scale) with the smallest level that is not
+    smaller than the original divided by factor. The scale is the
+    size of that level relative to the original (1, 1/2, 1/4, ...).
+    """
+    def GetLevel(self, factor):
+        index = 0
+        while index + 1 < len(self.levels) and 2 ** (index + 1) <= factor:
+            index += 1
+        return (self.levels[index], 1.0 / 2 ** index)
+
+    """ Return the whole image, scaled to the given size.
+    """
+    def GetScaled(self, size):
+        factor = min(float(self.GetSize()[0]) / size[0], float(self.GetSize()[1]) / size[1])
+        level, scale = self.GetLevel(factor)
+        if level.size == tuple(size):
+            return level
+        return self.resampler.Resize(level, size)
+
+    """ Return a region of the original image, scaled to the given size.
+
+    The region is a 4-tuple (left, up, right, bottom) in coordinates
+    of the original image. It may exceed the image boundaries. With
+    quality, it is scaled up by the slower, sharper filter.
+    """
+    def GetRegion(self, box, size, quality=False):
+        factor = min(float(box[2] - box[0]) / size[0], float(box[3] - box[1]) / size[1])
+        level, scale = self.GetLevel(factor)
+        return self.resampler.Resize(level, size, tuple([c * scale for c in box]), quality)
+
+    """ Return the (approximate) number of bytes used by the scaled levels
+
+    The full resolution level is not included.
+    """
+    def GetMemoryUsage(self):
+        used = 0
+        for level in self.levels[1:]:
+            used += level.size[0] * level.size[1] * len(level.getbands())
+        return used
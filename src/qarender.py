@@ -0,0 +1,304 @@
+#!/usr/bin/python
+
+# QARender
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" QA render program.
+
+Draw the points of every log file in the output directory onto its
+image, to check a finished survey without opening every image in the
+programs. Every log file gets a downscaled JPEG preview in the QA
+directory, named like the log file. With --sheets, the previews are
+also combined into contact sheets.
+
+Markings look like they do in the programs: the primary colour, the
+secondary colour for the second lane of a Di# file, and the skip colour
+for a skipped marking (0, 0). The (0, 0) entries that pad the lanes of
+a Di# file are not drawn.
+
+Images are rendered by a pool of processes, one image at a time per
+process. JPEG images are decoded at a reduced scale, and every process
+is replaced after a number of images, so the memory per process stays
+bounded. Previews and sheets that are newer than their log file and
+image are left alone, so it can be run again after every shift. The exit status is 1 if
+an image is missing or could not be rendered.
+
+Usage: qarender.py [--sheets] [--processes n] [output directory]
+"""
+
+from __future__ import print_function
+
+import inspect
+import multiprocessing
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+from filediscovery import FileDiscovery
+from imageoperations import ImageOperations
+from outputreader import OutputReader, SKIP, PADDING
+from resample import Resampler
+from settings import Settings
+from tiledsource import CreateImageSource
+
+# The renderer of a worker process, see InitWorker
+renderer = None
+
+""" Initialize a worker process with its own renderer.
+"""
+def InitWorker(args):
+    global renderer
+    renderer = QARenderer(*args)
+
+""" Render the preview of a single log file.
+
+Args is a 4-tuple (directory, log file name, image file, preview file).
+Return a 2-tuple (log file name, error message or None).
+"""
+def RenderPreview(args):
+    directory, name, imageFile, target = args
+    try:
+        renderer.RenderPreview(directory, name, imageFile, target)
+    except Exception as e:
+        return (name, str(e))
+    return (name, None)
+
+""" Render a single contact sheet.
+
+Args is a 2-tuple (sheet file, list of preview files).
+Return a 2-tuple (sheet file, error message or None).
+"""
+def RenderSheet(args):
+    target, previews = args
+    try:
+        renderer.RenderSheet(target, previews)
+    except Exception as e:
+        return (target, str(e))
+    return (target, None)
+
+class QARenderer():
+    """ Create a renderer.
+
+    Size is the size previews are scaled to fit, colours the 3-tuple
+    (primary, secondary, skip). Offset and width are those of a marking
+    on the original image. Sheet is the 2-tuple (columns, rows) of a
+    contact sheet, tileSize the size of a preview on it.
+    """
+    def __init__(self, size, colours, offset, width, sheet, tileSize, tileMemory=0, window=(0.5, 99.5)):
+        self.imops = ImageOperations()
+        self.resampler = Resampler()
+        self.reader = OutputReader()
+        self.size = size
+        self.colours = colours
+        self.offset = offset
+        self.width = width
+        self.sheet = sheet
+        self.tileSize = tileSize
+        self.tileMemory = tileMemory
+        self.window = window
+
+    """ Draw the points of a log file onto its image, and save it as preview.
+    """
+    def RenderPreview(self, directory, name, imageFile, target):
+        points = self.reader.ParseFiles(directory, [name])
+        source = CreateImageSource(imageFile, self.size, True, None, self.tileMemory, self.window)
+        try:
+            source.Load()
+            pil = source.GetOverview().copy()
+            scale = float(pil.size[0]) / source.GetSize()[0]
+        finally:
+            source.Release()
+        self.DrawPoints(pil, points, scale)
+        self.Save(pil, target)
+
+    """ Draw the points of a parsed log file on a preview.
+
+    The points are scaled to the preview, and so are the markings, as
+    the programs show them on the overview.
+    """
+    def DrawPoints(self, pil, points, scale):
+        offset = self.offset * scale
+        width = max(1, int(round(self.width * scale)))
+        for f, program, lane, seq, x, y, status in points.tolist():
+            if status == PADDING:
+                continue
+            colour = self.GetColour(lane, status)
+            self.imops.SetMarking(pil, (x * scale, y * scale), colour, offset, width)
+
+    """ Return the colour of a marking, by its lane and status
+    """
+    def GetColour(self, lane, status):
+        if status == SKIP:
+            return self.colours[2]
+        if lane > 0:
+            return self.colours[1]
+        return self.colours[0]
+
+    """ Combine previews into a contact sheet.
+
+    The previews are placed row by row, every one labelled with its name.
+    The list of previews is stored next to the sheet, see IsSheetUpToDate.
+    """
+    def RenderSheet(self, target, previews):
+        tw, th = self.tileSize
+        label = 12
+        sheet = Image.new('RGB', (self.sheet[0] * tw, self.sheet[1] * (th + label)))
+        draw = ImageDraw.Draw(sheet)
+        for i, preview in enumerate(previews):
+            x = (i % self.sheet[0]) * tw
+            y = (i // self.sheet[0]) * (th + label)
+            pil = Image.open(preview)
+            pil.draft('RGB', self.tileSize)
+            size = self.imops.CalculateScaledSize(pil.size, self.tileSize)
+            tile = self.resampler.Resize(pil.convert('RGB'), size)
+            sheet.paste(tile, (x + (tw - size[0]) // 2, y + (th - size[1]) // 2))
+            draw.text((x + 2, y + th), os.path.splitext(os.path.basename(preview))[0], fill="#FFFFFF")
+        del draw
+        self.Save(sheet, target)
+        with open(GetSheetList(target), 'w') as f:
+            f.write("".join([p + "\n" for p in previews]))
+
+    """ Save an image as JPEG, atomically.
+
+    Several processes write to the same directory, so the temporary name
+    is that of the target.
+    """
+    def Save(self, pil, target):
+        tmp = target + ".tmp"
+        try:
+            pil.save(tmp, "JPEG", quality=90)
+            if hasattr(os, 'replace'):
+                os.replace(tmp, target)
+            else:
+                # Python 2 can't rename over an existing file on Windows
+                if os.path.exists(target):
+                    os.remove(target)
+                os.rename(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+""" Return whether a file exists, and is at least as new as all given files
+"""
+def IsUpToDate(target, sources):
+    if not os.path.exists(target):
+        return False
+    mtime = os.path.getmtime(target)
+    return all(os.path.getmtime(s) <= mtime for s in sources)
+
+""" Return the file the list of previews on a contact sheet is stored in
+"""
+def GetSheetList(target):
+    return os.path.splitext(target)[0] + ".txt"
+
+""" Return whether a contact sheet is up to date.
+
+The list of its previews is stored next to it, as the previews on a
+sheet shift when log files are added.
+"""
+def IsSheetUpToDate(target, previews):
+    listFile = GetSheetList(target)
+    if not os.path.exists(listFile) or not IsUpToDate(target, previews):
+        return False
+    with open(listFile) as f:
+        return f.read() == "".join([p + "\n" for p in previews])
+
+""" Run tasks on a pool, and print the progress and errors.
+
+Return the number of errors.
+"""
+def RunTasks(pool, function, tasks, what):
+    done = 0
+    errors = 0
+    for name, error in pool.imap_unordered(function, tasks, 4):
+        done += 1
+        if error is not None:
+            errors += 1
+            print("%s: %s" % (name, error), file=sys.stderr)
+        if done % 100 == 0 or done == len(tasks):
+            print("%d/%d %s" % (done, len(tasks), what))
+    return errors
+
+if __name__ == '__main__':
+    settings = Settings(inspect.getfile(inspect.currentframe()))
+    args = sys.argv[1:]
+    sheets = "--sheets" in args
+    args = [a for a in args if a != "--sheets"]
+    processes = None
+    if "--processes" in args:
+        i = args.index("--processes")
+        processes = int(args[i + 1])
+        del args[i:i + 2]
+    directory = settings.GetOutDir()
+    if len(args) > 0:
+        directory = args[0]
+
+    qadir = settings.GetQADir()
+    if not os.path.isdir(qadir):
+        os.makedirs(qadir)
+
+    reader = OutputReader()
+    images = FileDiscovery(settings, settings.GetInDir()).GetImagesByName()
+
+    tasks = []
+    previews = []
+    missing = 0
+    for name in reader.ListFiles(directory):
+        imageFile = images.get(reader.GetImageName(name))
+        if imageFile is None:
+            missing += 1
+            print("%s: image not found in %s" % (name, settings.GetInDir()), file=sys.stderr)
+            continue
+        target = os.path.join(qadir, name[:-4] + ".jpg")
+        previews.append(target)
+        if not IsUpToDate(target, [os.path.join(directory, name), imageFile]):
+            tasks.append((directory, name, imageFile, target))
+    print("%d of %d previews up to date" % (len(previews) - len(tasks), len(previews)))
+
+    config = (settings.GetQASize(),
+        (settings.GetPrimaryColour(), settings.GetSecondaryColour(), settings.GetSkipColour()),
+        settings.GetMarkingOffset(), settings.GetMarkingWidth(),
+        settings.GetQASheet(), settings.GetThumbnailSize(),
+        settings.GetTileMemory() * 1024 * 1024, settings.GetDisplayWindow())
+    pool = multiprocessing.Pool(processes, InitWorker, (config,), settings.GetQATasksPerChild())
+    errors = missing + RunTasks(pool, RenderPreview, tasks, "previews")
+
+    if sheets:
+        previews = [p for p in previews if os.path.exists(p)]
+        count = settings.GetQASheet()[0] * settings.GetQASheet()[1]
+        work = []
+        for i in range(0, len(previews), count):
+            target = os.path.join(qadir, "sheet%04d.jpg" % (i // count + 1))
+            if not IsSheetUpToDate(target, previews[i:i + count]):
+                work.append((target, previews[i:i + count]))
+        errors += RunTasks(pool, RenderSheet, work, "sheets")
+        # Sheets left over from a run with more previews
+        sheet = (len(previews) + count - 1) // count + 1
+        while os.path.exists(os.path.join(qadir, "sheet%04d.jpg" % sheet)):
+            target = os.path.join(qadir, "sheet%04d.jpg" % sheet)
+            os.remove(target)
+            if os.path.exists(GetSheetList(target)):
+                os.remove(GetSheetList(target))
+            sheet += 1
+
+    pool.close()
+    pool.join()
+    if errors > 0:
+        sys.exit(1)
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+
+# Replay
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Replay program.
+
+Replay a recorded session (see Settings.recordEvents) without wx, as
+fast as possible, and write the log files to an output directory. The
+images themselves are not needed. Prints how many events and images per
+second the annotation cores process, log files included.
+
+With --compare, the log files of every image in the recording are
+compared byte for byte with those in another directory, e.g. the output
+directory of the recorded session; the exit status is 1 if any differ.
+With --repeat, the replay is done n times.
+
+Usage: replay.py [--compare directory] [--repeat n] events.jsonl output-directory
+"""
+
+from __future__ import print_function
+
+import inspect
+import json
+import os
+import sys
+import time
+
+from annotationcore import CORES, NullView
+from logger import Logger
+from settings import Settings
+
+""" Read the events of a recording, a list of dictionaries
+"""
+def ReadEvents(fileName):
+    with open(fileName) as f:
+        return [json.loads(line) for line in f if line.strip() != ""]
+
+""" Replay events, writing the log files with the given settings.
+
+Return the 2-tuple (number of events, set of (header, image) opened).
+"""
+def Replay(settings, events):
+    logger = Logger(settings)
+    core = None
+    opened = set()
+    for event in events:
+        kind = event["event"]
+        if kind == "start":
+            header = event["header"]
+            core = CORES[header](settings, logger, NullView())
+        elif core is None:
+            raise ValueError("event before the start of a session: %s" % event)
+        elif kind == "open":
+            core.OpenImage(event["file"])
+            opened.add((header, event["file"]))
+        elif kind == "action":
+            core.Do(event["action"])
+        elif kind == "click":
+            core.HandleClick(tuple(event["point"]))
+    logger.Close()
+    return len(events), opened
+
+""" Compare the log files of the opened images in two directories.
+
+Return the names of the log files that differ, or exist in only one of them.
+"""
+def Compare(logger, opened, outdir, otherdir):
+    differ = []
+    for header, image in sorted(opened):
+        name = os.path.basename(logger.GetFileName(header, image))
+        contents = []
+        for directory in (outdir, otherdir):
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    contents.append(f.read())
+            else:
+                contents.append(None)
+        if contents[0] != contents[1]:
+            differ.append(name)
+    return differ
+
+if __name__ == '__main__':
+    settings = Settings(inspect.getfile(inspect.currentframe()))
+    args = sys.argv[1:]
+    compare = None
+    repeat = 1
+    if "--compare" in args:
+        i = args.index("--compare")
+        compare = args[i + 1]
+        del args[i:i + 2]
+    if "--repeat" in args:
+        i = args.index("--repeat")
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    if len(args) != 2:
+        print(__doc__.strip().split("\n")[-1])
+        sys.exit(2)
+
+    events = ReadEvents(args[0])
+    settings.SetOutDir(args[1])
+    if not os.path.isdir(args[1]):
+        os.makedirs(args[1])
+
+    recorded = 0
+    if len(events) > 0:
+        recorded = events[-1]["time"] - events[0]["time"]
+    print("%d events, recorded in %.1f s" % (len(events), recorded))
+    for run in range(repeat):
+        start = time.time()
+        count, opened = Replay(settings, events)
+        elapsed = max(time.time() - start, 1e-6)
+        print("Run %d: %.3f s, %.0f events/s, %.0f images/s" % (run + 1, elapsed, count / elapsed, len(opened) / elapsed))
+
+    if compare is not None:
+        logger = Logger(settings)
+        differ = Compare(logger, opened, args[1], compare)
+        logger.Close()
+        for name in differ:
+            print("Differs: " + name)
+        print("%d of %d log files identical" % (len(opened) - len(differ), len(opened)))
+        if len(differ) > 0:
+            sys.exit(1)
@@ -0,0 +1,151 @@
+# Resampler
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Resampling of PIL images, with a strategy per scale factor.
+
+Scaling an image down a lot (the overview) and scaling a small part of
+it up (a zoomed in view) have different needs. Strategies:
+
+- reduce: average blocks of n x n pixels for the integer part of the
+  factor, and box filter what is left. Fast, and free of aliasing.
+- box: box filter. Fast; for factors between 1 and 2.
+- bilinear: bilinear filter. For zoomed in views, which are scaled up:
+  it is the fastest filter that doesn't show blocks, and zooming in must
+  not get slower. Zoomed in views used to be scaled by wx.Image.Scale
+  at its default quality, i.e. nearest neighbour.
+- lanczos: Lanczos filter. Sharper when scaling up, but about twice as
+  slow as bilinear; used when scaling up for quality, e.g. for zoomed in
+  views that are rendered in advance, while idle.
+
+A Resampler chooses the strategy by the scale factor, so callers simply
+ask for a size, and whether they prefer quality over speed. Old versions
+of PIL lack some filters; the nearest available one is used instead.
+"""
+
+from PIL import Image
+
+# Pillow names, with the PIL names as fallback
+LANCZOS = getattr(Image, 'LANCZOS', getattr(Image, 'ANTIALIAS', Image.BICUBIC))
+BOX = getattr(Image, 'BOX', Image.BILINEAR)
+
+class Strategy():
+    """ Return a region of an image, scaled to exactly the given size.
+
+    The box is a 4-tuple (left, up, right, bottom) in coordinates of the
+    image, by default the whole image. It may exceed the image
+    boundaries; that part is black.
+    """
+    def Resize(self, pil, size, box=None):
+        if box is not None and not self.IsInside(pil, box):
+            pil = pil.crop(tuple([int(c) for c in box]))
+            box = None
+        if box is not None and tuple(box) == (0, 0) + pil.size:
+            box = None
+        return self.Scale(pil, tuple(size), box)
+
+    """ Return whether a box lies within an image
+    """
+    def IsInside(self, pil, box):
+        return box[0] >= 0 and box[1] >= 0 and box[2] <= pil.size[0] and box[3] <= pil.size[1]
+
+    """ Scale (a box within) an image to the given size.
+
+    Old versions of PIL can't scale a box, so it is cut out first.
+    """
+    def Filter(self, pil, size, box, method):
+        if box is None:
+            return pil.resize(size, method)
+        try:
+            return pil.resize(size, method, box=box)
+        except TypeError:
+            return pil.crop(tuple([int(c) for c in box])).resize(size, method)
+
+class BilinearStrategy(Strategy):
+    """ Scale with the bilinear filter
+    """
+    def Scale(self, pil, size, box):
+        return self.Filter(pil, size, box, Image.BILINEAR)
+
+class BoxStrategy(Strategy):
+    """ Scale with the box filter
+    """
+    def Scale(self, pil, size, box):
+        return self.Filter(pil, size, box, BOX)
+
+class LanczosStrategy(Strategy):
+    """ Scale with the Lanczos filter
+    """
+    def Scale(self, pil, size, box):
+        return self.Filter(pil, size, box, LANCZOS)
+
+class ReduceStrategy(Strategy):
+    """ Reduce by the integer part of the factor, and box filter the rest
+    """
+    def Scale(self, pil, size, box):
+        if box is None:
+            box = (0, 0) + pil.size
+        factor = int(min((box[2] - box[0]) / float(size[0]), (box[3] - box[1]) / float(size[1])))
+        if factor >= 2 and hasattr(pil, 'reduce'):
+            box = tuple([int(c) for c in box])
+            pil = pil.reduce(factor, box)
+            box = None
+            if pil.size == size:
+                return pil
+        return self.Filter(pil, size, box, BOX)
+
+class Resampler():
+    """ Initialize the strategies.
+    """
+    def __init__(self):
+        self.strategies = {
+            "reduce": ReduceStrategy(),
+            "box": BoxStrategy(),
+            "lanczos": LanczosStrategy(),
+            "bilinear": BilinearStrategy(),
+        }
+
+    """ Return the name of the strategy for a scale factor.
+
+    The factor is the number of source pixels per scaled pixel. With
+    quality, scaling up is done by the slower, sharper filter.
+    """
+    def Select(self, factor, quality=False):
+        if factor >= 2:
+            return "reduce"
+        if factor > 1:
+            return "box"
+        if quality:
+            return "lanczos"
+        return "bilinear"
+
+    """ Return a strategy by name
+    """
+    def GetStrategy(self, name):
+        return self.strategies[name]
+
+    """ Return a region of an image, scaled to exactly the given size.
+
+    See Strategy.Resize. The strategy is chosen by the scale factor, and
+    quality; see Select.
+    """
+    def Resize(self, pil, size, box=None, quality=False):
+        if box is None:
+            box = (0, 0) + pil.size
+        factor = min((box[2] - box[0]) / float(size[0]), (box[3] - box[1]) / float(size[1]))
+        return self.strategies[self.Select(factor, quality)].Resize(pil, size, box)
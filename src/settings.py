@@ -22,6 +22,7 @@
 These settings can all be retrieved via the corresponding settings.
 """
 
+import hashlib
 import os
 import platform
 
@@ -42,23 +43,96 @@ class Settings():
         self.offset = 10
         # Marking width
         self.width = 5
-
+        # Number of next and previous images to decode in advance
+        self.prefetchAhead = 2
+        self.prefetchBehind = 1
+        # Number of threads decoding images in advance
+        self.prefetchThreads = 2
+        # Memory cap of the prefetched images, in MB
+        self.prefetchMemory = 512
+        # Total memory (MB) of all cached image data: prefetched images and zoomed in views
+        self.memoryBudget = 1024
+        # Decode images in a separate process, and the number of shared buffers to hand them over
+        self.imagePipeline = False
+        self.pipelineSlots = 4
+        # Decode JPEGs at display scale first, full resolution only when needed
+        self.draft = True
+        # Memory (MB) of decoded tiles kept per large TIFF image, and the
+        # percentiles of 16-bit images that are displayed as black and white
+        self.tileMemory = 64
+        self.window = (0.5, 99.5)
+        # Size of the image display
+        self.displaySize = (1400, 800)
+        # Render zoomed in views around the mouse in advance, and the number of grid cells to keep
+        self.zoomCache = True
+        self.zoomCacheSize = 16
+        # Show the loupe from the start, and the size of the loupe on the display.
+        # Hold shift to keep the loupe in place, and position the cross hair within it.
+        self.loupe = False
+        self.loupeSize = (240, 240)
+        # Size of the thumbnails in the grid, the number of threads decoding
+        # them, and the number of thumbnails kept
+        self.thumbnailSize = (160, 120)
+        self.thumbnailThreads = 4
+        self.thumbnailCacheSize = 1000
+        # Keep display scaled previews on disk, and the size of that cache in MB
+        self.previewCache = True
+        self.previewCacheSize = 2048
+        # Look for images in subdirectories as well
+        self.recursive = False
+        # Order images naturally (image2 before image10) instead of plain
+        self.naturalSort = False
+        # Keep an index of the found images, for an instant start next time
+        self.fileIndex = True
+        # Write log files in the background, and the number that may be pending
+        self.asyncLogging = True
+        self.logQueueSize = 64
+
+        # Resume: skip all images that already have output of the program
         if prg == "viaduct.py":
             self.indir = "../images"
             self.outdir = "../output"
             self.startat = 1
+            self.resume = False
+            self.header = "RV#"
         elif prg == "distances.py":
             self.indir = "../images"
             self.outdir = "../output"
             self.startat = 1
+            self.resume = False
+            self.header = "Di#"
         elif prg == "vehicles.py":
             self.indir = "../images"
             self.outdir = "../output"
             self.startat = 1
+            self.resume = False
+            self.header = "TS#"
         else:
             self.indir = "../images"
             self.outdir = "../output"
             self.startat = 1
+            self.resume = False
+            self.header = None
+
+        # Record all annotations in a single database, next to the log files
+        self.annotationStore = False
+
+        # Measure the latency of every interaction, keeping the last timingSize phases
+        self.timing = False
+        self.timingSize = 10000
+        # Also stream all measurements to a CSV file in the output directory
+        self.timingCsv = False
+
+        # Record every image, key and click to events.jsonl in the output directory, to replay it with replay.py
+        self.recordEvents = False
+
+        # QA previews of the log files are drawn by qarender.py. They are stored next
+        # to the output directory, like the previews. The size QA previews are scaled to fit
+        self.qaSize = (1024, 768)
+        # Contact sheets have columns x rows QA previews, at the thumbnail size
+        self.qaSheet = (6, 5)
+        # Every worker process of qarender.py is replaced after this many images, to return its memory
+        self.qaTasksPerChild = 50
 
         # Value of the control keys: http://www.asciitable.com/
         # Standard controls are:
@@ -67,6 +141,8 @@ class Settings():
         # p: Previous picture, never save
         # s: Skip a marking. Only works in distances.py
         # l: Next lane switch. Only works in distances, and assumes 2 lanes
+        # m: Show or hide the loupe
+        # g: Show the thumbnail grid
 
         # Windows provides keys with the value of the capital key,
         # other systems correctly provide the actual ascii value...
@@ -77,19 +153,23 @@ class Settings():
             self.prevKey = 80
             self.skipKey = 83
             self.laneSwitchKey = 76
+            self.loupeKey = 77
+            self.gridKey = 71
         else:
             self.zoomKey = 97
             self.nextKey = 110
             self.prevKey = 112
             self.skipKey = 115
             self.laneSwitchKey = 108
+            self.loupeKey = 109
+            self.gridKey = 103
 
     """ Valid image extensions
 
     Check if a certain image conforms to the extensions we figured.
     """
     def IsValidType(self, ext):
-        valid = [".png", ".jpg", ".jpeg", ".bmp"]
+        valid = [".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"]
         return ext in valid
 
     """ Return a list of files from a given directory
@@ -113,6 +193,13 @@ class Settings():
     def GetOutDir(self):
         return self.outdir
 
+    """ Set the output directory
+
+    Use a different output directory than the default one.
+    """
+    def SetOutDir(self, outdir):
+        self.outdir = outdir
+
     """ Return the input directory
 
     The input directory to use.
@@ -176,6 +263,78 @@ class Settings():
     def GetLaneSwitchKey(self): 
         return self.laneSwitchKey
 
+    """ Get the loupe keycode
+
+    Return the keycode to use for showing or hiding the loupe.
+    """
+    def GetLoupeKey(self):
+        return self.loupeKey
+
+    """ Get the grid keycode
+
+    Return the keycode to use for showing the thumbnail grid.
+    """
+    def GetGridKey(self):
+        return self.gridKey
+
+    """ Return the thumbnail size
+
+    The size (width, height) thumbnails are scaled to fit in.
+    """
+    def GetThumbnailSize(self):
+        return self.thumbnailSize
+
+    """ Return the number of thumbnail threads
+
+    The number of worker threads that decode thumbnails.
+    """
+    def GetThumbnailThreads(self):
+        return self.thumbnailThreads
+
+    """ Return the size of the thumbnail cache
+
+    The maximum number of decoded thumbnails that is kept.
+    """
+    def GetThumbnailCacheSize(self):
+        return self.thumbnailCacheSize
+
+    """ Return the skip list file
+
+    The file in the output directory the images that are marked to be
+    skipped in the thumbnail grid are stored in.
+    """
+    def GetSkipListFile(self):
+        return os.path.join(self.outdir, "skipped.txt")
+
+    """ Use the zoom cache
+
+    Return whether zoomed in views are rendered in advance, while idle.
+    """
+    def UseZoomCache(self):
+        return self.zoomCache
+
+    """ Return the size of the zoom cache
+
+    The number of grid cells of rendered zoomed in views to keep.
+    """
+    def GetZoomCacheSize(self):
+        return self.zoomCacheSize
+
+    """ Use the loupe from the start
+
+    Return whether the loupe is shown when the program starts.
+    """
+    def UseLoupe(self):
+        return self.loupe
+
+    """ Return the size of the loupe
+
+    A 2-tuple (width, height) on the display. The loupe magnifies
+    the original image by the zoom factor.
+    """
+    def GetLoupeSize(self):
+        return self.loupeSize
+
     """ Get the offset of a marking
 
     Return the marking offset.
@@ -196,3 +355,250 @@ class Settings():
     """
     def StartAt(self):
         return self.startat
+
+    """ Resume where the output stops
+
+    Return whether images that already have output are skipped.
+    """
+    def Resume(self):
+        return self.resume
+
+    """ Get the header of the log files
+
+    Return the header of the log files of the program, or None.
+    """
+    def GetLogHeader(self):
+        return self.header
+
+    """ Number of next images to prefetch
+
+    Return how many of the next images are decoded in advance.
+    """
+    def GetPrefetchAhead(self):
+        return self.prefetchAhead
+
+    """ Number of previous images to prefetch
+
+    Return how many of the previous images are kept decoded.
+    """
+    def GetPrefetchBehind(self):
+        return self.prefetchBehind
+
+    """ Number of prefetch threads
+
+    Return the number of worker threads used for prefetching.
+    """
+    def GetPrefetchThreads(self):
+        return self.prefetchThreads
+
+    """ Memory cap of the prefetcher
+
+    Return the maximum amount of memory (in MB) used for prefetched images.
+    """
+    def GetPrefetchMemory(self):
+        return self.prefetchMemory
+
+    """ Memory budget
+
+    Return the maximum amount of memory (in MB) used by all caches together.
+    """
+    def GetMemoryBudget(self):
+        return self.memoryBudget
+
+    """ Use the image pipeline
+
+    Return whether images are decoded in a separate worker process.
+    """
+    def UseImagePipeline(self):
+        return self.imagePipeline
+
+    """ Return the number of pipeline slots
+
+    The number of shared memory buffers the worker process hands
+    images over in.
+    """
+    def GetPipelineSlots(self):
+        return self.pipelineSlots
+
+    """ Use draft decoding
+
+    Return whether JPEG images are decoded at a reduced scale for the
+    overview, and at full resolution only when needed.
+    """
+    def GetDraftDecoding(self):
+        return self.draft
+
+    """ Return the tile memory
+
+    The maximum amount of memory (in MB) of decoded tiles that is kept
+    for a tiled TIFF image.
+    """
+    def GetTileMemory(self):
+        return self.tileMemory
+
+    """ Return the display window
+
+    A 2-tuple (low, high) of percentiles; images with more than 8 bits
+    per sample are displayed with the low percentile as black, and the
+    high one as white.
+    """
+    def GetDisplayWindow(self):
+        return self.window
+
+    """ Return the display size
+
+    The size (width, height) of the image display.
+    """
+    def GetDisplaySize(self):
+        return self.displaySize
+
+    """ Use the preview cache
+
+    Return whether display scaled previews are kept on disk.
+    """
+    def UsePreviewCache(self):
+        return self.previewCache
+
+    """ Return the preview directory
+
+    The directory of the preview cache, next to the output directory.
+    """
+    def GetPreviewDir(self):
+        return os.path.join(os.path.dirname(os.path.normpath(self.outdir)), "previews")
+
+    """ Return the size of the preview cache
+
+    The maximum size (in MB) of the preview cache.
+    """
+    def GetPreviewCacheSize(self):
+        return self.previewCacheSize
+
+    """ Return the QA directory
+
+    The directory qarender.py writes the QA previews and contact sheets
+    to, next to the output directory.
+    """
+    def GetQADir(self):
+        return os.path.join(os.path.dirname(os.path.normpath(self.outdir)), "qa")
+
+    """ Return the QA preview size
+
+    A 2-tuple (width, height) the QA previews are scaled to fit.
+    """
+    def GetQASize(self):
+        return self.qaSize
+
+    """ Return the contact sheet layout
+
+    A 2-tuple (columns, rows) of QA previews per contact sheet.
+    """
+    def GetQASheet(self):
+        return self.qaSheet
+
+    """ Return the number of images a QA worker process renders
+
+    After that, the process is replaced by a new one.
+    """
+    def GetQATasksPerChild(self):
+        return self.qaTasksPerChild
+
+    """ Recurse into subdirectories
+
+    Return whether images are also looked for in subdirectories.
+    """
+    def GetRecursiveDiscovery(self):
+        return self.recursive
+
+    """ Use natural sort
+
+    Return whether images are sorted naturally, by the value of numbers in their names.
+    """
+    def UseNaturalSort(self):
+        return self.naturalSort
+
+    """ Use a file index
+
+    Return whether an index of the found images is kept.
+    """
+    def UseFileIndex(self):
+        return self.fileIndex
+
+    """ Return the file index of a directory
+
+    The index is kept with the previews, one per input directory.
+    """
+    def GetFileIndex(self, directory):
+        key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()
+        return os.path.join(self.GetPreviewDir(), "files-" + key[:16] + ".txt")
+
+    """ Use asynchronous logging
+
+    Return whether log files are written by a background thread.
+    """
+    def UseAsyncLogging(self):
+        return self.asyncLogging
+
+    """ Set asynchronous logging
+
+    Write log files in the background or not, for loggers created afterwards.
+    """
+    def SetAsyncLogging(self, enabled):
+        self.asyncLogging = enabled
+
+    """ Return the size of the log queue
+
+    The number of log files that may be waiting to be written.
+    """
+    def GetLogQueueSize(self):
+        return self.logQueueSize
+
+    """ Use the annotation store
+
+    Return whether annotations are recorded in a single database as well.
+    """
+    def UseAnnotationStore(self):
+        return self.annotationStore
+
+    """ Return the annotation store
+
+    The database file of the annotation store, in the output directory.
+    """
+    def GetAnnotationStore(self):
+        return os.path.join(self.outdir, "annotations.sqlite")
+
+    """ Use latency measurement
+
+    Return whether the time every interaction takes is measured.
+    """
+    def UseTiming(self):
+        return self.timing
+
+    """ Return the number of measurements to keep
+
+    Only the most recent ones are used for the summary at exit.
+    """
+    def GetTimingSize(self):
+        return self.timingSize
+
+    """ Return the timing CSV file
+
+    The file all measurements are streamed to, or None if they aren't.
+    """
+    def GetTimingFile(self):
+        if not self.timingCsv:
+            return None
+        return os.path.join(self.outdir, "timing.csv")
+
+    """ Use event recording
+
+    Return whether every image, key and click is recorded.
+    """
+    def UseEventRecording(self):
+        return self.recordEvents
+
+    """ Return the event file
+
+    The file the events are appended to; see replay.py.
+    """
+    def GetEventFile(self):
+        return os.path.join(self.outdir, "events.jsonl")
@@ -0,0 +1,465 @@
+# ThumbnailGrid
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Grid of thumbnails of all images, to triage the queue.
+
+The grid shows every image of a frame as a thumbnail, so long runs of
+images without anything to annotate are easily spotted. Images can be
+marked to be skipped, one at a time or a range at once, and the frame
+can jump straight to any image.
+
+The grid is virtual: only the rows that are visible are painted, and
+only their thumbnails (and those a page around them) are decoded, by a
+pool of worker threads. Decoded thumbnails are kept in a bounded cache,
+so scrolling through tens of thousands of images uses a fixed amount of
+memory.
+
+Controls:
+- Click selects an image; shift-click selects a range.
+- Arrow keys, page up/down, home and end move the selection; with shift
+  the range is extended.
+- Enter or double-click opens the selected image in the frame.
+- The skip key, or right-click, marks the selected images to be skipped,
+  or unmarks them if they all are.
+- Escape, or the grid key, closes the grid.
+"""
+
+import os
+import platform
+import threading
+import wx
+
+from collections import OrderedDict
+from collections import deque
+
+from convert import Convert
+from tiledsource import CreateImageSource
+
+class ThumbnailLoader():
+    """ Initialize the loader, and start the worker threads.
+
+    Thumbnails are scaled to fit size. For every decoded thumbnail,
+    callback(index, fileName, pil) is called from the worker thread;
+    pil is None if the image could not be decoded.
+    """
+    def __init__(self, size, threads, callback):
+        self.size = size
+        self.callback = callback
+        # (index, filename) still to decode, most urgent first
+        self.work = deque()
+        self.loading = set()
+        self.running = True
+        self.condition = threading.Condition()
+
+        self.workers = []
+        for i in range(threads):
+            worker = threading.Thread(target=self.Work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    """ Replace the pending work by a list of (index, filename).
+
+    Thumbnails that are being decoded right now are not requested again.
+    """
+    def Schedule(self, items):
+        with self.condition:
+            self.work = deque([item for item in items if item[0] not in self.loading])
+            self.condition.notify_all()
+
+    """ Stop the worker threads.
+
+    Thumbnails being decoded are finished, but not reported.
+    """
+    def Stop(self):
+        with self.condition:
+            self.running = False
+            self.work.clear()
+            self.condition.notify_all()
+
+    """ Main loop of a worker thread
+    """
+    def Work(self):
+        while True:
+            with self.condition:
+                while self.running and len(self.work) == 0:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                index, fileName = self.work.popleft()
+                self.loading.add(index)
+
+            try:
+                pil = self.Decode(fileName)
+            except Exception:
+                pil = None
+
+            with self.condition:
+                self.loading.discard(index)
+                if not self.running:
+                    return
+            self.callback(index, fileName, pil)
+
+    """ Decode the thumbnail of an image file.
+
+    The overview of an image source of the thumbnail size is used, so
+    JPEGs are decoded at a reduced scale, and large TIFFs only sampled.
+    """
+    def Decode(self, fileName):
+        source = CreateImageSource(fileName, self.size, True)
+        try:
+            source.Load()
+            return source.GetOverview()
+        finally:
+            source.Release()
+
+class ThumbnailGrid(wx.ScrolledWindow):
+    """ Create the grid for a list of files.
+
+    Skipped is the set of files marked to be skipped; handler gets the
+    calls JumpToImage(fileName) and SetSkipped(fileNames, skipped).
+    """
+    def __init__(self, parent, settings, files, skipped, current, handler):
+        wx.ScrolledWindow.__init__(self, parent, wx.ID_ANY, style=wx.VSCROLL | wx.WANTS_CHARS)
+        self.SetBackgroundStyle(getattr(wx, 'BG_STYLE_PAINT', wx.BG_STYLE_CUSTOM))
+        self.convert = Convert()
+        self.settings = settings
+        self.files = files
+        self.skipped = skipped
+        self.handler = handler
+        self.index = dict([(f, i) for i, f in enumerate(files)])
+        # The open image, and the selected range from anchor to selection
+        self.current = self.index.get(current, 0)
+        self.selection = self.current
+        self.anchor = self.current
+
+        self.thumbSize = settings.GetThumbnailSize()
+        # Every cell holds a thumbnail with its file name below it
+        self.margin = 6
+        self.labelHeight = 16
+        self.cellSize = (self.thumbSize[0] + 2 * self.margin, self.thumbSize[1] + 2 * self.margin + self.labelHeight)
+        self.columns = 1
+
+        # index -> bitmap (None if it can't be decoded), least recently used first
+        self.bitmaps = OrderedDict()
+        self.cacheSize = settings.GetThumbnailCacheSize()
+        self.loader = ThumbnailLoader(self.thumbSize, settings.GetThumbnailThreads(), self.OnDecoded)
+
+        self.background = wx.Brush(self.GetBackgroundColour())
+        self.selectedBrush = wx.Brush(wx.Colour(200, 200, 255))
+        self.currentPen = wx.Pen(wx.Colour(settings.GetPrimaryColour()), 3)
+        self.skipPen = wx.Pen(wx.Colour(settings.GetSkipColour()), 3)
+        self.font = wx.Font(8, wx.FONTFAMILY_SWISS, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL)
+
+        self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_SIZE, self.OnSize)
+        self.Bind(wx.EVT_LEFT_DOWN, self.OnLeftDown)
+        self.Bind(wx.EVT_LEFT_DCLICK, self.OnDoubleClick)
+        self.Bind(wx.EVT_RIGHT_DOWN, self.OnRightDown)
+        self.UpdateScrollbars()
+
+    """ Return the number of rows of the grid
+    """
+    def GetRows(self):
+        return (len(self.files) + self.columns - 1) // self.columns
+
+    """ Return the range (first, last) of rows that are (partly) visible
+    """
+    def GetVisibleRows(self):
+        first = self.GetViewStart()[1]
+        height = self.GetClientSize()[1]
+        last = min(first + (height + self.cellSize[1] - 1) // self.cellSize[1], self.GetRows())
+        return (first, last)
+
+    """ Fit the columns to the width, and update the scrollbars
+
+    The selection stays in view.
+    """
+    def UpdateScrollbars(self):
+        self.columns = max(1, self.GetClientSize()[0] // self.cellSize[0])
+        # A scroll unit is a row, so only rows are drawn, never part of one
+        self.SetScrollbars(0, self.cellSize[1], 0, self.GetRows(), 0, self.GetViewStart()[1], True)
+        self.ShowIndex(self.selection)
+        self.Refresh(False)
+
+    """ Called when the grid is resized
+    """
+    def OnSize(self, event):
+        self.UpdateScrollbars()
+        event.Skip()
+
+    """ Scroll an image into view, if it isn't
+    """
+    def ShowIndex(self, index):
+        row = index // self.columns
+        first, last = self.GetVisibleRows()
+        visible = max(1, self.GetClientSize()[1] // self.cellSize[1])
+        if row < first:
+            self.Scroll(-1, row)
+        elif row >= first + visible:
+            self.Scroll(-1, row - visible + 1)
+
+    """ Return the rectangle (x, y, width, height) of a cell, in client coordinates
+    """
+    def GetCellRect(self, index):
+        row = index // self.columns - self.GetViewStart()[1]
+        column = index % self.columns
+        return (column * self.cellSize[0], row * self.cellSize[1], self.cellSize[0], self.cellSize[1])
+
+    """ Return the index of the image at a position in the client area, or None
+    """
+    def GetIndexAt(self, position):
+        column = position[0] // self.cellSize[0]
+        if column >= self.columns:
+            return None
+        index = (self.GetViewStart()[1] + position[1] // self.cellSize[1]) * self.columns + column
+        if index >= len(self.files):
+            return None
+        return index
+
+    """ Return whether an image is in the selected range
+    """
+    def IsSelected(self, index):
+        return min(self.anchor, self.selection) <= index <= max(self.anchor, self.selection)
+
+    """ Paint the visible rows.
+
+    Thumbnails that are not decoded yet are requested, those of the
+    visible rows first, then those of a page below and above.
+    """
+    def OnPaint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(self.background)
+        dc.Clear()
+        dc.SetFont(self.font)
+
+        first, last = self.GetVisibleRows()
+        for index in range(first * self.columns, min(last * self.columns, len(self.files))):
+            self.DrawCell(dc, index)
+
+        page = last - first
+        wanted = list(range(first * self.columns, last * self.columns))
+        wanted += list(range(last * self.columns, (last + page) * self.columns))
+        wanted += list(reversed(range(max(first - page, 0) * self.columns, first * self.columns)))
+        self.loader.Schedule([(i, self.files[i]) for i in wanted if i < len(self.files) and i not in self.bitmaps])
+
+    """ Draw the cell of an image
+    """
+    def DrawCell(self, dc, index):
+        x, y, width, height = self.GetCellRect(index)
+        if self.IsSelected(index):
+            dc.SetPen(wx.TRANSPARENT_PEN)
+            dc.SetBrush(self.selectedBrush)
+            dc.DrawRectangle(x, y, width, height)
+
+        # The thumbnail is centered in its part of the cell
+        if index in self.bitmaps:
+            bitmap = self.bitmaps.pop(index)
+            self.bitmaps[index] = bitmap
+            if bitmap is not None:
+                dc.DrawBitmap(bitmap, x + (width - bitmap.GetWidth()) // 2, y + self.margin + (self.thumbSize[1] - bitmap.GetHeight()) // 2)
+            else:
+                # Could not be decoded
+                dc.DrawText("?", x + width // 2, y + height // 2)
+
+        dc.SetBrush(wx.TRANSPARENT_BRUSH)
+        if self.files[index] in self.skipped:
+            dc.SetPen(self.skipPen)
+            dc.DrawLine(x + self.margin, y + self.margin, x + width - self.margin, y + self.margin + self.thumbSize[1])
+            dc.DrawLine(x + width - self.margin, y + self.margin, x + self.margin, y + self.margin + self.thumbSize[1])
+        if index == self.current:
+            dc.SetPen(self.currentPen)
+            dc.DrawRectangle(x + 2, y + 2, width - 4, height - 4)
+
+        dc.SetClippingRegion(x, y, width - self.margin, height)
+        dc.DrawText(os.path.basename(self.files[index]), x + self.margin, y + height - self.labelHeight)
+        dc.DestroyClippingRegion()
+
+    """ Called by a worker thread when a thumbnail is decoded
+    """
+    def OnDecoded(self, index, fileName, pil):
+        wx.CallAfter(self.AddThumbnail, index, pil)
+
+    """ Add a decoded thumbnail, and repaint its cell if it is visible.
+
+    The least recently used thumbnails are dropped if the cache is full.
+    """
+    def AddThumbnail(self, index, pil):
+        # The grid may be closed in the meantime
+        if not self:
+            return
+        bitmap = None
+        if pil is not None:
+            bitmap = self.convert.PilToBitmap(pil)
+        self.bitmaps[index] = bitmap
+        while len(self.bitmaps) > self.cacheSize:
+            self.bitmaps.popitem(last=False)
+        self.RefreshIndex(index)
+
+    """ Repaint the cell of an image, if it is visible
+    """
+    def RefreshIndex(self, index):
+        first, last = self.GetVisibleRows()
+        if first <= index // self.columns < last:
+            self.RefreshRect(wx.Rect(*self.GetCellRect(index)), False)
+
+    """ Select an image; with extend, the range from the anchor up to it.
+    """
+    def Select(self, index, extend=False):
+        index = min(max(index, 0), len(self.files) - 1)
+        self.selection = index
+        if not extend:
+            self.anchor = index
+        self.ShowIndex(index)
+        self.Refresh(False)
+
+    """ Mark the selected images to be skipped.
+
+    If they all are marked already, they are unmarked instead.
+    """
+    def ToggleSkipped(self):
+        selected = [self.files[i] for i in range(min(self.anchor, self.selection), max(self.anchor, self.selection) + 1)]
+        skip = not all([f in self.skipped for f in selected])
+        self.handler.SetSkipped(selected, skip)
+        self.Refresh(False)
+        self.GetParent().UpdateTitle()
+
+    """ Open the selected image in the frame
+    """
+    def Open(self):
+        self.handler.JumpToImage(self.files[self.selection])
+
+    """ Mark an image as the one that is open in the frame
+    """
+    def SetCurrent(self, fileName):
+        if fileName not in self.index:
+            return
+        previous = self.current
+        self.current = self.index[fileName]
+        self.RefreshIndex(previous)
+        self.RefreshIndex(self.current)
+
+    """ Handle a key of the grid.
+
+    Return whether the key was handled.
+    """
+    def HandleKey(self, event):
+        code = event.GetKeyCode()
+        extend = event.ShiftDown()
+        page = max(1, self.GetClientSize()[1] // self.cellSize[1]) * self.columns
+        moves = {
+            wx.WXK_LEFT: -1,
+            wx.WXK_RIGHT: 1,
+            wx.WXK_UP: -self.columns,
+            wx.WXK_DOWN: self.columns,
+            wx.WXK_PAGEUP: -page,
+            wx.WXK_PAGEDOWN: page,
+        }
+        if code in moves:
+            self.Select(self.selection + moves[code], extend)
+        elif code == wx.WXK_HOME:
+            self.Select(0, extend)
+        elif code == wx.WXK_END:
+            self.Select(len(self.files) - 1, extend)
+        elif code in (wx.WXK_RETURN, wx.WXK_NUMPAD_ENTER):
+            self.Open()
+        elif code == self.settings.GetSkipKey():
+            self.ToggleSkipped()
+        else:
+            return False
+        return True
+
+    """ Select the clicked image; with shift, the range up to it
+    """
+    def OnLeftDown(self, event):
+        self.SetFocus()
+        index = self.GetIndexAt(event.GetPosition())
+        if index is not None:
+            self.Select(index, event.ShiftDown())
+
+    """ Open the double-clicked image in the frame
+    """
+    def OnDoubleClick(self, event):
+        index = self.GetIndexAt(event.GetPosition())
+        if index is not None:
+            self.Select(index)
+            self.Open()
+
+    """ Mark the clicked image to be skipped, or the selection if it is in it
+    """
+    def OnRightDown(self, event):
+        index = self.GetIndexAt(event.GetPosition())
+        if index is None:
+            return
+        if not self.IsSelected(index):
+            self.Select(index)
+        self.ToggleSkipped()
+
+    """ Stop decoding thumbnails
+    """
+    def Stop(self):
+        self.loader.Stop()
+
+class ThumbnailFrame(wx.Frame):
+    """ Create the grid frame for the images of an annotation frame.
+
+    The frame is the handler of the grid, and is told when the grid is
+    closed through OnGridClosed().
+    """
+    def __init__(self, frame, settings, files, skipped, current):
+        wx.Frame.__init__(self, frame, wx.ID_ANY, "Thumbnails", size=settings.GetDisplaySize())
+        self.frame = frame
+        self.settings = settings
+        self.grid = ThumbnailGrid(self, settings, files, skipped, current, frame)
+        self.grid.SetFocus()
+
+        # Same as the annotation frame, see there
+        if platform.system() == 'Windows':
+            self.grid.Bind(wx.EVT_KEY_DOWN, self.KeyboardEvent)
+        else:
+            self.Bind(wx.EVT_CHAR_HOOK, self.KeyboardEvent)
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
+        self.UpdateTitle()
+
+    """ Show the number of images, and of those that are skipped
+    """
+    def UpdateTitle(self):
+        skipped = len([f for f in self.grid.files if f in self.grid.skipped])
+        self.SetTitle("Thumbnails: " + str(len(self.grid.files)) + " images | " + str(skipped) + " skipped")
+
+    """ Mark the image that is open in the annotation frame
+    """
+    def SetCurrent(self, fileName):
+        self.grid.SetCurrent(fileName)
+
+    """ Handle the keys of the grid; escape and the grid key close it.
+    """
+    def KeyboardEvent(self, event):
+        code = event.GetKeyCode()
+        if code in (wx.WXK_ESCAPE, self.settings.GetGridKey()):
+            self.Close()
+        elif not self.grid.HandleKey(event):
+            event.Skip()
+
+    """ Stop decoding, and let the annotation frame know
+    """
+    def OnClose(self, event):
+        self.grid.Stop()
+        self.frame.OnGridClosed()
+        event.Skip()
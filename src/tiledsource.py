@@ -0,0 +1,365 @@
+# TiledImageSource
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Image source for (very) large TIFF files, that decodes tiles on demand.
+
+A TIFF file is stored in segments: tiles, or strips of rows. Instead of
+decoding the whole image, a TiledImageSource only decodes the segments
+that intersect the requested region, so images far larger than memory
+can be browsed. Pyramidal TIFFs contain overviews (reduced resolution
+versions of the image); the smallest one that still has enough pixels
+is used, both for the overview and for zoomed in regions. Of an image
+without overviews, the overview is sampled from every segment once.
+
+Images with more than 8 bits per sample (16-bit, float) are windowed to
+8 bits for display: the given low and high percentiles of the sampled
+overview are mapped to black and white. The coordinates are those of the
+full resolution image, as with an ImageSource.
+
+The TIFF files are read with the tifffile package. Without it, or for
+TIFF files PIL reads just as well (plain 8-bit images without overviews),
+an ordinary ImageSource is used.
+"""
+
+import math
+
+from collections import OrderedDict
+
+import numpy
+
+from PIL import Image
+
+from imagesource import ImageSource
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+TIFF_TYPES = [".tif", ".tiff"]
+
+""" Return a (not yet loaded) image source for a file.
+
+A TiledImageSource if the file is a TIFF that benefits from it, an
+ImageSource otherwise. TileMemory is the number of bytes of decoded
+segments a TiledImageSource keeps, window the percentiles (low, high)
+that 16-bit images are windowed to.
+"""
+def CreateImageSource(imageFile, size, draft=False, cache=None, tileMemory=0, window=(0.5, 99.5)):
+    if IsTiled(imageFile):
+        return TiledImageSource(imageFile, size, cache, tileMemory, window)
+    return ImageSource(imageFile, size, draft, cache)
+
+""" Return whether a file should be read by a TiledImageSource.
+
+That is a TIFF file tifffile can decode segment by segment, which is
+tiled, has overviews or more than 8 bits per sample. Only the header is read.
+"""
+def IsTiled(imageFile):
+    if tifffile is None or imageFile[imageFile.rfind("."):].lower() not in TIFF_TYPES:
+        return False
+    try:
+        with tifffile.TiffFile(imageFile) as tif:
+            series = tif.series[0]
+            page = series.keyframe
+            if not hasattr(page, 'decode') or page.imagedepth != 1:
+                return False
+            # Grayscale, RGB, or YCbCr that is JPEG compressed (decoded to RGB)
+            if page.photometric not in (1, 2) and not (page.photometric == 6 and page.compression == 7):
+                return False
+            return page.is_tiled or len(series.levels) > 1 or page.dtype != numpy.uint8
+    except Exception:
+        # Leave reporting the error to the ImageSource
+        return False
+
+class TiledImageSource(ImageSource):
+    """ Create a tiled image source for a given TIFF file.
+
+    Nothing is decoded until Load() is called.
+    """
+    def __init__(self, imageFile, size, cache=None, tileMemory=0, window=(0.5, 99.5)):
+        ImageSource.__init__(self, imageFile, size, False, cache)
+        self.tileMemory = tileMemory
+        self.window = window
+        # The open file, and (page, width, height) of every level, largest first
+        self.tif = None
+        self.levels = None
+        # Pixel values mapped to black and white, for images of more than 8 bits
+        self.range = None
+        # (level, segment index) -> decoded segment, least recently used first
+        self.tiles = OrderedDict()
+        self.tileBytes = 0
+
+    """ Open the file, if that did not happen yet.
+
+    Must be called with the lock held.
+    """
+    def Open(self):
+        if self.tif is not None:
+            return
+        tif = tifffile.TiffFile(self.fileName)
+        try:
+            levels = []
+            for level in tif.series[0].levels:
+                page = level.keyframe
+                levels.append((page, page.imagewidth, page.imagelength))
+        except Exception:
+            tif.close()
+            raise
+        self.tif = tif
+        self.levels = levels
+        self.originalSize = (levels[0][1], levels[0][2])
+
+    """ Prepare the overview.
+
+    The overview is sampled from the smallest level that is still large
+    enough, decoding every segment of that level once. The window of
+    16-bit images is taken from the same samples.
+    """
+    def Decode(self):
+        with self.lock:
+            self.Open()
+        size = self.GetOverviewSize()
+        index = self.GetLevelIndex(float(self.originalSize[0]) / size[0])
+        page, width, height = self.levels[index]
+        step = max(1, min(width // size[0], height // size[1]))
+        samples = self.ReadArea(index, (0, 0, width, height), step)
+        if samples.dtype != numpy.uint8 and self.range is None:
+            self.range = self.GetRange(samples)
+        overview = self.ToPil(samples)
+        if overview.size != tuple(size):
+            overview = self.resampler.Resize(overview, size)
+        self.overview = overview
+
+    """ Return the pixel values (low, high) of the window, for a set of samples
+    """
+    def GetRange(self, samples):
+        # A million samples are plenty for the percentiles
+        flat = samples.ravel()
+        flat = flat[::max(1, len(flat) // 1000000)]
+        low, high = numpy.percentile(flat, self.window)
+        if high <= low:
+            high = low + 1
+        return (float(low), float(high))
+
+    """ Return the window of an image of more than 8 bits.
+
+    If the overview was taken from the preview cache, the smallest level
+    is sampled for it.
+    """
+    def GetWindow(self):
+        if self.range is None:
+            index = len(self.levels) - 1
+            page, width, height = self.levels[index]
+            step = max(1, int(math.sqrt(float(width) * height / 1000000)))
+            self.range = self.GetRange(self.ReadArea(index, (0, 0, width, height), step))
+        return self.range
+
+    """ Return the index of the level to use for a given downscale factor.
+
+    That is the smallest level that is not smaller than the original
+    divided by factor.
+    """
+    def GetLevelIndex(self, factor):
+        index = 0
+        while index + 1 < len(self.levels) and self.levels[index + 1][1] * factor >= self.originalSize[0]:
+            index += 1
+        return index
+
+    """ Return the decoded pixels of an area of a level, as a numpy array.
+
+    The area is a 4-tuple (left, up, right, bottom) in coordinates of the
+    level, within its bounds. Only the segments intersecting it are
+    decoded. With a step larger than 1, only every step-th pixel in both
+    directions is taken, and the segments are not kept.
+    The array has the shape (rows, columns, samples).
+    """
+    def ReadArea(self, index, box, step=1):
+        page, width, height = self.levels[index]
+        rows = (box[3] - box[1] + step - 1) // step
+        columns = (box[2] - box[0] + step - 1) // step
+        out = numpy.zeros((rows, columns, page.samplesperpixel), page.dtype)
+
+        if page.is_tiled:
+            segmentWidth, segmentHeight = page.tilewidth, page.tilelength
+        else:
+            segmentWidth, segmentHeight = width, min(page.rowsperstrip, height)
+        across = (width + segmentWidth - 1) // segmentWidth
+        down = (height + segmentHeight - 1) // segmentHeight
+        planes = page.samplesperpixel if page.planarconfig == 2 else 1
+
+        for plane in range(planes):
+            for row in range(box[1] // segmentHeight, (box[3] - 1) // segmentHeight + 1):
+                for column in range(box[0] // segmentWidth, (box[2] - 1) // segmentWidth + 1):
+                    segment = self.GetSegment(index, (plane * down + row) * across + column, step == 1)
+                    if segment is None:
+                        continue
+                    self.PlaceSegment(out, segment, box, step, column * segmentWidth, row * segmentHeight, plane, planes)
+        return out
+
+    """ Copy the part of a decoded segment within an area into out.
+
+    The segment is at (x, y) in the level. Of separate planes, the
+    segment only holds the given sample.
+    """
+    def PlaceSegment(self, out, segment, box, step, x, y, plane, planes):
+        # Segments have the shape (depth, rows, columns, samples)
+        pixels = segment[0]
+        # The first pixel of the segment on the sampling grid, in both directions
+        top = max(box[1], y)
+        top += (box[1] - top) % step
+        left = max(box[0], x)
+        left += (box[0] - left) % step
+        bottom = min(box[3], y + pixels.shape[0])
+        right = min(box[2], x + pixels.shape[1])
+        if top >= bottom or left >= right:
+            return
+        part = pixels[top - y:bottom - y:step, left - x:right - x:step]
+        rows = slice((top - box[1]) // step, (top - box[1]) // step + part.shape[0])
+        columns = slice((left - box[0]) // step, (left - box[0]) // step + part.shape[1])
+        if planes > 1:
+            out[rows, columns, plane] = part[:, :, 0]
+        else:
+            out[rows, columns] = part
+
+    """ Return a decoded segment of a level, or None if it is empty.
+
+    Recently used segments are kept, up to the tile memory, if keep is set.
+    """
+    def GetSegment(self, index, number, keep):
+        key = (index, number)
+        page = self.levels[index][0]
+        with self.lock:
+            segment = self.tiles.pop(key, None)
+            if segment is not None:
+                self.tiles[key] = segment
+                return segment
+            self.Open()
+            # Tags may be read from the file lazily as well
+            decode = page.decode
+            jpegtables = page.jpegtables
+            offset = page.dataoffsets[number]
+            count = page.databytecounts[number]
+            data = None
+            if offset and count:
+                self.tif.filehandle.seek(offset)
+                data = self.tif.filehandle.read(count)
+
+        # Decoding does not need the file, so other segments can be read meanwhile
+        segment, indices, shape = decode(data, number, jpegtables=jpegtables)
+        if segment is None or not keep:
+            return segment
+
+        with self.lock:
+            if key not in self.tiles:
+                self.tiles[key] = segment
+                self.tileBytes += segment.nbytes
+            while self.tileBytes > self.tileMemory and len(self.tiles) > 0:
+                key, evicted = self.tiles.popitem(last=False)
+                self.tileBytes -= evicted.nbytes
+        return segment
+
+    """ Return decoded pixels as an RGB PIL image.
+
+    Images of more than 8 bits are windowed to 8 bits.
+    """
+    def ToPil(self, pixels):
+        if pixels.dtype != numpy.uint8:
+            low, high = self.GetWindow()
+            pixels = (pixels.astype(numpy.float32) - low) * (255.0 / (high - low))
+            pixels = numpy.clip(pixels, 0, 255).astype(numpy.uint8)
+        if pixels.shape[2] < 3:
+            # Grayscale, maybe with alpha
+            pixels = numpy.repeat(pixels[:, :, :1], 3, axis=2)
+        elif pixels.shape[2] > 3:
+            pixels = pixels[:, :, :3]
+        return Image.fromarray(numpy.ascontiguousarray(pixels), 'RGB')
+
+    """ Nothing to decode in advance; regions are decoded when needed.
+
+    Return the source itself, which renders the regions.
+    """
+    def LoadFull(self):
+        return self
+
+    """ Release the decoded segments.
+
+    Only the overview is kept.
+    """
+    def ReleaseFull(self):
+        with self.lock:
+            self.tiles.clear()
+            self.tileBytes = 0
+
+    """ Return whether regions can be rendered right away
+
+    Always, since only the segments of a region are decoded for it.
+    """
+    def IsFullyLoaded(self):
+        return True
+
+    """ Return the full resolution PIL image
+
+    Decodes the whole image, so avoid it for large images.
+    """
+    def GetImage(self):
+        return self.RenderRegion((0, 0) + self.originalSize, self.originalSize)
+
+    """ Return a region of the image, scaled to exactly the given size.
+
+    The viewport is a 4-tuple (left, up, right, bottom) in original image
+    coordinates. It may exceed the image boundaries; that part is black.
+    If even the smallest level has far more pixels than needed, it is
+    sampled, so the memory used stays in proportion to the given size.
+    See ImageSource.RenderRegion for quality.
+    """
+    def RenderRegion(self, viewport, size, quality=False):
+        with self.lock:
+            self.Open()
+        factor = min(float(viewport[2] - viewport[0]) / size[0], float(viewport[3] - viewport[1]) / size[1])
+        index = self.GetLevelIndex(factor)
+        page, width, height = self.levels[index]
+        scale = (float(width) / self.originalSize[0], float(height) / self.originalSize[1])
+        box = (int(viewport[0] * scale[0]), int(viewport[1] * scale[1]), int(viewport[2] * scale[0]), int(viewport[3] * scale[1]))
+        step = max(1, int(factor * scale[0]))
+
+        region = Image.new('RGB', (max((box[2] - box[0]) // step, 1), max((box[3] - box[1]) // step, 1)))
+        inside = (max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height))
+        if inside[0] < inside[2] and inside[1] < inside[3]:
+            pixels = self.ReadArea(index, inside, step)
+            region.paste(self.ToPil(pixels), ((inside[0] - box[0]) // step, (inside[1] - box[1]) // step))
+        return self.resampler.Resize(region, size, quality=quality)
+
+    """ Return the (approximate) number of bytes used by this source
+    """
+    def GetMemoryUsage(self):
+        used = self.tileBytes
+        if self.overview is not None:
+            used += self.overview.size[0] * self.overview.size[1] * 3
+        return used
+
+    """ Close the file.
+    """
+    def Release(self):
+        with self.lock:
+            self.tiles.clear()
+            self.tileBytes = 0
+            if self.tif is not None:
+                self.tif.close()
+                self.tif = None
@@ -0,0 +1,190 @@
+# Timing
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Latency measurement of the interactions with a program.
+
+An interaction (next image, zoom, ...) begins when the key or mouse
+button is handled, and ends when the program is idle again, i.e. when
+the new image is painted. In between, the time of every phase (decoding,
+conversion, bitmap creation, ...) is measured. Interactions that are
+started while another one is running are counted as part of it; the
+name of the interaction then becomes, for example, "log+next".
+
+The most recent measurements are kept in a ring buffer, and summarized
+as percentiles when the program exits. They can also be streamed to a
+CSV file, one line per phase.
+
+When measurement is disabled, a NullTiming is used instead, which does
+nothing at all.
+"""
+
+from __future__ import print_function
+
+import os
+import time
+import timeit
+
+from collections import deque
+
+""" Return the Timing to use for the given settings.
+
+A NullTiming if latency measurement is disabled.
+"""
+def CreateTiming(settings):
+    if not settings.UseTiming():
+        return NullTiming()
+    return Timing(settings.GetTimingSize(), settings.GetTimingFile())
+
+class Timing():
+    """ Initialize the measurement.
+
+    Size is the number of phases kept for the summary. If csvFile is
+    given, all measurements are appended to it as well.
+    """
+    def __init__(self, size, csvFile=None):
+        # (interaction, phase, seconds) of the most recent phases
+        self.records = deque(maxlen=size)
+        self.csvFile = csvFile
+        self.csv = None
+        # The running interaction, when it began, and its phases so far
+        self.interaction = None
+        self.began = None
+        self.phases = []
+
+    """ Begin an interaction, unless one is running already.
+    """
+    def Begin(self, name):
+        if self.interaction is None:
+            self.interaction = name
+            self.began = timeit.default_timer()
+            self.phases = []
+        elif name not in self.interaction.split("+"):
+            self.interaction += "+" + name
+
+    """ Start measuring a phase.
+
+    Return the start time, to pass to Stop.
+    """
+    def Start(self):
+        return timeit.default_timer()
+
+    """ Stop measuring a phase.
+
+    Phases outside of an interaction are not recorded.
+    """
+    def Stop(self, phase, start):
+        if self.interaction is not None:
+            self.phases.append((phase, timeit.default_timer() - start))
+
+    """ End the running interaction, if any.
+
+    Its phases, and the total time as phase "total", are recorded.
+    """
+    def End(self):
+        if self.interaction is None:
+            return
+        phases = self.phases + [("total", timeit.default_timer() - self.began)]
+        for phase, seconds in phases:
+            self.records.append((self.interaction, phase, seconds))
+        if self.csvFile is not None:
+            self.WriteCSV(self.interaction, phases)
+        self.interaction = None
+        self.phases = []
+
+    """ Append the phases of an interaction to the CSV file.
+
+    The file is opened on first use; a header is written if it is new.
+    Columns are the time of day, interaction, phase and milliseconds.
+    """
+    def WriteCSV(self, interaction, phases):
+        try:
+            if self.csv is None:
+                new = not os.path.exists(self.csvFile)
+                self.csv = open(self.csvFile, 'a')
+                if new:
+                    self.csv.write("time,interaction,phase,ms\n")
+            now = time.time()
+            self.csv.write("".join(["%.3f,%s,%s,%.3f\n" % (now, interaction, phase, seconds * 1000) for phase, seconds in phases]))
+            self.csv.flush()
+        except (IOError, OSError) as e:
+            # Measuring must never break the program
+            print("Can't write %s: %s" % (self.csvFile, e))
+            self.csvFile = None
+
+    """ Return a percentile of a sorted list of values
+
+    Nearest rank; p is in percent.
+    """
+    def Percentile(self, values, p):
+        rank = int(round(p / 100.0 * len(values) + 0.5))
+        return values[min(max(rank, 1), len(values)) - 1]
+
+    """ Summarize the recorded phases.
+
+    A sorted list of 6-tuples (interaction, phase, count, p50, p95, p99),
+    with the percentiles in seconds.
+    """
+    def GetSummary(self):
+        grouped = {}
+        for interaction, phase, seconds in self.records:
+            grouped.setdefault((interaction, phase), []).append(seconds)
+        summary = []
+        for key in sorted(grouped.keys()):
+            values = sorted(grouped[key])
+            summary.append(key + (len(values), self.Percentile(values, 50), self.Percentile(values, 95), self.Percentile(values, 99)))
+        return summary
+
+    """ Print the summary of the recorded phases, in milliseconds
+    """
+    def PrintSummary(self):
+        summary = self.GetSummary()
+        if len(summary) == 0:
+            return
+        print("%-16s %-10s %6s %9s %9s %9s" % ("interaction", "phase", "count", "p50 ms", "p95 ms", "p99 ms"))
+        for interaction, phase, count, p50, p95, p99 in summary:
+            print("%-16s %-10s %6d %9.1f %9.1f %9.1f" % (interaction, phase, count, p50 * 1000, p95 * 1000, p99 * 1000))
+
+    """ End the measurement.
+
+    Print the summary, and close the CSV file.
+    """
+    def Close(self):
+        self.End()
+        self.PrintSummary()
+        if self.csv is not None:
+            self.csv.close()
+            self.csv = None
+
+class NullTiming():
+    """ Measurement that is disabled: every method does nothing.
+    """
+    def Begin(self, name):
+        pass
+
+    def Start(self):
+        return None
+
+    def Stop(self, phase, start):
+        pass
+
+    def End(self):
+        pass
+
+    def Close(self):
+        pass
@@ -0,0 +1,212 @@
+#!/usr/bin/python
+
+# Validate
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Validate program.
+
+Check every log file in the output directory against its image, and
+write a JSON report. Checks, by the name they have in the report:
+
+    parse   the log file can be read
+    count   RV# files have exactly two points, TS# files at least two,
+            and both lanes of a Di# file are equally long
+    source  the image of the log file is in the input directory
+    size    the size of the image can be read; only its header is read
+    bounds  all points, except skipped markings and padding, lie
+            within the image
+
+Files are checked by a pool of processes. The report has the number of
+files checked and failed, the number of failures per check, and every
+failed file with its errors. The exit status is 1 if any file failed,
+so other jobs can depend on it.
+
+Usage: validate.py [--processes n] [--report file] [output directory]
+"""
+
+from __future__ import print_function
+
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+
+from PIL import Image
+
+from filediscovery import FileDiscovery
+from outputreader import OutputReader, POINT
+from settings import Settings
+from tiledsource import tifffile, TIFF_TYPES
+
+# The checks, in the order they are done
+CHECKS = ["parse", "count", "source", "size", "bounds"]
+
+""" Initialize a worker process.
+
+Only image headers are read, so large images are no decompression bombs.
+"""
+def InitWorker():
+    Image.MAX_IMAGE_PIXELS = None
+
+""" Check a single log file, in a worker process.
+
+Args is a 3-tuple (directory, log file name, image file or None).
+Return the result, see Validator.Validate.
+"""
+def ValidateFile(args):
+    directory, name, imageFile = args
+    return Validator().Validate(directory, name, imageFile)
+
+class Validator():
+    """ Initialize the validator.
+    """
+    def __init__(self):
+        self.reader = OutputReader()
+
+    """ Check a log file against its image.
+
+    Return a dictionary with the file, program, image, the size of the
+    image, and a list of errors. Every error is a dictionary with the
+    check that failed and a message; bounds errors also list the points
+    outside the image as [lane, seq, x, y].
+    """
+    def Validate(self, directory, name, imageFile):
+        result = {"file": name, "program": name[0:3], "image": imageFile, "size": None, "errors": []}
+        # No single file may abort the run, so every error is reported
+        try:
+            points = self.reader.ParseFiles(directory, [name])
+        except Exception as e:
+            self.AddError(result, "parse", "%s: %s" % (type(e).__name__, e))
+            return result
+        self.CheckCount(result, points)
+
+        if imageFile is None:
+            self.AddError(result, "source", "image not found")
+            return result
+        try:
+            size = self.GetImageSize(imageFile)
+        except Exception as e:
+            self.AddError(result, "size", "%s: %s" % (type(e).__name__, e))
+            return result
+        result["size"] = list(size)
+        self.CheckBounds(result, points, size)
+        return result
+
+    """ Add an error to a result
+    """
+    def AddError(self, result, check, message, **extra):
+        error = {"check": check, "message": message}
+        error.update(extra)
+        result["errors"].append(error)
+
+    """ Check the number of points, by the rules of the program
+    """
+    def CheckCount(self, result, points):
+        program = result["program"]
+        lanes = [int((points['lane'] == lane).sum()) for lane in (0, 1)]
+        if program == "RV#" and lanes[0] != 2:
+            self.AddError(result, "count", "%d points, expected 2" % lanes[0])
+        elif program == "TS#" and lanes[0] < 2:
+            self.AddError(result, "count", "%d points, expected at least 2" % lanes[0])
+        elif program == "Di#" and (lanes[0] != lanes[1] or lanes[0] == 0):
+            self.AddError(result, "count", "lanes of %d and %d points, expected two equal lanes" % tuple(lanes))
+
+    """ Check that all points lie within an image of the given size.
+
+    Skipped markings and padding are (0, 0), and not checked.
+    """
+    def CheckBounds(self, result, points, size):
+        x = points['x']
+        y = points['y']
+        outside = (points['status'] == POINT) & ((x < 0) | (y < 0) | (x >= size[0]) | (y >= size[1]))
+        if not outside.any():
+            return
+        found = [[lane, seq, self.reader.Number(px), self.reader.Number(py)]
+            for f, program, lane, seq, px, py, status in points[outside].tolist()]
+        self.AddError(result, "bounds", "%d points outside %dx%d" % (len(found), size[0], size[1]), points=found)
+
+    """ Return the size (width, height) of an image, reading its header only.
+
+    TIFF files PIL can't open are read with tifffile, if available.
+    """
+    def GetImageSize(self, imageFile):
+        try:
+            with open(imageFile, 'rb') as f:
+                return Image.open(f).size
+        except IOError:
+            if tifffile is None or os.path.splitext(imageFile)[1].lower() not in TIFF_TYPES:
+                raise
+        with tifffile.TiffFile(imageFile) as tif:
+            page = tif.pages[0]
+            return (page.imagewidth, page.imagelength)
+
+""" Return the report of a list of results
+"""
+def CreateReport(directory, results):
+    failed = [r for r in results if len(r["errors"]) > 0]
+    counts = dict([(check, 0) for check in CHECKS])
+    for r in failed:
+        for error in r["errors"]:
+            counts[error["check"]] += 1
+    return {
+        "directory": directory,
+        "checked": len(results),
+        "failed": len(failed),
+        "errors": counts,
+        "files": failed,
+    }
+
+if __name__ == '__main__':
+    settings = Settings(inspect.getfile(inspect.currentframe()))
+    args = sys.argv[1:]
+    processes = None
+    reportFile = None
+    if "--processes" in args:
+        i = args.index("--processes")
+        processes = int(args[i + 1])
+        del args[i:i + 2]
+    if "--report" in args:
+        i = args.index("--report")
+        reportFile = args[i + 1]
+        del args[i:i + 2]
+    directory = settings.GetOutDir()
+    if len(args) > 0:
+        directory = args[0]
+
+    reader = OutputReader()
+    images = FileDiscovery(settings, settings.GetInDir()).GetImagesByName()
+    work = [(directory, name, images.get(reader.GetImageName(name))) for name in reader.ListFiles(directory)]
+
+    pool = multiprocessing.Pool(processes, InitWorker)
+    results = list(pool.imap_unordered(ValidateFile, work, 16))
+    pool.close()
+    pool.join()
+    results.sort(key=lambda r: r["file"])
+
+    report = CreateReport(directory, results)
+    if reportFile is None:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        print()
+    else:
+        with open(reportFile, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    print("%d files checked, %d failed" % (report["checked"], report["failed"]), file=sys.stderr)
+    if report["failed"] > 0:
+        sys.exit(1)
@@ -32,62 +32,21 @@ from PIL import Image
 from collections import deque
 
 from abstractframe import AbstractFrame
+from annotationcore import VehiclesCore
 from convert import Convert
+from filediscovery import FileDiscovery
 from imageoperations import ImageOperations
 from logger import Logger
 from settings import Settings
 
 class Frame(AbstractFrame):
-    def __init__(self, parent=None, id=-1,pos=wx.DefaultPosition, title='wxPython', size=None, settings=None, fileList=[]):
-        AbstractFrame.__init__(self, parent, id, pos, title, size, settings, fileList)
+    def __init__(self, parent=None, id=-1,pos=wx.DefaultPosition, title='wxPython', size=None, settings=None, fileList=[], discovery=None):
+        AbstractFrame.__init__(self, parent, id, pos, title, size, settings, fileList, discovery)
 
-    def KeyboardEvent(self, event):
-        zk = self.settings.GetZoomKey()
-        nk = self.settings.GetNextKey()
-        pk = self.settings.GetPreviousKey()
-        sk = self.settings.GetSkipKey()
-
-        ekc = event.GetKeyCode()
-
-        # zoom
-        if ekc == zk:
-            # Toggle zoom
-            if self.zoomed:
-                self.zoomed = False
-                self.SetPilImage()
-            else:
-                self.zoomed = True
-                self.ZoomAtLocation(self.currentMouseLocation)
-        elif ekc == nk:
-            if len(self.locationList) > 1:
-                self.logger.LogVehicle(self.curFileName, self.locationList)
-
-            self.OpenNextImage()
-        elif ekc == pk:
-            self.OpenPrevImage()
-        # Skip marking, but indicate it with a different coloured box
-        elif ekc == sk:
-            self.skip = True
-        else:
-            return
-
-    def MouseEventLeft(self, event):
-        # Only process when zoomed in
-        if self.zoomed:
-            self.zoomed = False
-            x = event.GetX()
-            y = event.GetY()
-            point = self.imops.GetOriginalCoords(self.curZoomLevel, (x,y), self.curViewPort)
-            if self.skip:
-                # skip modus
-                self.skip = False
-                self.locationList.append((0, 0))
-                self.imops.SetMarking(self.curPilImage, point, self.settings.GetSkipColour(), self.settings.GetMarkingOffset(), self.settings.GetMarkingWidth())
-            else:
-                self.locationList.append(point)
-                self.imops.SetMarking(self.curPilImage, point, self.colour, self.settings.GetMarkingOffset(), self.settings.GetMarkingWidth())
-
-            self.SetPilImage()
+    """ Return the core with the rules of this program
+    """
+    def CreateCore(self):
+        return VehiclesCore(self.settings, self.logger, self, self.recorder)
 
 class App(wx.App):
     """ Wx constructor """
@@ -95,13 +54,12 @@ class App(wx.App):
         # Init settings thingy
         settings = Settings(inspect.getfile(inspect.currentframe()))
         # Default size:
-        size=(1400, 800)
-        # Prepare a list of files to use
-        directory = settings.GetInDir()
-        im = [directory + os.sep + f for f in settings.GetFileList(directory)]
-        im.sort()
+        size=settings.GetDisplaySize()
+        # Prepare a list of files to use; the rest is found in the background
+        discovery = FileDiscovery(settings, settings.GetInDir())
+        im = discovery.Start()
         # Setup the frame
-        self.frame = Frame(size=size, settings=settings, fileList=im)
+        self.frame = Frame(size=size, settings=settings, fileList=im, discovery=discovery)
         # Finally, show the created frame
         self.frame.Show()
         self.SetTopWindow(self.frame)
@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+# Warmup
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Warmup program.
+
+Fill the preview cache for all images in the input directory, using all
+cores. Run it before an annotation shift starts, so the programs can
+display every image without decoding it first. Images are opened like
+the programs open them, so large TIFF files are read tile by tile, and
+their previews are the ones the programs use.
+
+Usage: warmup.py [number of processes]
+"""
+
+from __future__ import print_function
+
+import inspect
+import multiprocessing
+import os
+import sys
+
+from filediscovery import FileDiscovery
+from previewcache import PreviewCache
+from settings import Settings
+from tiledsource import CreateImageSource
+
+# The cache of a worker process, see InitWorker
+cache = None
+
+""" Initialize a worker process.
+
+Every worker gets its own cache object. Workers never evict previews;
+that is done once, when all previews are written.
+"""
+def InitWorker(directory, maxsize):
+    global cache
+    cache = PreviewCache(directory, maxsize, evict=False)
+
+""" Put the preview of a single image in the cache.
+
+Args is a 5-tuple (filename, size, draft, tile memory, window), as the
+programs open images with. Return a 2-tuple (filename, error message or None).
+"""
+def WarmUp(args):
+    fileName, size, draft, tileMemory, window = args
+    try:
+        source = CreateImageSource(fileName, size, draft, cache, tileMemory, window)
+        try:
+            source.Load()
+        finally:
+            source.Release()
+    except Exception as e:
+        return (fileName, str(e))
+    return (fileName, None)
+
+if __name__ == '__main__':
+    settings = Settings(inspect.getfile(inspect.currentframe()))
+    processes = None
+    if len(sys.argv) > 1:
+        processes = int(sys.argv[1])
+
+    im = list(FileDiscovery(settings, settings.GetInDir()).Iterate())
+    # Most recently written previews are evicted last, so do the first images last.
+    im.reverse()
+
+    size = settings.GetDisplaySize()
+    draft = settings.GetDraftDecoding()
+    previewdir = settings.GetPreviewDir()
+    maxsize = settings.GetPreviewCacheSize()
+    tileMemory = settings.GetTileMemory() * 1024 * 1024
+    window = settings.GetDisplayWindow()
+
+    pool = multiprocessing.Pool(processes, InitWorker, (previewdir, maxsize))
+    done = 0
+    for fileName, error in pool.imap_unordered(WarmUp, [(f, size, draft, tileMemory, window) for f in im], 4):
+        done += 1
+        if error is not None:
+            print("%s: %s" % (fileName, error), file=sys.stderr)
+        if done % 100 == 0 or done == len(im):
+            print("%d/%d" % (done, len(im)))
+    pool.close()
+    pool.join()
+
+    PreviewCache(previewdir, maxsize).Evict()
@@ -0,0 +1,138 @@
+# ZoomCache
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Cache of zoomed in views that are rendered in advance.
+
+While the mouse hovers over the image, the frame renders the zoomed in
+view around it when it is idle. The image is divided into a grid of
+cells, half a viewport in size. For every cell, a region is rendered
+that covers every viewport whose upper left corner is in that cell, at
+the zoom magnification. When zooming in, the exact viewport is simply
+cut out of the rendered region of its cell.
+
+The cache holds the most recently used cells of the current image,
+within its share of a MemoryBudget, and counts how many zoom requests
+it could serve, to tune its size.
+"""
+
+from collections import OrderedDict
+
+class ZoomCache():
+    """ Create a cache holding up to size cells.
+
+    If a MemoryBudget is given, the cache registers with it.
+    """
+    def __init__(self, size, budget=None):
+        self.size = size
+        self.budget = budget
+        if budget is not None:
+            budget.Register(self)
+        # Cell (column, row) -> (region, rendered image), least recently used first
+        self.entries = OrderedDict()
+        # Bytes used by the rendered images
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+
+    """ Remove all cells, e.g. when another image is shown.
+
+    The hit and miss counts are kept.
+    """
+    def Clear(self):
+        self.entries.clear()
+        self.used = 0
+
+    """ Return whether a cell is cached.
+
+    Unlike Get, this is not counted as a hit or miss.
+    """
+    def Contains(self, cell):
+        return cell in self.entries
+
+    """ Return the 2-tuple (region, rendered image) of a cell, or None.
+
+    The region is the 4-tuple (left, up, right, bottom) in original image
+    coordinates that was rendered.
+    """
+    def Get(self, cell):
+        entry = self.entries.pop(cell, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries[cell] = entry
+        return entry
+
+    """ Store the rendered region of a cell.
+
+    The least recently used cells are removed if the cache is full, or
+    uses more than the budget leaves. Return whether the cell was kept;
+    it is not if the budget leaves less than the cell itself.
+    """
+    def Put(self, cell, region, image):
+        self.Remove(cell)
+        self.entries[cell] = (region, image)
+        self.used += self.GetImageSize(image)
+        limit = None
+        if self.budget is not None:
+            limit = self.budget.GetAvailable(self)
+        while len(self.entries) > self.size or (limit is not None and self.used > limit and len(self.entries) > 0):
+            self.Remove(next(iter(self.entries)))
+        return cell in self.entries
+
+    """ Return whether the budget leaves room for a rendered image of nbytes.
+
+    Cached cells count as room, as they are evicted to make place.
+    """
+    def HasRoom(self, nbytes):
+        return self.budget is None or self.budget.GetAvailable(self) >= nbytes
+
+    """ Remove a cell, if it is cached
+    """
+    def Remove(self, cell):
+        entry = self.entries.pop(cell, None)
+        if entry is not None:
+            self.used -= self.GetImageSize(entry[1])
+
+    """ Return the number of bytes of a rendered wx.Image
+    """
+    def GetImageSize(self, image):
+        return image.GetWidth() * image.GetHeight() * 3
+
+    """ Return the number of bytes used by the rendered images
+    """
+    def GetMemoryUsage(self):
+        return self.used
+
+    """ Return the fraction of zoom requests served from the cache
+
+    None if there were no requests yet.
+    """
+    def GetHitRate(self):
+        if self.hits + self.misses == 0:
+            return None
+        return float(self.hits) / (self.hits + self.misses)
+
+    """ Return a one line summary of the hits and misses
+    """
+    def GetSummary(self):
+        rate = self.GetHitRate()
+        if rate is None:
+            return "Zoom cache: no zoom requests"
+        return "Zoom cache: %d hits, %d misses, hit rate %.0f%%" % (self.hits, self.misses, rate * 100)
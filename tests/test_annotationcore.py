@@ -0,0 +1,85 @@
+# Tests for AnnotationCore
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Check the log files the annotation cores write.
+
+Whole coordinates must be logged as they always were, fractional ones,
+from a zoom factor that isn't whole, must be logged at all.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from annotationcore import DistancesCore, PointList
+from imageoperations import ImageOperations
+from logger import Logger
+from settings import Settings
+
+class DistancesLogTest(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.settings = Settings("distances.py")
+        self.settings.SetOutDir(self.outdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    """ Click the points of two lanes on an image, and return its log file
+    """
+    def Annotate(self, lane_a, lane_b):
+        logger = Logger(self.settings)
+        core = DistancesCore(self.settings, logger)
+        core.OpenImage("image.jpg")
+        for point in lane_a:
+            core.HandleClick(point)
+        core.Do("lane")
+        for point in lane_b:
+            core.HandleClick(point)
+        core.Do("next")
+        logger.Close()
+        with open(os.path.join(self.outdir, "Di#image.txt")) as f:
+            return f.read()
+
+    def testWholeCoordinates(self):
+        log = self.Annotate([(10, 20), (30, 40)], [(50, 60)])
+        self.assertEqual(log, "10 20 30 40 \n50 60 0 0 \n")
+
+    def testFractionalZoom(self):
+        imops = ImageOperations()
+        viewport = (40, 30, 200, 150)
+        points = [imops.GetOriginalCoords(2.5, location, viewport) for location in [(26, 32), (100, 50)]]
+        self.assertEqual(points[0], (50.4, 42.8))
+        log = self.Annotate(points, [(7, 8)])
+        self.assertEqual(log, "50.4 42.8 80 50 \n7 8 0 0 \n")
+
+    def testWholeFloats(self):
+        points = PointList()
+        points.Append((12.0, 3.5))
+        self.assertEqual(points.GetPoints(), [(12, 3.5)])
+        self.assertTrue(isinstance(points.GetPoints()[0][0], int))
+
+if __name__ == '__main__':
+    unittest.main()
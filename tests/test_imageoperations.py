@@ -0,0 +1,125 @@
+# Tests for ImageOperations
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Check that the scalar coordinate transforms match the batch versions.
+
+Integer inputs are checked against the floor division Python 2 always
+did, float inputs against exact division.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from imageoperations import ImageOperations
+
+class CoordinateTransformTest(unittest.TestCase):
+    def setUp(self):
+        self.imops = ImageOperations()
+        self.random = random.Random(12)
+
+    """ Return n random integer cases (zoom, location, orgsize, scalesize, viewport)
+
+    Locations may lie left of or above the image, so floor division of
+    negative numbers is covered too.
+    """
+    def IntegerCases(self, n):
+        cases = []
+        for i in range(n):
+            orgsize = (self.random.randint(1, 20000), self.random.randint(1, 20000))
+            scalesize = (self.random.randint(1, 2000), self.random.randint(1, 2000))
+            zoom = self.random.randint(1, 16)
+            location = (self.random.randint(-50, 2000), self.random.randint(-50, 2000))
+            left = self.random.randint(-100, 20000)
+            up = self.random.randint(-100, 20000)
+            viewport = (left, up, left + self.random.randint(0, 5000), up + self.random.randint(0, 5000))
+            cases.append((zoom, location, orgsize, scalesize, viewport))
+        return cases
+
+    """ Return n random cases as IntegerCases, with floats
+    """
+    def FloatCases(self, n):
+        cases = []
+        for zoom, location, orgsize, scalesize, viewport in self.IntegerCases(n):
+            jitter = lambda values: tuple([v + self.random.random() for v in values])
+            cases.append((zoom + self.random.random(), jitter(location), orgsize, jitter(scalesize), jitter(viewport)))
+        return cases
+
+    def testScaledCoordIntegers(self):
+        cases = self.IntegerCases(2000)
+        locations = [c[1] for c in cases]
+        orgs = [c[2] for c in cases]
+        scales = [c[3] for c in cases]
+        batch = self.imops.GetOriginalCoordFromScaledCoordBatch(locations, orgs, scales, integer=True).tolist()
+        for (zoom, location, org, scale, viewport), expected in zip(cases, batch):
+            result = self.imops.GetOriginalCoordFromScaledCoord(location, org, scale)
+            self.assertEqual(list(result), expected)
+            # What Python 2 did with integer division
+            self.assertEqual(result, (location[0] * org[0] // scale[0], location[1] * org[1] // scale[1]))
+            self.assertTrue(all(isinstance(c, int) for c in result))
+
+    def testScaledCoordFloats(self):
+        cases = self.FloatCases(2000)
+        batch = self.imops.GetOriginalCoordFromScaledCoordBatch([c[1] for c in cases], [c[2] for c in cases], [c[3] for c in cases]).tolist()
+        for (zoom, location, org, scale, viewport), expected in zip(cases, batch):
+            self.assertEqual(list(self.imops.GetOriginalCoordFromScaledCoord(location, org, scale)), expected)
+
+    def testOriginalCoordsIntegers(self):
+        for zoom, location, org, scale, viewport in self.IntegerCases(2000):
+            result = self.imops.GetOriginalCoords(zoom, location, viewport)
+            batch = self.imops.GetOriginalCoordsBatch(zoom, [location], viewport, integer=True).tolist()[0]
+            self.assertEqual(list(result), batch)
+            self.assertEqual(result, (location[0] // zoom + viewport[0], location[1] // zoom + viewport[1]))
+
+    def testOriginalCoordsFloats(self):
+        cases = self.FloatCases(2000)
+        # One zoom for the whole batch, a viewport per click
+        zoom = cases[0][0]
+        batch = self.imops.GetOriginalCoordsBatch(zoom, [c[1] for c in cases], [c[4] for c in cases]).tolist()
+        for (z, location, org, scale, viewport), expected in zip(cases, batch):
+            self.assertEqual(list(self.imops.GetOriginalCoords(zoom, location, viewport)), expected)
+
+    def testViewPortIntegers(self):
+        for zoom, location, org, scale, viewport in self.IntegerCases(2000):
+            result = self.imops.CalculateViewPort(zoom, location, org, scale)
+            batch = self.imops.CalculateViewPortBatch(zoom, [location], org, scale, integer=True).tolist()[0]
+            self.assertEqual(list(result), batch)
+
+    def testViewPortFloats(self):
+        for zoom, location, org, scale, viewport in self.FloatCases(2000):
+            viewsize = (240.5, 240.5)
+            result = self.imops.CalculateViewPort(zoom, location, org, scale, viewsize)
+            batch = self.imops.CalculateViewPortBatch(zoom, [location], org, scale, viewsize=viewsize).tolist()[0]
+            self.assertEqual(list(result), batch)
+
+    def testValidateViewport(self):
+        self.assertEqual(self.imops.ValidateViewport(5, 7, 5, 7), (-95, -93, 105, 107))
+        viewports = numpy.array([[5, 7, 5, 7], [1, 2, 3, 4], [0, 3, 1, 3]])
+        batch = self.imops.ValidateViewportBatch(viewports).tolist()
+        self.assertEqual(batch, [list(self.imops.ValidateViewport(*v)) for v in viewports.tolist()])
+
+if __name__ == '__main__':
+    unittest.main()
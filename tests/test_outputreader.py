@@ -0,0 +1,90 @@
+# Tests for OutputReader
+# Copyright (C) 2012 Kevin van der Vlist, Rosco Voorrips
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+# Kevin van der Vlist - kevin@kevinvandervlist.nl
+# Rosco Voorrips
+
+""" Check how the status of the points in Di# files is decoded.
+
+Run from the repository root: python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from outputreader import OutputReader, POINT, SKIP, PADDING
+
+class DecodeStatusTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.reader = OutputReader()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    """ Write log files, and return the status of their points per lane.
+
+    Files is a list of (name, contents).
+    """
+    def Statuses(self, files):
+        for name, contents in files:
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(contents)
+        points = self.reader.ParseFiles(self.directory, [name for name, contents in files])
+        result = {}
+        for f, program, lane, seq, x, y, status in points.tolist():
+            result.setdefault((f, lane), []).append(status)
+        return result
+
+    def testShorterLaneIsPadded(self):
+        statuses = self.Statuses([("Di#a.txt", "1 2 3 4 5 6 \n7 8 0 0 0 0 \n")])
+        self.assertEqual(statuses[(0, 0)], [POINT, POINT, POINT])
+        self.assertEqual(statuses[(0, 1)], [POINT, PADDING, PADDING])
+
+    def testSkipBeforePadding(self):
+        statuses = self.Statuses([("Di#a.txt", "1 2 3 4 5 6 \n0 0 7 8 0 0 \n")])
+        self.assertEqual(statuses[(0, 1)], [SKIP, POINT, PADDING])
+
+    def testBothLanesEndInSkip(self):
+        # The first lane is the longer one: it ends in two skipped markings
+        statuses = self.Statuses([("Di#a.txt", "1 2 3 4 5 6 0 0 0 0 \n7 8 9 10 0 0 0 0 0 0 \n")])
+        self.assertEqual(statuses[(0, 0)], [POINT, POINT, POINT, SKIP, SKIP])
+        self.assertEqual(statuses[(0, 1)], [POINT, POINT, PADDING, PADDING, PADDING])
+
+    def testEqualLanesEndInSkip(self):
+        statuses = self.Statuses([("Di#a.txt", "1 2 0 0 \n3 4 0 0 \n")])
+        self.assertEqual(statuses[(0, 0)], [POINT, SKIP])
+        self.assertEqual(statuses[(0, 1)], [POINT, SKIP])
+
+    def testLanesOfOtherFiles(self):
+        # The lanes of a file are only compared with each other
+        statuses = self.Statuses([
+            ("Di#a.txt", "1 2 0 0 \n3 4 5 6 \n"),
+            ("TS#b.txt", "1 2 0 0 \n"),
+            ("Di#c.txt", "1 2 3 4 5 6 0 0 \n7 8 9 10 11 12 13 14 \n"),
+        ])
+        self.assertEqual(statuses[(0, 0)], [POINT, PADDING])
+        self.assertEqual(statuses[(1, 0)], [POINT, SKIP])
+        self.assertEqual(statuses[(2, 0)], [POINT, POINT, POINT, PADDING])
+        self.assertEqual(statuses[(2, 1)], [POINT, POINT, POINT, POINT])
+
+if __name__ == '__main__':
+    unittest.main()